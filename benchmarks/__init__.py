@@ -0,0 +1,13 @@
+"""
+Benchmarks reproducibles de chatPDF.
+
+- corpus.py:   genera PDFs sintéticos (texto nativo e imagen escaneada)
+- fake_llm.py: servidor HTTP local compatible con Groq/Ollama
+- micro.py:    microbenchmarks de chunking, embeddings, búsqueda y extracción
+- e2e.py:      throughput de extremo a extremo contra la app FastAPI
+- run.py:      CLI que ejecuta todo y guarda los resultados en JSON
+
+Uso:
+    python -m benchmarks.run --out bench_results/actual.json
+    python -m benchmarks.run --compare bench_results/base.json
+"""
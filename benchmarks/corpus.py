@@ -0,0 +1,193 @@
+import os
+import random
+import textwrap
+from typing import Dict, List, Sequence
+
+from PIL import Image, ImageDraw, ImageFont
+
+# =========================
+# Generación de texto sintético
+# =========================
+
+VOCABULARY = [
+    "contrato", "cliente", "proveedor", "pago", "factura", "servicio", "plazo",
+    "documento", "informe", "resultado", "proyecto", "empresa", "sistema",
+    "datos", "analisis", "seguridad", "condiciones", "acuerdo", "entrega",
+    "calidad", "recursos", "gestion", "objetivo", "periodo", "importe",
+    "responsable", "anexo", "clausula", "registro", "tecnico", "soporte",
+    "mantenimiento", "licencia", "usuario", "consulta", "revision", "version",
+    "mensual", "anual", "total", "impuesto", "descuento", "garantia", "riesgo",
+]
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792  # Carta, en puntos PDF
+LINE_CHARS = 90
+LINES_PER_PAGE = 50
+
+
+def generate_page_texts(pages: int, words_per_page: int = 400, seed: int = 0) -> List[str]:
+    """
+    Texto determinista por página. Cada página incluye una línea con
+    número de factura y fecha para poder probar búsquedas exactas.
+    """
+    rng = random.Random(seed)
+    texts = []
+
+    for page in range(pages):
+        words = [rng.choice(VOCABULARY) for _ in range(words_per_page)]
+        invoice = rng.randint(10000, 99999)
+        date = f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/20{rng.randint(10, 29)}"
+
+        body = " ".join(words)
+        texts.append(f"Factura numero {invoice} con fecha {date}. {body}.")
+
+    return texts
+
+
+def _wrap(text: str, width: int = LINE_CHARS) -> List[str]:
+    return textwrap.wrap(text, width=width)[:LINES_PER_PAGE]
+
+
+# =========================
+# PDF con texto nativo
+# =========================
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_text_pdf(path: str, page_texts: Sequence[str]) -> None:
+    """
+    Escribe un PDF mínimo (Helvetica, sin dependencias) con una página
+    de texto nativo por cada elemento de page_texts.
+    """
+    objects: List[bytes] = []
+
+    def add(obj: bytes) -> int:
+        objects.append(obj)
+        return len(objects)
+
+    catalog_id = add(b"")  # se completa al final
+    pages_id = add(b"")
+    font_id = add(
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+        b"/Encoding /WinAnsiEncoding >>"
+    )
+
+    page_ids = []
+    for text in page_texts:
+        lines = ["BT", "/F1 10 Tf", "14 TL", f"50 {PAGE_HEIGHT - 50} Td"]
+        for line in _wrap(text):
+            lines.append(f"({_pdf_escape(line)}) Tj T*")
+        lines.append("ET")
+        stream = "\n".join(lines).encode("latin-1", errors="replace")
+
+        content_id = add(
+            b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        )
+        page_ids.append(add(
+            (
+                f"<< /Type /Page /Parent {pages_id} 0 R "
+                f"/MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                f"/Resources << /Font << /F1 {font_id} 0 R >> >> "
+                f"/Contents {content_id} 0 R >>"
+            ).encode()
+        ))
+
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects[pages_id - 1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+    objects[catalog_id - 1] = f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += (
+        b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+        % (len(objects) + 1, catalog_id, xref_offset)
+    )
+
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+# =========================
+# PDF escaneado (solo imagen)
+# =========================
+
+def _load_font(size: int):
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def write_scanned_pdf(path: str, page_texts: Sequence[str], dpi: int = 150) -> None:
+    """
+    Escribe un PDF sin capa de texto: cada página es una imagen con el
+    texto renderizado, como un documento escaneado.
+    """
+    width = int(PAGE_WIDTH / 72 * dpi)
+    height = int(PAGE_HEIGHT / 72 * dpi)
+    font_size = max(10, dpi // 7)
+    font = _load_font(font_size)
+    line_height = int(font_size * 1.4)
+    margin = dpi // 2
+
+    images = []
+    for text in page_texts:
+        image = Image.new("L", (width, height), color=255)
+        draw = ImageDraw.Draw(image)
+
+        chars_per_line = max(20, int((width - 2 * margin) / (font_size * 0.55)))
+        y = margin
+        for line in _wrap(text, width=chars_per_line):
+            if y + line_height > height - margin:
+                break
+            draw.text((margin, y), line, fill=0, font=font)
+            y += line_height
+
+        images.append(image)
+
+    images[0].save(
+        path, "PDF", resolution=float(dpi), save_all=True, append_images=images[1:]
+    )
+
+
+# =========================
+# Corpus completo
+# =========================
+
+def build_corpus(
+    out_dir: str,
+    text_sizes: Sequence[int] = (1, 10, 50),
+    scanned_sizes: Sequence[int] = (1, 3),
+    words_per_page: int = 400,
+    seed: int = 0,
+) -> List[Dict]:
+    """
+    Genera el corpus de benchmark en out_dir.
+    Retorna una entrada por PDF con ruta, tipo, páginas y texto esperado.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    corpus = []
+
+    for pages in text_sizes:
+        texts = generate_page_texts(pages, words_per_page, seed=seed + pages)
+        path = os.path.join(out_dir, f"text_{pages}p.pdf")
+        write_text_pdf(path, texts)
+        corpus.append({"path": path, "kind": "text", "pages": pages, "page_texts": texts})
+
+    for pages in scanned_sizes:
+        # Menos palabras por página: el OCR es mucho más lento
+        texts = generate_page_texts(pages, max(50, words_per_page // 3), seed=seed + 1000 + pages)
+        path = os.path.join(out_dir, f"scanned_{pages}p.pdf")
+        write_scanned_pdf(path, texts)
+        corpus.append({"path": path, "kind": "scanned", "pages": pages, "page_texts": texts})
+
+    return corpus
@@ -0,0 +1,63 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from benchmarks.micro import BENCH_QUERIES
+from benchmarks.timing import summarize
+
+
+def run_e2e(corpus: List[Dict], questions: int = 50, concurrency: int = 4) -> Dict[str, Dict]:
+    """
+    Throughput de extremo a extremo contra main.app (en proceso):
+    ingesta de todo el corpus por /upload_pdf y luego preguntas por /ask
+    con el LLM sustituido por el servidor falso.
+    """
+    from fastapi.testclient import TestClient
+    from main import app
+
+    client = TestClient(app)
+    results = {}
+
+    # ---------- Ingesta ----------
+    upload_times = []
+    start = time.perf_counter()
+    for entry in corpus:
+        with open(entry["path"], "rb") as f:
+            content = f.read()
+        t0 = time.perf_counter()
+        response = client.post(
+            "/upload_pdf",
+            files={"file": (f"e2e_{entry['kind']}_{entry['pages']}p.pdf", content, "application/pdf")},
+        )
+        response.raise_for_status()
+        upload_times.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+
+    total_pages = sum(entry["pages"] for entry in corpus)
+    ingest = summarize(upload_times)
+    ingest.update({
+        "docs_per_sec": len(corpus) / elapsed if elapsed else 0.0,
+        "pages_per_sec": total_pages / elapsed if elapsed else 0.0,
+    })
+    results["e2e_ingest"] = ingest
+
+    # ---------- Preguntas ----------
+    def ask(i):
+        t0 = time.perf_counter()
+        response = client.post("/ask", json={"query": BENCH_QUERIES[i % len(BENCH_QUERIES)]})
+        response.raise_for_status()
+        return time.perf_counter() - t0
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        ask_times = list(pool.map(ask, range(questions)))
+    elapsed = time.perf_counter() - start
+
+    ask_stats = summarize(ask_times)
+    ask_stats.update({
+        "concurrency": concurrency,
+        "questions_per_sec": questions / elapsed if elapsed else 0.0,
+    })
+    results["e2e_ask"] = ask_stats
+
+    return results
@@ -0,0 +1,192 @@
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+# =========================
+# Servidor LLM falso (Groq / Ollama)
+# =========================
+
+DEFAULT_ANSWER = (
+    "Según el Fragmento 1, el documento describe las condiciones del contrato "
+    "y el importe total de la factura."
+)
+
+
+class FakeLLMConfig:
+    """Parámetros de latencia del servidor falso"""
+
+    def __init__(self, latency: float = 0.2, token_delay: float = 0.0,
+                 answer: str = DEFAULT_ANSWER, error_rate: float = 0.0):
+        self.latency = latency          # segundos antes de responder
+        self.token_delay = token_delay  # segundos entre tokens en streaming
+        self.answer = answer
+        self.error_rate = error_rate    # fracción de respuestas 429
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def next_request(self) -> int:
+        with self.lock:
+            self.requests += 1
+            return self.requests
+
+
+def _make_handler(config: FakeLLMConfig):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):  # silenciar logs por request
+            pass
+
+        def _send_json(self, status: int, payload: dict, headers: dict = None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self) -> dict:
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def _should_fail(self, number: int) -> bool:
+            if config.error_rate <= 0:
+                return False
+            return number % max(1, round(1 / config.error_rate)) == 0
+
+        def _stream(self, chunks):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for chunk in chunks:
+                data = chunk.encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+                if config.token_delay:
+                    time.sleep(config.token_delay)
+            self.wfile.write(b"0\r\n\r\n")
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                self._send_json(200, {"models": [{"name": "llama3.2:1b"}]})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            number = config.next_request()
+            payload = self._read_json()
+            time.sleep(config.latency)
+
+            words = config.answer.split(" ")
+
+            # ---------- Groq (API compatible con OpenAI) ----------
+            if self.path.endswith("/chat/completions"):
+                if self._should_fail(number):
+                    self._send_json(429, {"error": "rate limit"}, {"retry-after": "1"})
+                    return
+
+                if payload.get("stream"):
+                    events = [
+                        "data: " + json.dumps({"choices": [{"delta": {"content": w + " "}}]}) + "\n\n"
+                        for w in words
+                    ]
+                    self._stream(events + ["data: [DONE]\n\n"])
+                    return
+
+                self._send_json(200, {
+                    "choices": [{"message": {"role": "assistant", "content": config.answer}}],
+                    "usage": {"prompt_tokens": len(json.dumps(payload)) // 4,
+                              "completion_tokens": len(words)},
+                })
+                return
+
+            # ---------- Ollama ----------
+            if self.path in ("/api/generate", "/api/chat"):
+                if self._should_fail(number):
+                    self._send_json(500, {"error": "overloaded"})
+                    return
+
+                key = "message" if self.path == "/api/chat" else "response"
+
+                def body(text, done):
+                    if key == "message":
+                        data = {"message": {"role": "assistant", "content": text}}
+                    else:
+                        data = {"response": text}
+                    data.update({"done": done, "context": [1, 2, 3] if done else None})
+                    return data
+
+                if payload.get("stream", True):
+                    lines = [json.dumps(body(w + " ", False)) + "\n" for w in words]
+                    self._stream(lines + [json.dumps(body("", True)) + "\n"])
+                    return
+
+                self._send_json(200, body(config.answer, True))
+                return
+
+            self._send_json(404, {"error": "not found"})
+
+    return Handler
+
+
+def start_fake_llm_server(host: str = "127.0.0.1", port: int = 0,
+                          config: FakeLLMConfig = None) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Arranca el servidor en un hilo de fondo.
+    Retorna (server, base_url); usar server.shutdown() para detenerlo.
+    """
+    config = config or FakeLLMConfig()
+    server = ThreadingHTTPServer((host, port), _make_handler(config))
+    server.daemon_threads = True
+    server.config = config
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    base_url = f"http://{host}:{server.server_address[1]}"
+    return server, base_url
+
+
+def provider_env(base_url: str) -> dict:
+    """
+    Variables de entorno que apuntan MultiModelManager al servidor falso.
+    El servidor no envía cabeceras x-ratelimit-*: se suben las cuotas
+    locales de Groq para que el limitador no desvíe las peticiones a
+    Ollama y se mida el proveedor correcto.
+    """
+    return {
+        "GROQ_API_KEY": "fake-key",
+        "GROQ_API_URL": f"{base_url}/openai/v1/chat/completions",
+        "OLLAMA_URL": base_url,
+        "GROQ_RPM": "1000000",
+        "GROQ_TPM": "1000000000",
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor LLM falso compatible con Groq/Ollama")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, url = start_fake_llm_server(
+        port=args.port,
+        config=FakeLLMConfig(args.latency, args.token_delay, error_rate=args.error_rate),
+    )
+    print(f"Servidor LLM falso en {url}")
+    for key, value in provider_env(url).items():
+        print(f"  export {key}={value}")
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
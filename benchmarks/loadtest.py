@@ -0,0 +1,296 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import requests
+
+from benchmarks.corpus import generate_page_texts, write_text_pdf
+from benchmarks.fake_llm import FakeLLMConfig, start_fake_llm_server, provider_env
+from benchmarks.micro import BENCH_QUERIES
+from benchmarks.timing import summarize
+
+# =========================
+# Configuración por defecto
+# =========================
+
+DEFAULT_MIX = "upload=1,ask=5,search=3,documents=1"
+
+# Criterios de saturación de un escalón
+MIN_ACHIEVED_RATIO = 0.9   # throughput real / objetivo
+MAX_ERROR_RATE = 0.05
+
+# Retraso máximo entre la llegada programada y el inicio real de una
+# petición para no contarla como tardía (pool de workers saturado)
+LATE_START = 0.01
+
+
+def parse_mix(mix: str) -> List[Tuple[str, float]]:
+    """'upload=1,ask=5' -> [("upload", 1.0), ("ask", 5.0)]"""
+    weights = []
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights.append((name.strip(), float(weight or 1)))
+    return weights
+
+
+# =========================
+# Clientes (en proceso / HTTP)
+# =========================
+
+class HTTPClient:
+    """Cliente HTTP con una sesión con pool por hilo"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def request(self, method: str, path: str, **kwargs):
+        return self._session().request(method, self.base_url + path, timeout=120, **kwargs)
+
+
+class InProcessClient:
+    """Ejecuta la app directamente con el TestClient de FastAPI"""
+
+    def __init__(self):
+        from fastapi.testclient import TestClient
+        from main import app
+        self._client = TestClient(app)
+
+    def request(self, method: str, path: str, **kwargs):
+        return self._client.request(method, path, **kwargs)
+
+
+def start_uvicorn(port: int, env: Dict[str, str], workdir: str) -> subprocess.Popen:
+    """Arranca uvicorn con main:app y espera a que responda"""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir,
+        env={**os.environ, **env, "PYTHONPATH": REPO_ROOT},
+    )
+
+    deadline = time.time() + 180  # la carga del modelo de embeddings tarda
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("uvicorn terminó durante el arranque")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/documents", timeout=2)
+            return process
+        except requests.RequestException:
+            time.sleep(1)
+
+    process.terminate()
+    raise RuntimeError("uvicorn no respondió a tiempo")
+
+
+# =========================
+# Operaciones de la mezcla de tráfico
+# =========================
+
+def build_operations(client, pdf_bytes: bytes) -> Dict[str, Callable]:
+    counter = iter(range(10 ** 9))
+    counter_lock = threading.Lock()
+
+    def unique_name():
+        with counter_lock:
+            return f"load_{os.getpid()}_{next(counter)}.pdf"
+
+    def upload():
+        files = {"file": (unique_name(), pdf_bytes, "application/pdf")}
+        return client.request("POST", "/upload_pdf", files=files)
+
+    def ask():
+        return client.request("POST", "/ask", json={"query": random.choice(BENCH_QUERIES)})
+
+    def search():
+        return client.request("GET", "/search", params={"query": random.choice(BENCH_QUERIES)})
+
+    def documents():
+        return client.request("GET", "/documents")
+
+    return {"upload": upload, "ask": ask, "search": search, "documents": documents}
+
+
+# =========================
+# Generador de carga (lazo abierto)
+# =========================
+
+def run_step(operations: Dict[str, Callable], mix: List[Tuple[str, float]],
+             rps: float, duration: float, max_workers: int) -> Dict:
+    """
+    Lanza peticiones a ritmo constante rps durante duration segundos,
+    sin esperar a que terminen las anteriores (lazo abierto), y mide
+    latencia y errores por endpoint. La latencia se cuenta desde la
+    llegada programada, no desde que un worker empieza la petición: si el
+    pool se satura, la espera en cola también cuenta (sin "coordinated
+    omission").
+    """
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    records: List[Tuple[str, float, bool, bool]] = []
+    records_lock = threading.Lock()
+
+    def execute(name, target):
+        late = time.perf_counter() - target > LATE_START
+        try:
+            response = operations[name]()
+            ok = response.status_code < 400
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - target
+        with records_lock:
+            records.append((name, elapsed, ok, late))
+
+    interval = 1.0 / rps
+    total = int(rps * duration)
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for i in range(total):
+            target = start + i * interval
+            delay = target - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(execute, random.choices(names, weights)[0], target)
+
+    elapsed = time.perf_counter() - start
+
+    endpoints = {}
+    for name in names:
+        latencies = [lat for n, lat, _, _ in records if n == name]
+        errors = sum(1 for n, _, ok, _ in records if n == name and not ok)
+        stats = summarize(latencies)
+        stats["error_rate"] = errors / len(latencies) if latencies else 0.0
+        stats["late_starts"] = sum(1 for n, _, _, late in records if n == name and late)
+        endpoints[name] = stats
+
+    errors = sum(1 for _, _, ok, _ in records if not ok)
+    return {
+        "target_rps": rps,
+        "achieved_rps": len(records) / elapsed if elapsed else 0.0,
+        "requests": len(records),
+        "error_rate": errors / len(records) if records else 0.0,
+        "late_starts": sum(1 for *_, late in records if late),
+        "endpoints": endpoints,
+    }
+
+
+def is_saturated(step: Dict, slo_p95: float) -> bool:
+    if step["achieved_rps"] < MIN_ACHIEVED_RATIO * step["target_rps"]:
+        return True
+    if step["error_rate"] > MAX_ERROR_RATE:
+        return True
+    return any(ep.get("p95", 0) > slo_p95 for ep in step["endpoints"].values())
+
+
+def print_step(step: Dict) -> None:
+    print(
+        f"\n▶ {step['target_rps']:.1f} rps objetivo → {step['achieved_rps']:.1f} rps reales, "
+        f"errores {step['error_rate']:.1%}, {step['late_starts']} iniciadas con retraso"
+    )
+    for name, stats in step["endpoints"].items():
+        if not stats.get("runs"):
+            continue
+        print(
+            f"   {name:10} n={stats['runs']:5}  p50={stats['p50']:.3f}s  "
+            f"p95={stats['p95']:.3f}s  p99={stats['p99']:.3f}s  err={stats['error_rate']:.1%}  "
+            f"tarde={stats['late_starts']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API de chatPDF")
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn", "url"], default="inprocess")
+    parser.add_argument("--url", help="URL base de una API ya levantada (modo url)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Pesos por endpoint (por defecto {DEFAULT_MIX})")
+    parser.add_argument("--rps", type=float, default=2.0, help="RPS del primer escalón")
+    parser.add_argument("--step-factor", type=float, default=1.5, help="Multiplicador de RPS entre escalones")
+    parser.add_argument("--max-rps", type=float, default=200.0)
+    parser.add_argument("--duration", type=float, default=20.0, help="Segundos por escalón")
+    parser.add_argument("--slo-p95", type=float, default=10.0, help="p95 máximo aceptable (s)")
+    parser.add_argument("--max-workers", type=int, default=64)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Guardar el informe en JSON")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    if args.out:
+        args.out = os.path.abspath(args.out)
+    workdir = tempfile.mkdtemp(prefix="chatpdf_load_")
+
+    # PDF pequeño reutilizado en cada upload
+    pdf_path = os.path.join(workdir, "load.pdf")
+    write_text_pdf(pdf_path, generate_page_texts(3, seed=args.seed))
+    with open(pdf_path, "rb") as f:
+        pdf_bytes = f.read()
+
+    # LLM sustituido por el servidor falso (no aplica en modo url)
+    server, base_url = start_fake_llm_server(config=FakeLLMConfig(latency=args.llm_latency))
+    env = {**provider_env(base_url), "CHROMA_DIR": os.path.join(workdir, "chroma_db"), "LOG_LEVEL": "WARNING"}
+
+    process = None
+    if args.mode == "inprocess":
+        os.environ.update(env)
+        os.chdir(workdir)
+        client = InProcessClient()
+    elif args.mode == "uvicorn":
+        process = start_uvicorn(args.port, env, workdir)
+        client = HTTPClient(f"http://127.0.0.1:{args.port}")
+    else:
+        if not args.url:
+            parser.error("--mode url requiere --url")
+        client = HTTPClient(args.url)
+
+    operations = build_operations(client, pdf_bytes)
+    mix = parse_mix(args.mix)
+
+    steps = []
+    sustainable = None
+    rps = args.rps
+
+    try:
+        while rps <= args.max_rps:
+            step = run_step(operations, mix, rps, args.duration, args.max_workers)
+            steps.append(step)
+            print_step(step)
+
+            if is_saturated(step, args.slo_p95):
+                break
+            sustainable = rps
+            rps *= args.step_factor
+    finally:
+        if process:
+            process.terminate()
+        server.shutdown()
+
+    if sustainable is None:
+        print("\n⚠️ Saturado ya en el primer escalón")
+    else:
+        print(f"\n✅ Punto de saturación: ~{sustainable:.1f} rps sostenibles")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"args": vars(args), "steps": steps, "sustainable_rps": sustainable}, f, indent=2)
+        print(f"Informe guardado en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+from typing import Dict, List
+
+from benchmarks.timing import measure
+
+BENCH_QUERIES = [
+    "¿Cuál es el importe total del contrato?",
+    "condiciones de pago y plazo de entrega",
+    "Factura numero 12345",
+    "¿Qué garantía ofrece el proveedor?",
+    "resumen del mantenimiento anual",
+]
+
+
+def _largest(corpus: List[Dict], kind: str) -> Dict:
+    entries = [c for c in corpus if c["kind"] == kind]
+    return max(entries, key=lambda c: c["pages"]) if entries else None
+
+
+def run_micro(corpus: List[Dict], repeat: int = 5) -> Dict[str, Dict]:
+    """
+    Microbenchmarks de las funciones del pipeline sobre el corpus sintético.
+    Los módulos se importan aquí para que el entorno (CHROMA_DIR, URLs de
+    proveedores) ya esté configurado por run.py.
+    """
+    from modules.embeddings_manager import (
+        chunk_text,
+        store_embeddings,
+        search_similar,
+        delete_document,
+    )
+    from modules.hybrid_search import hybrid_search
+    from modules.pdf_reader import extract_text_from_pdf
+    from modules.ocr_cache import ocr_cache
+
+    results = {}
+
+    # ---------- chunk_text ----------
+    largest = _largest(corpus, "text")
+    text = "\n".join(largest["page_texts"])
+    stats = measure(lambda: chunk_text(text), repeat=repeat)
+    stats["chars_per_sec"] = len(text) / stats["mean"] if stats["mean"] else 0.0
+    results[f"chunk_text[{largest['pages']}p]"] = stats
+
+    # ---------- store_embeddings ----------
+    for entry in [c for c in corpus if c["kind"] == "text"]:
+        doc_text = "\n".join(entry["page_texts"])
+        doc_id = f"bench_store_{entry['pages']}p"
+        stats = measure(
+            lambda: store_embeddings(doc_id, doc_text),
+            repeat=repeat,
+            setup=lambda: delete_document(doc_id),
+        )
+        stats["pages_per_sec"] = entry["pages"] / stats["mean"] if stats["mean"] else 0.0
+        results[f"store_embeddings[{entry['pages']}p]"] = stats
+
+    # ---------- búsquedas sobre el corpus indexado ----------
+    for entry in [c for c in corpus if c["kind"] == "text"]:
+        doc_id = f"bench_search_{entry['pages']}p"
+        delete_document(doc_id)
+        store_embeddings(doc_id, "\n".join(entry["page_texts"]))
+
+    def run_queries(fn):
+        return lambda: [fn(q) for q in BENCH_QUERIES]
+
+    stats = measure(run_queries(lambda q: search_similar(q)), repeat=repeat)
+    stats["queries_per_sec"] = len(BENCH_QUERIES) / stats["mean"] if stats["mean"] else 0.0
+    results["search_similar"] = stats
+
+    stats = measure(run_queries(lambda q: hybrid_search(q)), repeat=repeat)
+    stats["queries_per_sec"] = len(BENCH_QUERIES) / stats["mean"] if stats["mean"] else 0.0
+    results["hybrid_search"] = stats
+
+    # ---------- extract_text_from_pdf ----------
+    # Sin caché: las repeticiones deben medir el OCR real, no aciertos
+    cache_max_bytes = ocr_cache.max_bytes
+    ocr_cache.max_bytes = 0
+
+    for entry in corpus:
+        name = f"extract_text_from_pdf[{entry['kind']}_{entry['pages']}p]"
+        try:
+            # El OCR es lento: menos repeticiones para PDFs escaneados
+            runs = repeat if entry["kind"] == "text" else max(1, repeat // 5)
+            stats = measure(lambda: extract_text_from_pdf(entry["path"]), repeat=runs, warmup=0)
+            stats["pages_per_sec"] = entry["pages"] / stats["mean"] if stats["mean"] else 0.0
+            results[name] = stats
+        except Exception as e:
+            results[name] = {"error": str(e)}
+
+    ocr_cache.max_bytes = cache_max_bytes
+
+    return results
@@ -0,0 +1,115 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import difflib
+import tempfile
+from typing import Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.corpus import build_corpus
+
+
+def _normalize(text: str) -> str:
+    """Quita marcas de página y normaliza espacios para comparar"""
+    text = re.sub(r"--- Página \d+ ---", " ", text)
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def char_accuracy(predicted: str, reference: str) -> float:
+    """Similitud a nivel de caracteres (0-1) entre OCR y texto de referencia"""
+    return difflib.SequenceMatcher(None, _normalize(predicted), _normalize(reference), autojunk=False).ratio()
+
+
+def load_corpus(corpus_dir: str) -> List[Dict]:
+    """
+    Corpus propio: cada PDF con un .txt de referencia del mismo nombre.
+    Sin .txt, la referencia es la salida del modo "fixed".
+    """
+    entries = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if not name.lower().endswith(".pdf"):
+            continue
+        path = os.path.join(corpus_dir, name)
+        reference_path = os.path.splitext(path)[0] + ".txt"
+        reference = None
+        if os.path.exists(reference_path):
+            with open(reference_path, encoding="utf-8") as f:
+                reference = f.read()
+        entries.append({"path": path, "reference": reference})
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR adaptativo vs. OCR fijo: tiempo y precisión")
+    parser.add_argument("--corpus", help="Carpeta con PDFs escaneados (+ .txt de referencia opcional)")
+    parser.add_argument("--pages", default="1,3", help="Páginas de los PDFs sintéticos si no hay --corpus")
+    parser.add_argument("--assume-upright", action="store_true", help="Saltar OSD en modo adaptativo")
+    parser.add_argument("--out", help="Guardar resultados en JSON")
+    args = parser.parse_args()
+
+    from modules.pdf_reader import extract_text_with_ocr
+    from modules.ocr_cache import ocr_cache
+
+    # Sin caché: se mide el OCR real
+    ocr_cache.max_bytes = 0
+
+    if args.corpus:
+        entries = load_corpus(args.corpus)
+    else:
+        workdir = tempfile.mkdtemp(prefix="chatpdf_ocr_")
+        synthetic = build_corpus(workdir, text_sizes=(), scanned_sizes=[int(p) for p in args.pages.split(",")])
+        entries = [{"path": c["path"], "reference": "\n".join(c["page_texts"])} for c in synthetic]
+
+    rows = []
+    for entry in entries:
+        timings = {}
+        texts = {}
+        for mode in ("fixed", "adaptive"):
+            start = time.perf_counter()
+            texts[mode] = extract_text_with_ocr(
+                entry["path"],
+                mode=mode,
+                assume_upright=args.assume_upright if mode == "adaptive" else False,
+            )
+            timings[mode] = time.perf_counter() - start
+
+        reference = entry["reference"] or texts["fixed"]
+        row = {
+            "pdf": os.path.basename(entry["path"]),
+            "fixed_seconds": timings["fixed"],
+            "adaptive_seconds": timings["adaptive"],
+            "time_saved": 1 - timings["adaptive"] / timings["fixed"] if timings["fixed"] else 0.0,
+            "fixed_accuracy": char_accuracy(texts["fixed"], reference),
+            "adaptive_accuracy": char_accuracy(texts["adaptive"], reference),
+        }
+        row["accuracy_delta"] = row["adaptive_accuracy"] - row["fixed_accuracy"]
+        rows.append(row)
+
+        print(
+            f"{row['pdf']:30} fijo {row['fixed_seconds']:7.2f}s  adaptativo {row['adaptive_seconds']:7.2f}s "
+            f"({row['time_saved']:+.0%} ahorro)  precisión {row['fixed_accuracy']:.3f} → "
+            f"{row['adaptive_accuracy']:.3f} ({row['accuracy_delta']:+.3f})"
+        )
+
+    total_fixed = sum(r["fixed_seconds"] for r in rows)
+    total_adaptive = sum(r["adaptive_seconds"] for r in rows)
+    summary = {
+        "time_saved": 1 - total_adaptive / total_fixed if total_fixed else 0.0,
+        "mean_accuracy_delta": sum(r["accuracy_delta"] for r in rows) / len(rows) if rows else 0.0,
+    }
+    print(f"\nTotal: {summary['time_saved']:+.0%} de tiempo ahorrado, "
+          f"Δ precisión media {summary['mean_accuracy_delta']:+.3f}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"rows": rows, "summary": summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
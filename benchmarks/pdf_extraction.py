@@ -0,0 +1,58 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.corpus import generate_page_texts, write_text_pdf
+from benchmarks.timing import measure
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Páginas/segundo por backend de extracción de PDF")
+    parser.add_argument("--pages", default="10,100,500", help="Tamaños de los PDFs sintéticos")
+    parser.add_argument("--pdf", action="append", default=[], help="PDF propio a incluir (repetible)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", help="Guardar resultados en JSON")
+    args = parser.parse_args()
+
+    from modules.pdf_backends import available_backends, get_backend, extract_all_pages, PDF_EXTRACT_WORKERS
+
+    workdir = tempfile.mkdtemp(prefix="chatpdf_pdfbench_")
+    pdfs = list(args.pdf)
+    for pages in [int(p) for p in args.pages.split(",") if p]:
+        path = os.path.join(workdir, f"text_{pages}p.pdf")
+        write_text_pdf(path, generate_page_texts(pages))
+        pdfs.append(path)
+
+    results = {}
+    for path in pdfs:
+        for name in available_backends():
+            backend = get_backend(name)
+            for workers in sorted({1, PDF_EXTRACT_WORKERS}):
+
+                def run():
+                    with backend.open(path) as document:
+                        extract_all_pages(document, backend, workers=workers)
+
+                with backend.open(path) as document:
+                    pages = document.page_count
+
+                stats = measure(run, repeat=args.repeat)
+                stats["pages_per_sec"] = pages / stats["mean"] if stats["mean"] else 0.0
+
+                key = f"{os.path.basename(path)}[{name}, workers={workers}]"
+                results[key] = stats
+                print(f"{key:45} {stats['pages_per_sec']:10.1f} páginas/s")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
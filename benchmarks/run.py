@@ -0,0 +1,126 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+from typing import Dict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.corpus import build_corpus
+from benchmarks.fake_llm import FakeLLMConfig, start_fake_llm_server, provider_env
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> bool:
+    """
+    Imprime la variación de tiempo medio por benchmark respecto a la base.
+    Retorna True si alguno empeoró más que threshold (fracción).
+    """
+    regressed = False
+    print(f"\n{'benchmark':45} {'base':>10} {'actual':>10} {'cambio':>9}")
+
+    for name, stats in sorted(current["results"].items()):
+        base = baseline["results"].get(name, {})
+        if "mean" not in stats or "mean" not in base or not base["mean"]:
+            continue
+
+        change = stats["mean"] / base["mean"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  ⚠️ regresión"
+            regressed = True
+
+        print(f"{name:45} {base['mean']:10.4f} {stats['mean']:10.4f} {change:+8.1%}{flag}")
+
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks reproducibles de chatPDF")
+    parser.add_argument("--out", help="Ruta del JSON de resultados (por defecto bench_results/<commit>.json)")
+    parser.add_argument("--compare", help="JSON de una ejecución anterior para comparar")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Empeoramiento tolerado (0.10 = 10%%)")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--text-sizes", default="1,10,50", help="Páginas de los PDFs de texto nativo")
+    parser.add_argument("--scanned-sizes", default="1,3", help="Páginas de los PDFs escaneados")
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--skip-e2e", action="store_true")
+    args = parser.parse_args()
+
+    commit = _git_commit()
+    out_path = os.path.abspath(args.out or os.path.join(REPO_ROOT, "bench_results", f"{commit}.json"))
+
+    workdir = tempfile.mkdtemp(prefix="chatpdf_bench_")
+
+    # LLM falso + Chroma aislado ANTES de importar los módulos del proyecto
+    server, base_url = start_fake_llm_server(
+        config=FakeLLMConfig(latency=args.llm_latency, token_delay=args.token_delay)
+    )
+    os.environ.update(provider_env(base_url))
+    os.environ["CHROMA_DIR"] = os.path.join(workdir, "chroma_db")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.chdir(workdir)
+
+    corpus = build_corpus(
+        os.path.join(workdir, "corpus"),
+        text_sizes=[int(x) for x in args.text_sizes.split(",") if x],
+        scanned_sizes=[int(x) for x in args.scanned_sizes.split(",") if x],
+        seed=args.seed,
+    )
+
+    results = {}
+    if not args.skip_micro:
+        from benchmarks.micro import run_micro
+        results.update(run_micro(corpus, repeat=args.repeat))
+    if not args.skip_e2e:
+        from benchmarks.e2e import run_e2e
+        results.update(run_e2e(corpus, questions=args.questions, concurrency=args.concurrency))
+
+    server.shutdown()
+
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {out_path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold) and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import time
+import statistics
+from typing import Callable, Dict, List
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Resumen estadístico de una lista de duraciones (segundos)"""
+    if not samples:
+        return {"runs": 0}
+
+    ordered = sorted(samples)
+
+    def pct(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "runs": len(ordered),
+        "min": ordered[0],
+        "mean": statistics.fmean(ordered),
+        "p50": pct(0.5),
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+        "max": ordered[-1],
+    }
+
+
+def measure(fn: Callable, repeat: int = 5, warmup: int = 1, setup: Callable = None) -> Dict[str, float]:
+    """
+    Ejecuta fn() repeat veces (tras warmup ejecuciones descartadas) y
+    retorna el resumen de tiempos. setup() corre antes de cada ejecución
+    y no se mide.
+    """
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+
+    return summarize(samples)
@@ -1,6 +1,8 @@
 import os
 import requests
 import streamlit as st
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 
 # =========================
 # Configuración de la página
@@ -23,6 +25,53 @@ UPLOAD_URL = f"{API_BASE}/upload_pdf"
 ASK_URL = f"{API_BASE}/ask"
 DOCS_URL = f"{API_BASE}/documents"
 
+# Timeout del cliente para /ask y plazo pedido al servidor (con margen
+# para recibir la respuesta parcial antes de cortar)
+ASK_TIMEOUT = 60
+ASK_DEADLINE = ASK_TIMEOUT - 5
+
+# Subidas en paralelo y caché de la lista de documentos
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+UPLOAD_TIMEOUT = 60
+DOCS_CACHE_TTL = 30
+
+
+# =========================
+# Cliente HTTP
+# =========================
+
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    """Sesión HTTP compartida (reutiliza conexiones entre llamadas y reruns)"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=UPLOAD_WORKERS + 2)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_data(ttl=DOCS_CACHE_TTL, show_spinner=False)
+def fetch_documents() -> list:
+    """Lista de documentos (cacheada; se invalida al subir o eliminar)"""
+    response = get_http_session().get(DOCS_URL, timeout=10)
+    response.raise_for_status()
+    return response.json().get("documents", [])
+
+
+def upload_pdf(name: str, content: bytes):
+    """Sube un PDF; se ejecuta en los hilos del pool (sin llamadas a st.*)"""
+    try:
+        response = get_http_session().post(
+            UPLOAD_URL,
+            files={"file": (name, content, "application/pdf")},
+            timeout=UPLOAD_TIMEOUT,
+        )
+        if response.status_code == 200:
+            return True, response.json()
+        return False, f"HTTP {response.status_code}"
+    except Exception as e:
+        return False, str(e)
+
 # =========================
 # UI - Título principal
 # =========================
@@ -48,31 +97,35 @@ with st.sidebar:
         st.write(f"✅ {len(uploaded_files)} archivo(s) cargado(s)")
 
         if st.button("🚀 Procesar PDFs", type="primary"):
-            with st.spinner("Procesando PDFs..."):
-                for uploaded_file in uploaded_files:
-                    try:
-                        files = {
-                            "file": (
-                                uploaded_file.name,
-                                uploaded_file.getvalue(),
-                                "application/pdf",
-                            )
-                        }
-
-                        response = requests.post(
-                            UPLOAD_URL,
-                            files=files,
-                            timeout=60,
-                        )
-
-                        if response.status_code == 200:
-                            st.success(f"✅ {uploaded_file.name}")
-                        else:
-                            st.error(f"❌ Error en {uploaded_file.name}")
-
-                    except Exception as e:
-                        st.error(f"❌ Error: {str(e)}")
-
+            total = len(uploaded_files)
+            progress = st.progress(0.0, text=f"Procesando 0/{total} PDFs...")
+            failed = 0
+
+            # Subidas concurrentes con un pool acotado; la UI se actualiza
+            # desde este hilo a medida que termina cada archivo
+            with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+                futures = {
+                    pool.submit(upload_pdf, f.name, f.getvalue()): f.name
+                    for f in uploaded_files
+                }
+
+                for done, future in enumerate(as_completed(futures), start=1):
+                    name = futures[future]
+                    ok, detail = future.result()
+
+                    if ok:
+                        st.success(f"✅ {name} ({detail.get('chunks_created', 0)} fragmentos nuevos)")
+                    else:
+                        failed += 1
+                        st.error(f"❌ Error en {name}: {detail}")
+
+                    progress.progress(done / total, text=f"Procesando {done}/{total} PDFs...")
+
+            fetch_documents.clear()
+
+            if failed:
+                st.warning(f"⚠️ {total - failed}/{total} PDFs procesados")
+            else:
                 st.success("🎉 ¡Todos los PDFs procesados!")
                 st.rerun()
 
@@ -82,60 +135,55 @@ with st.sidebar:
     st.header("📚 Documentos disponibles")
 
     try:
-        response = requests.get(DOCS_URL, timeout=10)
-
-        if response.status_code == 200:
-            data = response.json()
-            documents = data.get("documents", [])
-
-            if documents:
-                # Selector de documento
-                selected_doc = st.selectbox(
-                    "Buscar en:",
-                    ["Todos los documentos"] + documents,
-                    key="doc_selector",
-                )
-
-                # Guardar selección
-                st.session_state.selected_doc_id = (
-                    None if selected_doc == "Todos los documentos" else selected_doc
-                )
-
-                st.write(f"**Total: {len(documents)} documento(s)**")
+        documents = fetch_documents()
+    except Exception as e:
+        documents = None
+        st.error(f"Error al cargar documentos: {str(e)}")
 
-                # Lista de documentos con opción de eliminar
-                for doc in documents:
-                    col1, col2 = st.columns([3, 1])
+    if documents:
+        # Selector de documento
+        selected_doc = st.selectbox(
+            "Buscar en:",
+            ["Todos los documentos"] + documents,
+            key="doc_selector",
+        )
 
-                    with col1:
-                        st.text(f"📄 {doc}")
+        # Guardar selección
+        st.session_state.selected_doc_id = (
+            None if selected_doc == "Todos los documentos" else selected_doc
+        )
 
-                    with col2:
-                        if st.button("🗑️", key=f"delete_{doc}"):
-                            try:
-                                del_response = requests.delete(
-                                    f"{DOCS_URL}/{doc}",
-                                    timeout=10,
-                                )
+        st.write(f"**Total: {len(documents)} documento(s)**")
 
-                                if del_response.status_code == 200:
-                                    st.success(f"Eliminado: {doc}")
-                                    st.rerun()
-                                else:
-                                    st.error("Error al eliminar")
+        # Lista de documentos con opción de eliminar
+        for doc in documents:
+            col1, col2 = st.columns([3, 1])
 
-                            except Exception as e:
-                                st.error(f"Error: {str(e)}")
+            with col1:
+                st.text(f"📄 {doc}")
 
-            else:
-                st.info("No hay documentos cargados")
-                st.session_state.selected_doc_id = None
+            with col2:
+                if st.button("🗑️", key=f"delete_{doc}"):
+                    try:
+                        del_response = get_http_session().delete(
+                            f"{DOCS_URL}/{doc}",
+                            timeout=10,
+                        )
+                        deleted = del_response.status_code == 200
+                    except Exception as e:
+                        deleted = False
+                        st.error(f"Error: {str(e)}")
 
-        else:
-            st.error("No se pudo obtener la lista de documentos")
+                    if deleted:
+                        fetch_documents.clear()
+                        st.success(f"Eliminado: {doc}")
+                        st.rerun()
+                    else:
+                        st.error("Error al eliminar")
 
-    except Exception as e:
-        st.error(f"Error al cargar documentos: {str(e)}")
+    elif documents is not None:
+        st.info("No hay documentos cargados")
+        st.session_state.selected_doc_id = None
 
     st.divider()
 
@@ -192,15 +240,15 @@ if prompt := st.chat_input("Pregunta algo sobre tus PDFs..."):
     with st.chat_message("assistant"):
         with st.spinner("🤔 Pensando..."):
             try:
-                payload = {"query": prompt}
+                payload = {"query": prompt, "timeout": ASK_DEADLINE}
 
                 if st.session_state.get("selected_doc_id"):
                     payload["doc_id"] = st.session_state.selected_doc_id
 
-                response = requests.post(
+                response = get_http_session().post(
                     ASK_URL,
                     json=payload,
-                    timeout=60,
+                    timeout=ASK_TIMEOUT,
                 )
 
                 if response.status_code == 200:
@@ -9,34 +9,119 @@ from transformers.utils import logging
 logging.set_verbosity_error()
 
 import os
+import io
+import json
 import uuid
+import hmac
+import hashlib
+import asyncio
+import zipfile
+from typing import List
 
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, Request, HTTPException
+from fastapi.responses import StreamingResponse, PlainTextResponse, FileResponse
+from starlette.background import BackgroundTask
 
 # =========================
 # Imports internos del proyecto
 # =========================
 
-from modules.pdf_reader import extract_text_from_pdf
+from modules.pdf_reader import extract_pages_from_pdf
 from modules.embeddings_manager import (
-    store_embeddings,
+    update_document,
     search_similar,
     get_all_documents,
     delete_document,
+    embed_queries,
 )
-from modules.ask_manager import ask_gemini
-from modules.memory_manager import add_to_memory, get_memory
-from modules.hybrid_search import smart_search  # NUEVO
+from modules.ask_manager import ask_gemini, ask_with_info
+from modules.memory_manager import (
+    add_to_memory,
+    get_memory,
+    get_sent_fragments,
+    record_sent_fragments,
+)
+from modules.hybrid_search import smart_search, batch_smart_search
+from modules.prompt_builder import build_prompt, build_followup_prompt, build_history_prompt
+from modules.query_router import query_router, chat_answer
+from modules.ingest_pipeline import run_ingest_pipeline
+from modules.multi_model_manager import model_manager, LLM_MIN_BUDGET
+from modules.deadline import Deadline
+from modules.responses import (
+    FastJSONResponse,
+    SelectiveGZipMiddleware,
+    GZIP_MIN_SIZE,
+    SNIPPET_CHARS,
+    SEARCH_FIELDS,
+    ASK_FIELDS,
+    parse_fields,
+    project_search,
+    project_fields,
+)
+from modules.snapshot import export_snapshot, import_snapshot, SnapshotError
+from modules.profiler import (
+    run_in_threadpool,
+    sampling_profiler,
+    ProfileMiddleware,
+)
+from modules.single_flight import search_flight, ask_flight, normalize_query
+from modules.metrics import registry, timed
+from modules.logger import get_logger
+
+logger = get_logger("main")
 
 # =========================
 # Inicialización de la app
 # =========================
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=GZIP_MIN_SIZE)
 
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Límites del endpoint de preguntas por lotes
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "500"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+BATCH_PRIORITY = 1
+
+# Límites de los .zip de /upload_pdfs (tamaño descomprimido, según el
+# índice del zip, antes de leer nada en memoria)
+ZIP_MAX_MEMBER_BYTES = int(os.getenv("ZIP_MAX_MEMBER_MB", "200")) * 1024 * 1024
+ZIP_MAX_TOTAL_BYTES = int(os.getenv("ZIP_MAX_TOTAL_MB", "1024")) * 1024 * 1024
+
+# Volcar al log los fragmentos enviados a la IA (también con "debug" en /ask)
+LOG_FRAGMENTS = os.getenv("LOG_FRAGMENTS", "0") == "1"
+
+# Token para los endpoints de diagnóstico (sin token quedan desactivados)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def check_admin_token(token: str) -> bool:
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+def is_admin(request: Request) -> bool:
+    return check_admin_token(request.headers.get("x-admin-token", ""))
+
+
+# Respuesta parcial cuando se agota el plazo de /ask antes de generar
+PARTIAL_ANSWER = (
+    "⏱️ No se pudo generar una respuesta a tiempo. "
+    "Estos son los fragmentos más relevantes encontrados."
+)
+
+
+# =========================
+# Profiling por petición
+# =========================
+
+# Con las cabeceras X-Profile: 1 y X-Admin-Token, perfila con cProfile las
+# etapas que la petición ejecuta en el threadpool (ver modules.profiler).
+# Sin ADMIN_TOKEN no se registra: ninguna petición paga su coste.
+if ADMIN_TOKEN:
+    app.add_middleware(ProfileMiddleware, authorize=check_admin_token)
+
 
 # =========================
 # Endpoints
@@ -46,21 +131,25 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 async def upload_pdf(file: UploadFile = File(...)):
     """
     Sube un PDF, extrae su texto, genera embeddings y elimina el archivo físico.
+    Si el documento ya existe, solo re-procesa las páginas que cambiaron.
     """
     file_path = os.path.join(UPLOAD_DIR, file.filename)
 
     # Guardar archivo temporalmente
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+    content = await file.read()
+    with timed("upload_write"), open(file_path, "wb") as f:
+        f.write(content)
 
-    # Extraer texto del PDF
-    text = extract_text_from_pdf(file_path)
+    # Extraer texto del PDF (por página), fuera del event loop para que
+    # varias subidas concurrentes se procesen en paralelo
+    pages = await run_in_threadpool(extract_pages_from_pdf, file_path)
+    text = "".join(pages)
 
     # Eliminar archivo tras procesarlo
     os.remove(file_path)
 
-    # Generar embeddings y almacenar en la base vectorial
-    num_chunks = store_embeddings(file.filename, text)
+    # Generar embeddings solo de páginas nuevas o modificadas
+    update = await run_in_threadpool(update_document, file.filename, pages)
 
     # Preview del contenido
     preview = text[:500]
@@ -69,17 +158,96 @@ async def upload_pdf(file: UploadFile = File(...)):
         "filename": file.filename,
         "text_preview": preview,
         "characters_extracted": len(text),
-        "chunks_created": num_chunks,
+        "chunks_created": update["chunks_added"],
+        "chunks_reused": update["chunks_reused"],
+        "pages_changed": update["pages_changed"],
+    }
+
+
+@app.post("/upload_pdfs")
+async def upload_pdfs(files: List[UploadFile] = File(...)):
+    """
+    Ingesta masiva: acepta varios PDFs y/o archivos .zip con PDFs dentro.
+    Los procesa con el pipeline por etapas (extracción → embeddings → Chroma).
+    Los .zip corruptos o demasiado grandes se devuelven como error por archivo.
+    """
+    pending = []
+    rejected = []
+    seen = set()
+
+    def add_pending(name, content):
+        # Evitar rutas dentro del zip y nombres repetidos en el lote
+        doc_id = os.path.basename(name)
+        if not doc_id or doc_id in seen:
+            return
+        seen.add(doc_id)
+
+        file_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}_{doc_id}")
+        with timed("upload_write"), open(file_path, "wb") as f:
+            f.write(content)
+        pending.append((doc_id, file_path))
+
+    def reject(name, error):
+        logger.warning(f"⚠️ {name} descartado: {error}")
+        rejected.append({"filename": name, "status": "error", "error": error})
+
+    def add_archive(filename, content):
+        try:
+            with zipfile.ZipFile(io.BytesIO(content)) as archive:
+                members = [info for info in archive.infolist() if info.filename.lower().endswith(".pdf")]
+
+                total = sum(info.file_size for info in members)
+                if total > ZIP_MAX_TOTAL_BYTES:
+                    reject(filename, f"El zip descomprimido ocupa {total} bytes (máximo {ZIP_MAX_TOTAL_BYTES}).")
+                    return
+
+                for info in members:
+                    if info.file_size > ZIP_MAX_MEMBER_BYTES:
+                        reject(info.filename, f"Descomprimido ocupa {info.file_size} bytes (máximo {ZIP_MAX_MEMBER_BYTES}).")
+                        continue
+                    add_pending(info.filename, archive.read(info))
+        except (zipfile.BadZipFile, RuntimeError, NotImplementedError) as e:
+            # Zip corrupto, cifrado o con compresión no soportada
+            reject(filename, f"Zip no válido: {e}")
+
+    for file in files:
+        content = await file.read()
+
+        # Descompresión y escritura a disco fuera del event loop
+        if file.filename.lower().endswith(".zip"):
+            await run_in_threadpool(add_archive, file.filename, content)
+        else:
+            await run_in_threadpool(add_pending, file.filename, content)
+
+    if not pending and not rejected:
+        return {"error": "No se recibieron PDFs."}
+
+    results = await run_in_threadpool(run_ingest_pipeline, pending) if pending else []
+    results += rejected
+
+    return {
+        "results": results,
+        "count": len(results),
+        "chunks_created": sum(r.get("chunks_created", 0) for r in results),
     }
 
 
 @app.get("/search")
-def search(query: str, doc_id: str = None):
+def search(query: str, doc_id: str = None, fields: str = None, snippet_chars: int = SNIPPET_CHARS):
     """
     Endpoint simple de búsqueda vectorial (debug / testing).
+    fields limita la respuesta (p. ej. "ids,distances" o "ids,snippets",
+    con los documentos recortados a snippet_chars).
     """
-    results = search_similar(query, doc_id=doc_id)
-    return results
+    try:
+        selected = parse_fields(fields, SEARCH_FIELDS)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    # Búsquedas idénticas en curso comparten una sola consulta
+    key = ("search", normalize_query(query), doc_id)
+    results = search_flight.do(key, search_similar, query, doc_id=doc_id)
+    return FastJSONResponse(project_search(results, selected, snippet_chars))
 
 
 @app.get("/documents")
@@ -112,123 +280,360 @@ async def ask(request: dict):
     - Busca contexto relevante en PDFs
     - Construye prompt con fragmentos + memoria
     - Llama al modelo LLM
+    Peticiones idénticas en curso comparten la búsqueda y, si el prompt
+    no depende de la sesión, también la llamada al LLM.
+    El router de preguntas decide antes qué etapas hacen falta: los
+    saludos reconocidos no buscan ni llaman al LLM, los seguimientos se
+    responden con el historial y los datos exactos buscan solo por
+    keywords ("route").
+    "timeout" (s, opcional) fija el plazo total; si se agota antes de
+    tener respuesta se devuelven solo las fuentes ("partial": true).
     """
 
+    deadline = Deadline.from_request(request.get("timeout"))
+
     question = request.get("query")
     doc_id = request.get("doc_id")
 
     if not question:
         return {"error": "Falta el campo 'query'."}
 
+    # Proyección opcional de la respuesta (p. ej. ["answer", "sources"])
+    try:
+        fields = parse_fields(request.get("fields"), ASK_FIELDS)
+    except ValueError as e:
+        return {"error": str(e)}
+
     # Manejo de sesión de conversación
     session_id = request.get("session_id", str(uuid.uuid4()))
+    has_history = bool(get_memory(session_id))
     add_to_memory(session_id, "user", question)
 
+    # =========================
+    # Router de preguntas
+    # =========================
+
+    route = await run_in_threadpool(query_router.route, question, has_history=has_history)
+
+    if route["canned"]:
+        query_router.record_skipped(route)
+        answer = chat_answer(question)
+        add_to_memory(session_id, "assistant", answer)
+        return FastJSONResponse(project_fields({
+            "session_id": session_id,
+            "question": question,
+            "answer": answer,
+            "chunks_found": 0,
+            "sources": [],
+            "searched_in": doc_id if doc_id else "all documents",
+            "partial": False,
+            "degraded": [],
+            "route": route["route"],
+        }, fields))
+
     # =========================
     # Búsqueda híbrida de contexto
     # =========================
 
-    search_results = smart_search(question, doc_id=doc_id)
+    if route["mode"] is None:
+        search_results = {}
+    else:
+        try:
+            search_results = await run_in_threadpool(
+                search_flight.do,
+                ("smart", normalize_query(question), doc_id, route["mode"], route["top_k"]),
+                smart_search,
+                question,
+                wait_deadline=deadline,
+                doc_id=doc_id,
+                deadline=deadline,
+                mode=route["mode"],
+                top_k=route["top_k"],
+                query_embedding=route["query_embedding"],
+            )
+        except TimeoutError:
+            # La búsqueda idéntica en curso no terminó dentro de nuestro plazo
+            search_results = {"degraded": ["search"]}
+
+    query_router.record_skipped(route, search_results)
 
     # Resultados devueltos por Chroma
     chunks = search_results.get("documents", [[]])[0]
     metadatas = search_results.get("metadatas", [[]])[0]
+    fragment_ids = search_results.get("ids", [[]])[0]
 
     # =========================
-    # Construcción del contexto
+    # Construcción del prompt
     # =========================
 
-    if chunks:
-        context_parts = []
-        sources = []
-
-        for idx, (chunk, meta) in enumerate(zip(chunks, metadatas)):
-            doc_name = meta.get("doc_id", "desconocido")
-            page = meta.get("approx_page", "?")
-            chunk_num = meta.get("chunk_index", idx)
-
-            context_parts.append(
-                f"[FRAGMENTO {idx+1} - {doc_name} - Página ~{page}]\n{chunk}"
-            )
-
-            sources.append({
-                "fragment": idx + 1,
-                "document": doc_name,
-                "page": page,
-                "chunk_index": chunk_num,
-            })
-
-        context = "\n\n".join(context_parts)
+    if route["mode"] is None:
+        prompt, sources = build_history_prompt(question, get_memory(session_id)), []
+    else:
+        prompt, sources = build_prompt(
+            question,
+            chunks,
+            metadatas,
+            doc_id=doc_id,
+            history=get_memory(session_id),
+            log_fragments=LOG_FRAGMENTS or bool(request.get("debug")),
+        )
 
-        doc_info = (
-            f" del documento '{doc_id}'"
-            if doc_id
-            else " de los documentos disponibles"
+    # Si Ollama conserva el contexto de la sesión, solo se envía lo nuevo
+    # (en un seguimiento, solo la pregunta)
+    session_prompt = None
+    if (chunks or route["mode"] is None) and model_manager.has_session_context(session_id):
+        session_prompt = build_followup_prompt(
+            question,
+            chunks,
+            metadatas,
+            fragment_ids,
+            get_sent_fragments(session_id),
         )
 
-        # =========================
-        # DEBUG: mostrar fragmentos enviados a la IA
-        # =========================
-        print("\n" + "=" * 80)
-        print("FRAGMENTOS ENVIADOS A LA IA:")
-        for idx, part in enumerate(context_parts[:5]):  # Mostrar primeros 5
-            print(f"\n--- Fragmento {idx+1} ---")
-            print(part[:200] + "..." if len(part) > 200 else part)
-        print("=" * 80 + "\n")
-
-        # =========================
-        # Prompt final
-        # =========================
-        prompt = f"""Eres un asistente que responde preguntas basándose ÚNICAMENTE en el siguiente contenido{doc_info}.
-
-CONTENIDO DEL PDF:
-{context}
-
-HISTORIAL DE LA CONVERSACIÓN:
-{get_memory(session_id)}
-
-PREGUNTA DEL USUARIO:
-{question}
-
-INSTRUCCIONES CRÍTICAS:
-1. Lee TODOS los fragmentos cuidadosamente antes de responder
-2. Si la respuesta está en algún fragmento, cítalo específicamente: "Según el Fragmento X..."
-3. Si buscas un número, fecha o dato específico, revisa TODOS los fragmentos
-4. Si te hacen una pregunta que no se relaciona con el contenido, respondela vagamente basándote en tu conocimiento general
-5. NO inventes información que no esté en los fragmentos
-6. Si un fragmento menciona algo parcialmente relacionado, menciónalo
-7. Si NO encuentras la información en NINGÚN fragmento, responde usando conocimiento general
-
-RESPUESTA:"""
+    # =========================
+    # Llamada al modelo
+    # =========================
 
+    if deadline.remaining() < LLM_MIN_BUDGET:
+        # La búsqueda consumió el plazo: no tiene sentido llamar al modelo
+        owner, result = session_id, {"success": False, "deadline_exceeded": True}
+    elif session_prompt is None:
+        # Mismo prompt = misma respuesta: se comparte la llamada en curso.
+        # El contexto de Ollama queda asociado a la sesión que la ejecutó.
+        try:
+            owner, result = await run_in_threadpool(
+                ask_flight.do,
+                ("ask", hashlib.sha256(prompt.encode("utf-8")).hexdigest()),
+                lambda: (session_id, ask_with_info(prompt, session_id=session_id, deadline=deadline)),
+                wait_deadline=deadline,
+            )
+        except TimeoutError:
+            owner, result = session_id, {"success": False, "deadline_exceeded": True}
     else:
-        # Caso sin PDFs o sin resultados relevantes
-        prompt = f"""El usuario pregunta: "{question}"
-
-Pero NO hay documentos PDF cargados en el sistema todavía, o no hay información relevante{' en el documento seleccionado' if doc_id else ''}.
-
-Responde de manera amigable explicando que:
-1. Necesita subir documentos PDF primero
-2. Una vez subidos, podrás responder preguntas sobre su contenido
-3. Mantén un tono útil y guía al usuario
-4. Responde vagamente con conocimiento general
-
-RESPUESTA:"""
+        owner, result = session_id, await run_in_threadpool(
+            ask_with_info, prompt, session_id=session_id, session_prompt=session_prompt,
+            deadline=deadline,
+        )
 
-        sources = []
+    # Plazo agotado sin respuesta: se devuelven solo las fuentes
+    partial = not result.get("success") and bool(result.get("deadline_exceeded"))
+    degraded = list(search_results.get("degraded", []))
 
-    # =========================
-    # Llamada al modelo
-    # =========================
+    if partial:
+        answer = PARTIAL_ANSWER
+        degraded.append("llm")
+    else:
+        answer = result["answer"]
+        add_to_memory(session_id, "assistant", answer)
 
-    answer = ask_gemini(prompt)
-    add_to_memory(session_id, "assistant", answer)
+    # Fragmentos que el modelo ya tiene en su contexto de sesión
+    session = result.get("session") if owner == session_id else None
+    record_sent_fragments(session_id, fragment_ids if session else [], reset=session != "reused")
 
-    return {
+    return FastJSONResponse(project_fields({
         "session_id": session_id,
         "question": question,
         "answer": answer,
         "chunks_found": len(chunks),
         "sources": sources,
         "searched_in": doc_id if doc_id else "all documents",
+        "partial": partial,
+        "degraded": degraded,
+        "route": route["route"],
+    }, fields))
+
+
+@app.post("/ask/batch")
+async def ask_batch(request: dict):
+    """
+    Preguntas por lotes (evaluación / QA masivo):
+    - Codifica todas las preguntas en un solo forward pass
+    - Una consulta multi-query a Chroma por cada doc_id
+    - Generación concurrente con límite BATCH_MAX_CONCURRENCY
+    Devuelve NDJSON: una línea por pregunta en cuanto termina. Si una
+    pregunta falla, su línea lleva {"index", "question", "error"} y el
+    resto del lote sigue.
+
+    Cada elemento de "queries" puede ser un string o
+    {"query": ..., "doc_id": ...}; "doc_id" global aplica por defecto.
+    """
+
+    items = request.get("queries")
+    default_doc_id = request.get("doc_id")
+
+    if not items or not isinstance(items, list):
+        return {"error": "Falta el campo 'queries' (lista de preguntas)."}
+
+    if len(items) > BATCH_MAX_QUERIES:
+        return {"error": f"Máximo {BATCH_MAX_QUERIES} preguntas por lote."}
+
+    questions = []
+    for item in items:
+        if isinstance(item, dict):
+            questions.append((item.get("query"), item.get("doc_id", default_doc_id)))
+        else:
+            questions.append((item, default_doc_id))
+
+    if not all(q for q, _ in questions):
+        return {"error": "Todas las preguntas deben tener texto."}
+
+    # Agrupar por doc_id para compartir la consulta multi-query
+    groups = {}
+    for index, (question, doc_id) in enumerate(questions):
+        groups.setdefault(doc_id, []).append(index)
+
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+    def failed(index, error):
+        logger.error(f"❌ Error en la pregunta {index} del lote: {error}")
+        return {"index": index, "question": questions[index][0], "error": str(error)}
+
+    async def answer_one(index, search_results):
+        question, doc_id = questions[index]
+
+        chunks = search_results.get("documents", [[]])[0]
+        metadatas = search_results.get("metadatas", [[]])[0]
+
+        prompt, sources = build_prompt(question, chunks, metadatas, doc_id=doc_id)
+
+        try:
+            async with semaphore:
+                # Prioridad baja: las preguntas interactivas pasan antes en la cola de Groq
+                answer = await run_in_threadpool(ask_gemini, prompt, priority=BATCH_PRIORITY)
+        except Exception as e:
+            return failed(index, e)
+
+        return {
+            "index": index,
+            "question": question,
+            "answer": answer,
+            "chunks_found": len(chunks),
+            "sources": sources,
+            "searched_in": doc_id if doc_id else "all documents",
+        }
+
+    async def stream_answers():
+        # Embeddings de todo el lote en un solo forward pass
+        try:
+            embeddings = await run_in_threadpool(embed_queries, [q for q, _ in questions])
+        except Exception as e:
+            for index in range(len(questions)):
+                yield json.dumps(failed(index, e), ensure_ascii=False) + "\n"
+            return
+
+        # Recuperación vectorizada por grupo de doc_id
+        tasks = []
+        for doc_id, indices in groups.items():
+            try:
+                batch_results = await run_in_threadpool(
+                    batch_smart_search,
+                    [questions[i][0] for i in indices],
+                    doc_id,
+                    query_embeddings=[embeddings[i] for i in indices],
+                )
+            except Exception as e:
+                for index in indices:
+                    yield json.dumps(failed(index, e), ensure_ascii=False) + "\n"
+                continue
+
+            for index, search_results in zip(indices, batch_results):
+                tasks.append(asyncio.create_task(answer_one(index, search_results)))
+
+        # Emitir cada respuesta en cuanto termina
+        for finished in asyncio.as_completed(tasks):
+            result = await finished
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(stream_answers(), media_type="application/x-ndjson")
+
+
+@app.get("/metrics")
+def metrics():
+    """
+    Métricas en formato Prometheus: latencia por etapa (p50/p95/p99).
+    """
+    return PlainTextResponse(
+        registry.render_prometheus(),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+@app.get("/stats")
+def stats(window: int = None):
+    """
+    Estadísticas en JSON: uso de cada modelo LLM, latencia por etapa y
+    rutas del router de preguntas (etapas evitadas).
+    window (s) limita los percentiles y la tasa de error de cada modelo
+    a los últimos segundos indicados.
+    """
+    return {
+        "models": model_manager.get_stats(window_seconds=window),
+        "stages": registry.snapshot(),
+        "single_flight": {
+            "search": search_flight.get_stats(),
+            "ask": ask_flight.get_stats(),
+        },
+        "router": query_router.get_stats(),
     }
+
+
+@app.get("/debug/profile")
+async def debug_profile(request: Request, seconds: float = 10, idle: bool = False):
+    """
+    Profiler por muestreo del worker durante `seconds` (máx. 60).
+    Devuelve pilas en formato collapsed (flamegraph.pl / speedscope).
+    Requiere la cabecera X-Admin-Token.
+    """
+    if not is_admin(request):
+        raise HTTPException(status_code=403, detail="Se requiere X-Admin-Token")
+
+    if sampling_profiler.busy:
+        raise HTTPException(status_code=409, detail="Ya hay un profiling en curso")
+
+    stacks = await run_in_threadpool(sampling_profiler.sample, seconds, include_idle=idle)
+    if stacks is None:
+        raise HTTPException(status_code=409, detail="Ya hay un profiling en curso")
+
+    return PlainTextResponse(stacks)
+
+
+@app.get("/admin/snapshot")
+async def download_snapshot(request: Request):
+    """
+    Exporta el índice completo (vectores float16, metadatos y texto de los
+    documentos) para aprovisionar otro nodo. Requiere X-Admin-Token.
+    """
+    if not is_admin(request):
+        raise HTTPException(status_code=403, detail="Se requiere X-Admin-Token")
+
+    path = os.path.join(UPLOAD_DIR, f"snapshot_{uuid.uuid4().hex}.snap")
+    await run_in_threadpool(export_snapshot, path)
+
+    return FileResponse(
+        path,
+        media_type="application/octet-stream",
+        filename="chatpdf.snap",
+        background=BackgroundTask(os.remove, path),
+    )
+
+
+@app.post("/admin/snapshot")
+async def upload_snapshot(request: Request, file: UploadFile = File(...)):
+    """
+    Carga un snapshot exportado con GET /admin/snapshot (o con
+    `python -m modules.snapshot export`). Requiere X-Admin-Token.
+    """
+    if not is_admin(request):
+        raise HTTPException(status_code=403, detail="Se requiere X-Admin-Token")
+
+    path = os.path.join(UPLOAD_DIR, f"snapshot_{uuid.uuid4().hex}.snap")
+    with open(path, "wb") as f:
+        while block := await file.read(8 * 1024 * 1024):
+            f.write(block)
+
+    try:
+        return await run_in_threadpool(import_snapshot, path)
+    except SnapshotError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        os.remove(path)
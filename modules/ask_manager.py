@@ -1,25 +1,33 @@
 import os 
 from modules.multi_model_manager import model_manager
+from modules.logger import get_logger
 
-def ask_gemini(prompt: str) -> str:
+logger = get_logger("ask_manager")
+
+def ask_gemini(prompt: str, priority: int = 0) -> str:
     """
     Función de compatibilidad - ahora usa Groq/Ollama
     (mantenemos el nombre para no romper código existente)
     """
     try:
-        result = model_manager.ask(prompt)
+        result = model_manager.ask(prompt, priority=priority)
         return result['answer']
     except Exception as e:
         # Imprime el error real en consola para depuración
-        print(f"[ask_gemini ERROR] Falló al generar respuesta: {e}")
+        logger.error(f"[ask_gemini ERROR] Falló al generar respuesta: {e}")
         return "❌ Error: Todos los modelos fallaron. Verifica tu conexión y configuración."
 
-def ask_with_info(prompt: str, preferred_model: str = None) -> dict:
+def ask_with_info(prompt: str, preferred_model: str = None,
+                  session_id: str = None, session_prompt: str = None,
+                  deadline=None) -> dict:
     """
-    Versión extendida que retorna más información
+    Versión extendida que retorna más información.
+    Con session_id, Ollama reutiliza el contexto de la sesión y recibe
+    solo session_prompt (el turno nuevo). deadline acota el tiempo total.
     """
     try:
-        return model_manager.ask(prompt, preferred_model)
+        return model_manager.ask(prompt, preferred_model, session_id=session_id,
+                                 session_prompt=session_prompt, deadline=deadline)
     except Exception as e:
-        print(f"[ask_with_info ERROR] Falló al generar respuesta: {e}")
+        logger.error(f"[ask_with_info ERROR] Falló al generar respuesta: {e}")
         return {"answer": "❌ Error: Todos los modelos fallaron. Verifica tu conexión y configuración."}
@@ -0,0 +1,45 @@
+import os
+import time
+from typing import Optional
+
+# =========================
+# Configuración global
+# =========================
+
+# Plazo por defecto de /ask (s): por debajo del timeout de 60 s del frontend
+ASK_DEADLINE_SECONDS = float(os.getenv("ASK_DEADLINE_SECONDS", "50"))
+
+# Límites aceptados desde el cliente
+MIN_DEADLINE_SECONDS = 1.0
+MAX_DEADLINE_SECONDS = 300.0
+
+
+class Deadline:
+    """
+    Plazo absoluto de una petición. Se crea al recibirla y se pasa a cada
+    etapa (búsqueda, LLM), que usa solo el presupuesto que queda.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def from_request(cls, value, default: float = ASK_DEADLINE_SECONDS) -> "Deadline":
+        """Plazo pedido por el cliente (acotado) o el valor por defecto"""
+        try:
+            seconds = float(value) if value is not None else default
+        except (TypeError, ValueError):
+            seconds = default
+        return cls(min(max(seconds, MIN_DEADLINE_SECONDS), MAX_DEADLINE_SECONDS))
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """Tiempo disponible para una etapa, sin superar su propio límite"""
+        remaining = self.remaining()
+        return remaining if cap is None else min(cap, remaining)
@@ -1,12 +1,28 @@
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
 from sentence_transformers import SentenceTransformer
 import chromadb
 from chromadb.config import Settings
 
+from modules import text_store
+from modules.metrics import timed
+
 # =========================
 # Configuración global
 # =========================
 
-CHROMA_DIR = "chroma_db"
+CHROMA_DIR = os.getenv("CHROMA_DIR", "chroma_db")
+
+# Número de shards (colecciones) en que se reparte el índice por documento.
+# Cambiarlo con datos existentes requiere exportar e importar un snapshot.
+SHARD_COUNT = max(1, int(os.getenv("SHARD_COUNT", "1")))
+
+# Hilos para consultar shards en paralelo, compartidos por todas las
+# peticiones: varios por shard para que un scatter-gather no espere en
+# cola detrás de los de otras peticiones concurrentes
+SHARD_POOL_WORKERS = max(1, int(os.getenv("SHARD_POOL_WORKERS", str(SHARD_COUNT * 4))))
 
 # Modelo de embeddings
 # all-MiniLM-L6-v2 es rápido y suficiente para PDFs largos
@@ -20,10 +36,38 @@ chroma_client = chromadb.Client(
     )
 )
 
-# Colección principal
-collection = chroma_client.get_or_create_collection(
-    name="deeppdf_docs"
-)
+# Shards: el 0 conserva el nombre de la colección original
+shards = [
+    chroma_client.get_or_create_collection(
+        name="deeppdf_docs" if i == 0 else f"deeppdf_docs_{i}"
+    )
+    for i in range(SHARD_COUNT)
+]
+
+_shard_pool = ThreadPoolExecutor(max_workers=SHARD_POOL_WORKERS) if SHARD_COUNT > 1 else None
+
+
+def collection_for(doc_id):
+    """Shard de un documento (hash estable del doc_id)"""
+    digest = hashlib.sha1(doc_id.encode("utf-8")).digest()
+    return shards[int.from_bytes(digest[:4], "big") % SHARD_COUNT]
+
+
+def group_by_shard(metadatas):
+    """Agrupa posiciones de chunks por shard: [(colección, [índices])]"""
+    groups = {}
+    for i, meta in enumerate(metadatas):
+        collection = collection_for(meta["doc_id"])
+        groups.setdefault(collection.name, (collection, []))[1].append(i)
+    return list(groups.values())
+
+
+def scatter(fn, collections=None):
+    """Ejecuta fn(colección) en varios shards en paralelo (en orden)"""
+    collections = shards if collections is None else collections
+    if _shard_pool is None or len(collections) == 1:
+        return [fn(c) for c in collections]
+    return list(_shard_pool.map(fn, collections))
 
 # =========================
 # Utilidades de chunking
@@ -63,79 +107,411 @@ def chunk_text(text, chunk_size=500, overlap=100):
 # Almacenamiento de embeddings
 # =========================
 
+def page_hash(page_text):
+    """Hash del texto extraído de una página (detecta páginas editadas)"""
+    return hashlib.sha256(page_text.encode("utf-8")).hexdigest()[:16]
+
+
+def chunk_pages(pages, chunk_size=500):
+    """
+    Chunking página a página: ningún chunk cruza páginas, así una página
+    editada solo afecta a sus propios chunks.
+    Los offsets char_start/char_end (y byte_start/byte_end en el text
+    store) son relativos al texto completo ("".join(pages)).
+    """
+    chunks = []
+    chunk_info = []
+    offset = 0
+
+    for page_num, page_text in enumerate(pages, start=1):
+        digest = page_hash(page_text)
+        page_chunks, page_meta = chunk_text(page_text, chunk_size)
+
+        for chunk, info in zip(page_chunks, page_meta):
+            chunks.append(chunk)
+            chunk_info.append({
+                "chunk_index": len(chunks) - 1,
+                "page": page_num,
+                "page_chunk": info["chunk_index"],
+                "page_hash": digest,
+                # Página real (+ estimación si una página es muy larga)
+                "approx_page": page_num + info["approx_page"] - 1,
+                "char_start": offset + info["char_start"],
+                "char_end": offset + info["char_end"]
+            })
+
+        offset += len(page_text)
+
+    text_store.byte_offsets(pages, chunk_info)
+
+    return chunks, chunk_info
+
+
+def _chunk_id(doc_id, info):
+    return f"{doc_id}_p{info['page']}_{info['page_hash'][:8]}_{info['page_chunk']}"
+
+
+def _chunk_metadata(doc_id, info):
+    return {
+        "doc_id": doc_id,
+        "chunk_index": info["chunk_index"],
+        "approx_page": info["approx_page"],
+        "page": info["page"],
+        "page_hash": info["page_hash"],
+        "char_start": info["char_start"],
+        "char_end": info["char_end"],
+        "byte_start": info["byte_start"],
+        "byte_end": info["byte_end"]
+    }
+
+
+def prepare_chunks(doc_id, pages):
+    """
+    Chunking + metadatos de un documento (sin embeddings).
+    pages: lista de textos por página (o un único string).
+    Retorna (chunks, metadatas, ids).
+    """
+    if isinstance(pages, str):
+        pages = [pages]
+
+    with timed("chunking"):
+        chunks, chunk_info = chunk_pages(pages)
+
+    metadatas = [_chunk_metadata(doc_id, info) for info in chunk_info]
+    ids = [_chunk_id(doc_id, info) for info in chunk_info]
+
+    return chunks, metadatas, ids
+
+
+def embed_chunks(chunks, batch_size=32):
+    """
+    Genera los embeddings de una lista de chunks.
+    IMPORTANTE: esto es lo más costoso en PDFs grandes
+    """
+    with timed("embedding"):
+        return model.encode(chunks, batch_size=batch_size).tolist()
+
+
+def insert_chunks(chunks, embeddings, metadatas, ids):
+    """
+    Inserta chunks ya procesados en Chroma (upsert: un id ya existente se
+    reemplaza en vez de ignorarse).
+    El texto vive en el text store; solo se duplica en Chroma si
+    CHROMA_STORE_TEXT está activo.
+    """
+    with timed("chroma_insert"):
+        # Normalmente todo el lote es de un documento (un solo shard)
+        for target, indices in group_by_shard(metadatas):
+            target.upsert(
+                documents=[chunks[i] for i in indices] if text_store.CHROMA_STORE_TEXT else None,
+                embeddings=[embeddings[i] for i in indices],
+                metadatas=[metadatas[i] for i in indices],
+                ids=[ids[i] for i in indices]
+            )
+
+
 def store_embeddings(doc_id, text):
     """
     Divide el texto, genera embeddings y los almacena en Chroma.
+    text puede ser el texto completo o la lista de textos por página.
     Retorna el número de chunks creados.
     """
 
-    # 1. Chunking
-    chunks, chunk_info = chunk_text(text)
+    # 1. Texto completo al text store + chunking y metadatos
+    pages = [text] if isinstance(text, str) else text
+    text_store.write_document(doc_id, "".join(pages))
+    chunks, metadatas, ids = prepare_chunks(doc_id, pages)
 
     if not chunks:
         return 0
 
     # 2. Generación de embeddings
-    # IMPORTANTE: esto es lo más costoso en PDFs grandes
-    embeddings = model.encode(chunks).tolist()
-
-    # 3. Construcción de metadatos
-    metadatas = [
-        {
-            "doc_id": doc_id,
-            "chunk_index": info["chunk_index"],
-            "approx_page": info["approx_page"],
-            "char_start": info["char_start"],
-            "char_end": info["char_end"]
-        }
-        for info in chunk_info
-    ]
+    embeddings = embed_chunks(chunks)
 
-    # 4. Almacenamiento en Chroma
-    collection.add(
-        documents=chunks,
-        embeddings=embeddings,
-        metadatas=metadatas,
-        ids=[f"{doc_id}_{i}" for i in range(len(chunks))]
-    )
+    # 3. Almacenamiento en Chroma
+    insert_chunks(chunks, embeddings, metadatas, ids)
 
     return len(chunks)
 
+def plan_update(doc_id, pages):
+    """
+    Calcula la re-ingesta incremental de un documento sin modificar nada.
+    Compara el hash de cada página con los guardados para doc_id: solo
+    las páginas nuevas o modificadas se re-chunkean y deben embeberse;
+    los chunks de páginas intactas conservan sus ids y vectores (solo se
+    actualizan sus metadatos: posición y offsets en el nuevo texto).
+    Si el documento no existe (o no tiene hashes por página), el plan
+    reemplaza todos sus chunks.
+    Retorna el plan que ejecuta apply_update.
+    """
+    if isinstance(pages, str):
+        pages = [pages]
+
+    existing = collection_for(doc_id).get(where={"doc_id": doc_id}, include=["metadatas"])
+    old_ids = existing.get("ids", [])
+    old_metas = existing.get("metadatas", [])
+
+    with timed("chunking"):
+        chunks, chunk_info = chunk_pages(pages)
+
+    plan = {
+        "doc_id": doc_id,
+        "text": "".join(pages),
+        "pages_total": len(pages),
+    }
+
+    # Documento nuevo o almacenado sin hashes por página: ingesta completa
+    if not old_ids or any("page_hash" not in (meta or {}) for meta in old_metas):
+        plan.update({
+            "chunks": chunks,
+            "metadatas": [_chunk_metadata(doc_id, info) for info in chunk_info],
+            "ids": [_chunk_id(doc_id, info) for info in chunk_info],
+            "stale_ids": list(old_ids),
+            "reused_ids": [],
+            "reused_metadatas": [],
+            "pages_changed": len(pages),
+        })
+        return plan
+
+    # Chunks almacenados agrupados por página: {(page, hash): [(page_chunk, id)]}
+    old_pages = {}
+    for chunk_id, meta in zip(old_ids, old_metas):
+        key = (meta["page"], meta["page_hash"])
+        old_pages.setdefault(key, []).append((meta.get("chunk_index", 0), chunk_id))
+
+    new_pages = {}
+    for chunk, info in zip(chunks, chunk_info):
+        new_pages.setdefault((info["page"], info["page_hash"]), []).append((chunk, info))
+
+    # Emparejar páginas por hash: primero en la misma posición y luego en
+    # cualquiera (cubre páginas insertadas o eliminadas)
+    old_by_hash = {}
+    for (page, digest), items in old_pages.items():
+        old_by_hash.setdefault(digest, []).append((page, [cid for _, cid in sorted(items)]))
+
+    matches = {}
+    for same_position in (True, False):
+        for (page, digest), items in sorted(new_pages.items()):
+            if (page, digest) in matches:
+                continue
+            for candidate in old_by_hash.get(digest, []):
+                if (candidate[0] == page or not same_position) and len(candidate[1]) == len(items):
+                    old_by_hash[digest].remove(candidate)
+                    matches[(page, digest)] = candidate[1]
+                    break
+
+    reused = []   # (ids antiguos, infos nuevas)
+    changed = []  # (chunk, info) a embeber
+
+    for key, items in sorted(new_pages.items()):
+        if key in matches:
+            reused.append((matches[key], [info for _, info in items]))
+        else:
+            changed.extend(items)
+
+    kept_ids = {cid for ids, _ in reused for cid in ids}
+
+    plan.update({
+        "chunks": [chunk for chunk, _ in changed],
+        "metadatas": [_chunk_metadata(doc_id, info) for _, info in changed],
+        "ids": [_chunk_id(doc_id, info) for _, info in changed],
+        "stale_ids": [cid for cid in old_ids if cid not in kept_ids],
+        "reused_ids": [cid for ids, _ in reused for cid in ids],
+        "reused_metadatas": [_chunk_metadata(doc_id, info) for _, infos in reused for info in infos],
+        "pages_changed": len({info["page"] for _, info in changed}),
+    })
+    return plan
+
+
+def apply_update(plan, embeddings):
+    """
+    Ejecuta un plan de plan_update con los embeddings de plan["chunks"].
+    El texto completo se reescribe siempre (los offsets pueden cambiar).
+    Retorna un resumen de lo realizado.
+    """
+    doc_id = plan["doc_id"]
+    collection = collection_for(doc_id)
+
+    text_store.write_document(doc_id, plan["text"])
+
+    # 1. Borrar chunks de páginas modificadas o eliminadas
+    if plan["stale_ids"]:
+        collection.delete(ids=plan["stale_ids"])
+
+    # 2. Insertar los chunks de las páginas nuevas o modificadas
+    if plan["chunks"]:
+        insert_chunks(plan["chunks"], embeddings, plan["metadatas"], plan["ids"])
+
+    # 3. Actualizar posición (página, offsets, índice) de los chunks reutilizados
+    if plan["reused_ids"]:
+        with timed("chroma_update"):
+            collection.update(ids=plan["reused_ids"], metadatas=plan["reused_metadatas"])
+
+    return {
+        "pages_total": plan["pages_total"],
+        "pages_changed": plan["pages_changed"],
+        "chunks_added": len(plan["chunks"]),
+        "chunks_reused": len(plan["reused_ids"]),
+        "chunks_deleted": len(plan["stale_ids"]),
+    }
+
+
+def update_document(doc_id, pages):
+    """
+    Re-ingesta incremental de un documento ya almacenado (ver plan_update):
+    solo se embeben las páginas nuevas o modificadas.
+    Si el documento no existe, lo almacena completo.
+    Retorna un resumen de lo realizado.
+    """
+    plan = plan_update(doc_id, pages)
+    embeddings = embed_chunks(plan["chunks"]) if plan["chunks"] else []
+    return apply_update(plan, embeddings)
+
 # =========================
 # Búsqueda semántica
 # =========================
 
-def search_similar(query, top_k=7, doc_id=None):
+def embed_query(query):
     """
-    Busca chunks similares a la query.
-    Puede filtrar por documento específico.
+    Genera el embedding de una query como lista de listas (formato Chroma).
     """
-
-    # Generar embedding de la query
-    query_embedding = model.encode(query)
+    with timed("query_embedding"):
+        query_embedding = model.encode(query)
 
     # Chroma espera lista de listas
     if query_embedding.ndim == 1:
-        query_embedding = [query_embedding.tolist()]
+        return [query_embedding.tolist()]
     elif query_embedding.ndim == 2:
-        query_embedding = query_embedding.tolist()
-    else:
-        raise ValueError(
-            f"Embedding con forma inesperada: {query_embedding.shape}"
-        )
+        return query_embedding.tolist()
+
+    raise ValueError(
+        f"Embedding con forma inesperada: {query_embedding.shape}"
+    )
+
+
+def embed_queries(queries):
+    """
+    Genera los embeddings de varias queries en un solo forward pass.
+    """
+    if not queries:
+        return []
+
+    with timed("query_embedding"):
+        return model.encode(list(queries)).tolist()
+
+
+def search_similar(query, top_k=7, doc_id=None, query_embedding=None,
+                   include_embeddings=False):
+    """
+    Busca chunks similares a la query.
+    Puede filtrar por documento específico.
+    Si ya se calculó el embedding de la query, se puede pasar en
+    query_embedding para no volver a codificarla. Con varias filas en
+    query_embedding se hace una única consulta multi-query a Chroma.
+    Con doc_id solo se consulta su shard; sin él, todos en paralelo y se
+    combinan los top_k por distancia.
+    """
+
+    # Generar embedding de la query
+    if query_embedding is None:
+        query_embedding = embed_query(query)
 
     # Filtro opcional por documento
     where_filter = {"doc_id": doc_id} if doc_id else None
 
-    # Consulta a Chroma
-    results = collection.query(
-        query_embeddings=query_embedding,
-        n_results=top_k,
-        where=where_filter
-    )
+    include = ["documents", "metadatas", "distances"]
+    if include_embeddings:
+        include.append("embeddings")
+
+    def query_shard(collection):
+        return collection.query(
+            query_embeddings=query_embedding,
+            n_results=top_k,
+            where=where_filter,
+            include=include
+        )
+
+    # Consulta a Chroma (scatter-gather entre shards)
+    with timed("chroma_query"):
+        targets = [collection_for(doc_id)] if doc_id else shards
+        partials = scatter(query_shard, targets)
+
+    results = partials[0] if len(partials) == 1 else _merge_query_results(partials, top_k, include)
+
+    # Texto de los chunks desde el text store (Chroma no lo guarda)
+    results["documents"] = [
+        text_store.hydrate(documents, metadatas)
+        for documents, metadatas in zip(results["documents"], results["metadatas"])
+    ]
 
     return results
 
+
+def _merge_query_results(partials, top_k, include):
+    """
+    Combina resultados de query de varios shards: por cada fila (query),
+    los top_k de menor distancia entre todos los shards.
+    """
+    keys = ["ids"] + include
+    merged = {key: [] for key in keys}
+
+    for row in range(len(partials[0]["ids"])):
+        hits = [
+            (distance, shard, pos)
+            for shard, partial in enumerate(partials)
+            for pos, distance in enumerate(partial["distances"][row])
+        ]
+        hits.sort(key=lambda hit: hit[0])
+
+        for key in keys:
+            merged[key].append([partials[shard][key][row][pos] for _, shard, pos in hits[:top_k]])
+
+    return merged
+
+
+def get_from_shards(include, where=None, collections=None):
+    """collection.get en varios shards (todos por defecto), concatenado"""
+    partials = scatter(lambda c: c.get(where=where, include=include), collections)
+
+    merged = {"ids": []}
+    for key in include:
+        merged[key] = []
+
+    for partial in partials:
+        merged["ids"].extend(partial.get("ids", []))
+        for key in include:
+            values = partial.get(key)
+            merged[key].extend(values if values is not None else [None] * len(partial.get("ids", [])))
+
+    return merged
+
+
+def get_chunk_embeddings(ids, metadatas=None):
+    """
+    Recupera los embeddings ya almacenados para una lista de ids.
+    Con los metadatas de esos chunks (doc_id) solo se consultan sus shards;
+    sin ellos, todos. Retorna un dict id -> embedding.
+    """
+    if not ids:
+        return {}
+
+    ids = list(ids)
+    if metadatas is None:
+        targets, ids_by_shard = shards, {c.name: ids for c in shards}
+    else:
+        groups = group_by_shard(metadatas)
+        targets = [collection for collection, _ in groups]
+        ids_by_shard = {c.name: [ids[i] for i in indices] for c, indices in groups}
+
+    partials = scatter(lambda c: c.get(ids=ids_by_shard[c.name], include=["embeddings"]), targets)
+
+    embeddings = {}
+    for items in partials:
+        if items.get("embeddings") is not None:
+            embeddings.update(zip(items.get("ids", []), items["embeddings"]))
+
+    return embeddings
+
 # =========================
 # Gestión de documentos
 # =========================
@@ -145,7 +521,7 @@ def get_all_documents():
     Retorna lista única de doc_id almacenados.
     """
     try:
-        all_items = collection.get()
+        all_items = get_from_shards(include=["metadatas"])
 
         if all_items and "metadatas" in all_items:
             doc_ids = {
@@ -166,7 +542,9 @@ def delete_document(doc_id):
     Elimina todos los chunks asociados a un documento.
     """
     try:
-        all_items = collection.get(where={"doc_id": doc_id})
+        collection = collection_for(doc_id)
+        all_items = collection.get(where={"doc_id": doc_id}, include=[])
+        text_store.delete_document(doc_id)
 
         if all_items and "ids" in all_items:
             collection.delete(ids=all_items["ids"])
@@ -1,6 +1,50 @@
+import os
 import re
-from typing import List, Dict
-from modules.embeddings_manager import search_similar, collection
+from typing import List, Dict, Optional
+
+import numpy as np
+
+from modules import text_store
+from modules.deadline import Deadline
+from modules.logger import get_logger
+from modules.metrics import timed
+from modules.embeddings_manager import (
+    search_similar,
+    embed_queries,
+    get_chunk_embeddings,
+    get_from_shards,
+    collection_for,
+)
+
+logger = get_logger("hybrid_search")
+
+# =========================
+# Configuración de fusión y poda
+# =========================
+
+# Constante k de Reciprocal Rank Fusion (valor estándar de la literatura)
+RRF_K = 60
+
+# Peso relevancia vs. diversidad en MMR (1.0 = solo relevancia)
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+
+# Presupuesto máximo de tokens de contexto enviados al LLM
+MAX_CONTEXT_TOKENS = int(os.getenv("MAX_CONTEXT_TOKENS", "2500"))
+
+# Estimación aproximada de caracteres por token
+CHARS_PER_TOKEN = 4
+
+# Candidatos por etapa antes de fusionar (multiplicador sobre top_k)
+CANDIDATE_MULTIPLIER = 2
+MAX_KEYWORD_CANDIDATES = 10
+
+# Contexto vecino (bytes a cada lado) leído del text store para cada chunk
+# elegido, mientras quede presupuesto de tokens. 0 lo desactiva.
+CONTEXT_NEIGHBOR_BYTES = int(os.getenv("CONTEXT_NEIGHBOR_BYTES", "0"))
+
+# Presupuesto mínimo (s) que debe quedar del plazo de la petición para
+# correr la búsqueda por keywords; si no, se usa solo la semántica
+KEYWORD_MIN_BUDGET = float(os.getenv("KEYWORD_MIN_BUDGET", "1.0"))
 
 def extract_keywords(query: str) -> List[str]:
     """
@@ -41,94 +85,368 @@ def keyword_search_in_chunks(keywords: List[str], all_documents: List[str]) -> L
     
     return [idx for idx, _ in matching_indices]
 
-def hybrid_search(query: str, top_k: int = 7, doc_id: str = None) -> Dict:
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> Dict[str, float]:
     """
-    Búsqueda híbrida: combina semántica + keywords
+    Fusiona varias listas ordenadas de ids con Reciprocal Rank Fusion.
+    Retorna un dict id -> score fusionado.
     """
-    
-    # 1. Búsqueda semántica (principal)
-    semantic_results = search_similar(query, top_k=top_k, doc_id=doc_id)
-    
-    # 2. Extraer keywords de la pregunta
-    keywords = extract_keywords(query)
-    
-    if not keywords:
-        # Si no hay keywords, retornar solo resultados semánticos
-        return semantic_results
-    
-    # 3. Obtener todos los documentos de la colección
-    try:
-        if doc_id:
-            all_items = collection.get(where={"doc_id": doc_id})
-        else:
-            all_items = collection.get()
-        
-        all_documents = all_items.get('documents', [])
-        all_metadatas = all_items.get('metadatas', [])
-        all_ids = all_items.get('ids', [])
-        
-        if not all_documents:
-            return semantic_results
-        
-        # 4. Buscar por keywords
-        keyword_indices = keyword_search_in_chunks(keywords, all_documents)
-        
-        # 5. Combinar resultados
-        # Índices de resultados semánticos
-        semantic_docs = semantic_results.get('documents', [[]])[0]
-        semantic_metas = semantic_results.get('metadatas', [[]])[0]
-        
-        # Crear set de documentos ya incluidos (para evitar duplicados)
-        included_docs = set(semantic_docs)
-        
-        # Agregar hasta 3 documentos adicionales basados en keywords
-        extra_docs = []
-        extra_metas = []
-        added = 0
-        
-        for idx in keyword_indices:
-            if added >= 3:  # Máximo 3 adicionales
-                break
-            
-            doc = all_documents[idx]
-            if doc not in included_docs:
-                extra_docs.append(doc)
-                extra_metas.append(all_metadatas[idx])
-                included_docs.add(doc)
-                added += 1
-        
-        # Combinar: primero semánticos, luego keywords
-        combined_docs = semantic_docs + extra_docs
-        combined_metas = semantic_metas + extra_metas
-        
-        print(f"🔍 Híbrido: {len(semantic_docs)} semánticos + {len(extra_docs)} por keywords")
-        
-        return {
-            'documents': [combined_docs],
-            'metadatas': [combined_metas],
-            'distances': semantic_results.get('distances', [[]]),
-            'ids': semantic_results.get('ids', [[]])
-        }
-    
-    except Exception as e:
-        print(f"⚠️ Error en búsqueda híbrida: {e}")
-        return semantic_results
+    scores = {}
+
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank + 1)
+
+    return scores
 
-def smart_search(query: str, doc_id: str = None) -> Dict:
+def estimate_tokens(text: str) -> int:
     """
-    Búsqueda inteligente que decide estrategia según la pregunta
+    Estimación barata de tokens (sin tokenizer) a partir de caracteres
+    """
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+def mmr_select(
+    candidate_ids: List[str],
+    relevance: Dict[str, float],
+    embeddings: Dict[str, List[float]],
+    texts: Dict[str, str],
+    top_k: int,
+    max_tokens: int = MAX_CONTEXT_TOKENS,
+    lambda_: float = MMR_LAMBDA,
+) -> List[str]:
+    """
+    Selección Maximal Marginal Relevance: elige chunks relevantes penalizando
+    los que se parecen a los ya elegidos, hasta top_k o hasta agotar el
+    presupuesto de tokens.
+    """
+    if not candidate_ids:
+        return []
+
+    # Normalizar relevancia a [0, 1]
+    max_rel = max(relevance.get(cid, 0.0) for cid in candidate_ids) or 1.0
+    rel = {cid: relevance.get(cid, 0.0) / max_rel for cid in candidate_ids}
+
+    # Embeddings normalizados (similitud coseno = producto punto)
+    vectors = {}
+    for cid in candidate_ids:
+        emb = embeddings.get(cid)
+        if emb is None:
+            continue
+        vec = np.asarray(emb, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vectors[cid] = vec / norm
+
+    selected = []
+    remaining = list(candidate_ids)
+    tokens_used = 0
+
+    while remaining and len(selected) < top_k:
+        best_id = None
+        best_score = None
+
+        for cid in remaining:
+            redundancy = 0.0
+            vec = vectors.get(cid)
+            if vec is not None:
+                for sid in selected:
+                    svec = vectors.get(sid)
+                    if svec is not None:
+                        redundancy = max(redundancy, float(np.dot(vec, svec)))
+
+            score = lambda_ * rel[cid] - (1 - lambda_) * redundancy
+
+            if best_score is None or score > best_score:
+                best_id, best_score = cid, score
+
+        remaining.remove(best_id)
+
+        # Respetar el presupuesto de tokens (siempre se incluye al menos uno)
+        cost = estimate_tokens(texts.get(best_id, ""))
+        if selected and tokens_used + cost > max_tokens:
+            continue
+
+        selected.append(best_id)
+        tokens_used += cost
+
+    return selected
+
+def expand_with_neighbors(
+    selected: List[str],
+    texts: Dict[str, str],
+    metas: Dict[str, Dict],
+    max_tokens: int = MAX_CONTEXT_TOKENS,
+    neighbor_bytes: int = CONTEXT_NEIGHBOR_BYTES,
+) -> Dict[str, str]:
+    """
+    Amplía el texto de los chunks elegidos con el contexto que los rodea
+    en el documento (text store), en orden de relevancia y solo mientras
+    el total siga dentro del presupuesto de tokens.
+    """
+    expanded = {cid: texts[cid] for cid in selected}
+    if neighbor_bytes <= 0:
+        return expanded
+
+    tokens_used = sum(estimate_tokens(text) for text in expanded.values())
+
+    for cid in selected:
+        window = text_store.chunk_text(metas.get(cid), before=neighbor_bytes, after=neighbor_bytes)
+        if not window:
+            continue
+
+        extra = estimate_tokens(window) - estimate_tokens(expanded[cid])
+        if tokens_used + extra > max_tokens:
+            break
+
+        expanded[cid] = window
+        tokens_used += extra
+
+    return expanded
+
+def fetch_keyword_corpus(doc_id: str = None) -> Dict:
+    """
+    Obtiene los chunks sobre los que corre la búsqueda por keywords
+    (el texto se lee del text store, no de Chroma)
+    """
+    if doc_id:
+        corpus = get_from_shards(["documents", "metadatas"], where={"doc_id": doc_id},
+                                 collections=[collection_for(doc_id)])
+    else:
+        corpus = get_from_shards(["documents", "metadatas"])
+
+    corpus["documents"] = text_store.hydrate(corpus.get("documents"), corpus.get("metadatas", []))
+    return corpus
+
+def hybrid_search(
+    query: str,
+    top_k: int = 7,
+    doc_id: str = None,
+    max_context_tokens: Optional[int] = None,
+    query_embedding: Optional[List[List[float]]] = None,
+    semantic_results: Optional[Dict] = None,
+    keyword_corpus: Optional[Dict] = None,
+    deadline: Optional[Deadline] = None,
+    mode: str = "hybrid",
+) -> Dict:
+    """
+    Búsqueda híbrida: combina semántica + keywords.
+    1. Recupera candidatos semánticos y por keywords
+    2. Los fusiona con Reciprocal Rank Fusion
+    3. Poda redundancia con MMR respetando el presupuesto de tokens
+    4. Amplía los elegidos con contexto vecino si sobra presupuesto
+    semantic_results y keyword_corpus permiten reutilizar resultados ya
+    calculados (p. ej. en búsquedas por lotes).
+    Con deadline, las etapas opcionales (keywords, contexto vecino) se
+    omiten si no queda presupuesto; el resultado indica "degraded".
+    mode (lo elige el router de preguntas): "keyword" omite la búsqueda
+    semántica (sin embedding de la pregunta) y "semantic" la de keywords.
+    """
+    if max_context_tokens is None:
+        max_context_tokens = MAX_CONTEXT_TOKENS
+
+    # Keywords de la pregunta (sin ellas el modo keyword no tiene sentido)
+    keywords = extract_keywords(query) if mode != "semantic" else []
+
+    if mode == "keyword" and not keywords:
+        mode = "hybrid"
+
+    # 1. Búsqueda semántica (pedimos más candidatos que los finales)
+    if mode == "keyword":
+        semantic_results = {}
+    elif semantic_results is None:
+        semantic_results = search_similar(
+            query,
+            top_k=top_k * CANDIDATE_MULTIPLIER,
+            doc_id=doc_id,
+            query_embedding=query_embedding,
+            include_embeddings=True,
+        )
+
+    semantic_ids = semantic_results.get('ids', [[]])[0]
+    semantic_docs = semantic_results.get('documents', [[]])[0]
+    semantic_metas = semantic_results.get('metadatas', [[]])[0]
+    semantic_dists = semantic_results.get('distances', [[]])[0]
+    semantic_embs = semantic_results.get('embeddings')
+    semantic_embs = semantic_embs[0] if semantic_embs is not None else []
+
+    # Pool de candidatos: id -> datos del chunk
+    texts = dict(zip(semantic_ids, semantic_docs))
+    metas = dict(zip(semantic_ids, semantic_metas))
+    distances = dict(zip(semantic_ids, semantic_dists))
+    embeddings = dict(zip(semantic_ids, semantic_embs))
+
+    keyword_ids = []
+    degraded = []
+
+    if keywords and mode != "keyword" and keyword_corpus is None and deadline and deadline.remaining() < KEYWORD_MIN_BUDGET:
+        logger.info("⏱️ Sin presupuesto para la búsqueda por keywords, solo semántica")
+        degraded.append("keyword_search")
+        keywords = []
+
+    # 2. Búsqueda por keywords
+    if keywords:
+        try:
+            # 3. Obtener todos los documentos de la colección
+            if keyword_corpus is None:
+                keyword_corpus = fetch_keyword_corpus(doc_id)
+            all_items = keyword_corpus
+
+            all_documents = all_items.get('documents', [])
+            all_metadatas = all_items.get('metadatas', [])
+            all_ids = all_items.get('ids', [])
+
+            # 4. Buscar por keywords
+            with timed("keyword_search"):
+                keyword_indices = keyword_search_in_chunks(keywords, all_documents)
+
+            for idx in keyword_indices[:MAX_KEYWORD_CANDIDATES]:
+                cid = all_ids[idx]
+                keyword_ids.append(cid)
+                texts.setdefault(cid, all_documents[idx])
+                metas.setdefault(cid, all_metadatas[idx])
+
+            # Embeddings de los candidatos que solo vinieron por keywords
+            # (en modo keyword MMR usa solo relevancia y presupuesto)
+            if mode != "keyword":
+                missing = [cid for cid in keyword_ids if cid not in embeddings]
+                embeddings.update(get_chunk_embeddings(missing, [metas[cid] for cid in missing]))
+
+        except Exception as e:
+            logger.warning(f"⚠️ Error en búsqueda por keywords: {e}")
+            keyword_ids = []
+
+    # Ningún chunk contiene las keywords: búsqueda híbrida completa
+    if mode == "keyword" and not keyword_ids:
+        logger.debug("🔍 Sin coincidencias por keywords, se usa la búsqueda híbrida")
+        return hybrid_search(
+            query, top_k=top_k, doc_id=doc_id, max_context_tokens=max_context_tokens,
+            query_embedding=query_embedding, keyword_corpus=keyword_corpus, deadline=deadline,
+        )
+
+    # 5. Fusión RRF de ambos rankings
+    fused = reciprocal_rank_fusion([semantic_ids, keyword_ids])
+    candidates = sorted(fused, key=fused.get, reverse=True)
+
+    # 6. Poda de redundancia + límite de tokens
+    selected = mmr_select(
+        candidates,
+        relevance=fused,
+        embeddings=embeddings,
+        texts=texts,
+        top_k=top_k,
+        max_tokens=max_context_tokens,
+    )
+
+    # 7. Contexto vecino desde el text store
+    if deadline and deadline.expired():
+        degraded.append("neighbor_context")
+        texts = {cid: texts[cid] for cid in selected}
+    else:
+        texts = expand_with_neighbors(selected, texts, metas, max_tokens=max_context_tokens)
+
+    logger.debug(
+        f"🔍 Híbrido: {len(semantic_ids)} semánticos + {len(keyword_ids)} por keywords "
+        f"→ {len(candidates)} fusionados → {len(selected)} tras poda"
+    )
+
+    return {
+        'documents': [[texts[cid] for cid in selected]],
+        'metadatas': [[metas[cid] for cid in selected]],
+        'distances': [[distances.get(cid) for cid in selected]],
+        'ids': [selected],
+        'scores': [[fused[cid] for cid in selected]],
+        'degraded': degraded,
+        'mode': mode,
+    }
+
+def choose_top_k(query: str) -> int:
+    """
+    Decide cuántos fragmentos recuperar según la pregunta
     """
-    
-    query_lower = query.lower()
-    
     # Detectar si busca algo muy específico (número, fecha, nombre exacto)
     has_number = bool(re.search(r'\d{3,}', query))  # 3+ dígitos consecutivos
     has_date = bool(re.search(r'\d{1,2}[-/]\d{1,2}[-/]\d{2,4}', query))
     
-    # Si busca algo muy específico, aumentar fragmentos y usar híbrido
+    # Si busca algo muy específico, aumentar fragmentos
     if has_number or has_date:
-        print("🎯 Búsqueda específica detectada (número/fecha)")
-        return hybrid_search(query, top_k=10, doc_id=doc_id)
+        logger.debug("🎯 Búsqueda específica detectada (número/fecha)")
+        return 10
     
-    # Para preguntas generales, usar híbrido estándar
-    return hybrid_search(query, top_k=7, doc_id=doc_id)
\ No newline at end of file
+    # Para preguntas generales, top_k estándar
+    return 7
+
+def smart_search(query: str, doc_id: str = None, max_context_tokens: Optional[int] = None,
+                 deadline: Optional[Deadline] = None, mode: str = "hybrid",
+                 top_k: Optional[int] = None,
+                 query_embedding: Optional[List[List[float]]] = None) -> Dict:
+    """
+    Búsqueda inteligente que decide estrategia según la pregunta.
+    mode, top_k y query_embedding vienen del router de preguntas.
+    """
+    return hybrid_search(query, top_k=top_k or choose_top_k(query), doc_id=doc_id,
+                         max_context_tokens=max_context_tokens, deadline=deadline,
+                         mode=mode, query_embedding=query_embedding)
+
+def _result_row(results: Dict, row: int, limit: int) -> Dict:
+    """
+    Extrae la fila de una consulta multi-query de Chroma como resultado simple
+    """
+    sliced = {}
+    for key in ('ids', 'documents', 'metadatas', 'distances', 'embeddings'):
+        rows = results.get(key)
+        if rows is not None:
+            sliced[key] = [rows[row][:limit]]
+    return sliced
+
+def batch_smart_search(
+    queries: List[str],
+    doc_id: str = None,
+    max_context_tokens: Optional[int] = None,
+    query_embeddings: Optional[List[List[float]]] = None,
+) -> List[Dict]:
+    """
+    Versión por lotes de smart_search para muchas preguntas sobre el mismo
+    alcance (doc_id): un solo forward pass de embeddings, una sola consulta
+    multi-query a Chroma y un solo escaneo del corpus para keywords.
+    query_embeddings permite pasar los embeddings ya calculados (p. ej. de
+    un lote repartido entre varios doc_id).
+    """
+    if not queries:
+        return []
+
+    top_ks = [choose_top_k(q) for q in queries]
+    fetch_k = max(top_ks) * CANDIDATE_MULTIPLIER
+
+    # 1. Embeddings de todas las queries de una vez
+    if query_embeddings is None:
+        query_embeddings = embed_queries(queries)
+
+    # 2. Consulta multi-query a Chroma
+    semantic_batch = search_similar(
+        None,
+        top_k=fetch_k,
+        doc_id=doc_id,
+        query_embedding=query_embeddings,
+        include_embeddings=True,
+    )
+
+    # 3. Corpus para keywords compartido entre todas las queries
+    keyword_corpus = None
+    if any(extract_keywords(q) for q in queries):
+        try:
+            keyword_corpus = fetch_keyword_corpus(doc_id)
+        except Exception as e:
+            logger.warning(f"⚠️ Error obteniendo corpus para keywords: {e}")
+            keyword_corpus = {}
+
+    results = []
+    for i, (query, top_k) in enumerate(zip(queries, top_ks)):
+        results.append(hybrid_search(
+            query,
+            top_k=top_k,
+            doc_id=doc_id,
+            max_context_tokens=max_context_tokens,
+            semantic_results=_result_row(semantic_batch, i, top_k * CANDIDATE_MULTIPLIER),
+            keyword_corpus=keyword_corpus,
+        ))
+
+    return results
\ No newline at end of file
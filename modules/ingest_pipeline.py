@@ -0,0 +1,171 @@
+import os
+import queue
+import threading
+from typing import Dict, List, Tuple
+
+from modules.pdf_reader import extract_pages_from_pdf
+from modules.embeddings_manager import plan_update, apply_update, embed_chunks
+from modules.logger import get_logger
+
+logger = get_logger("ingest_pipeline")
+
+# =========================
+# Configuración del pipeline
+# =========================
+
+# Workers de extracción (OCR / texto nativo): uno por núcleo por defecto
+EXTRACT_WORKERS = int(os.getenv("INGEST_EXTRACT_WORKERS", str(os.cpu_count() or 2)))
+
+# Workers de embeddings: el modelo ya paraleliza internamente
+EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "1"))
+
+# Tamaño de las colas entre etapas (backpressure)
+QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+
+EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "64"))
+
+# Marca de fin de trabajo entre etapas
+_DONE = object()
+
+
+def run_ingest_pipeline(
+    files: List[Tuple[str, str]],
+    extract_workers: int = EXTRACT_WORKERS,
+    embed_workers: int = EMBED_WORKERS,
+    queue_size: int = QUEUE_SIZE,
+) -> List[Dict]:
+    """
+    Ingiere varios PDFs con un pipeline productor/consumidor:
+
+        extracción+chunking (N hilos) → embeddings (M hilos) → inserción (1 hilo)
+
+    Las colas acotadas entre etapas mantienen ocupados a la vez los núcleos
+    de OCR y el modelo de embeddings sin acumular documentos en memoria.
+
+    Los documentos ya indexados se re-ingieren de forma incremental (igual
+    que /upload_pdf): solo se embeben las páginas nuevas o modificadas,
+    se borran los chunks obsoletos y se actualizan los metadatos del resto.
+
+    files: lista de (doc_id, ruta temporal). Los archivos se eliminan tras
+    extraer su texto. Retorna un resultado por archivo, en el orden recibido.
+    """
+    extract_workers = max(1, min(extract_workers, len(files) or 1))
+    embed_workers = max(1, embed_workers)
+
+    input_queue = queue.Queue()
+    embed_queue = queue.Queue(maxsize=queue_size)
+    insert_queue = queue.Queue(maxsize=queue_size)
+
+    results = {
+        doc_id: {"filename": doc_id, "status": "pending"}
+        for doc_id, _ in files
+    }
+    results_lock = threading.Lock()
+
+    def record(doc_id, **fields):
+        with results_lock:
+            results[doc_id].update(fields)
+
+    # ---------- Etapa 1: extracción + chunking ----------
+    def extract_stage():
+        while True:
+            item = input_queue.get()
+            if item is _DONE:
+                return
+
+            doc_id, file_path = item
+            try:
+                pages = extract_pages_from_pdf(file_path)
+                text = "".join(pages)
+                # El text store se reescribe en la etapa de inserción, junto
+                # con los offsets de los chunks que se conservan
+                plan = plan_update(doc_id, pages)
+
+                record(
+                    doc_id,
+                    text_preview=text[:500],
+                    characters_extracted=len(text),
+                )
+
+                # Sin páginas nuevas no hay nada que embeber, pero puede
+                # haber chunks que borrar o metadatos que actualizar
+                if plan["chunks"]:
+                    embed_queue.put((doc_id, plan))
+                else:
+                    insert_queue.put((doc_id, plan, []))
+
+            except Exception as e:
+                record(doc_id, status="error", error=str(e))
+
+            finally:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+
+    # ---------- Etapa 2: embeddings ----------
+    def embed_stage():
+        while True:
+            item = embed_queue.get()
+            if item is _DONE:
+                return
+
+            doc_id, plan = item
+            try:
+                embeddings = embed_chunks(plan["chunks"], batch_size=EMBED_BATCH_SIZE)
+                insert_queue.put((doc_id, plan, embeddings))
+            except Exception as e:
+                record(doc_id, status="error", error=str(e))
+
+    # ---------- Etapa 3: inserción en Chroma ----------
+    def insert_stage():
+        while True:
+            item = insert_queue.get()
+            if item is _DONE:
+                return
+
+            doc_id, plan, embeddings = item
+            try:
+                update = apply_update(plan, embeddings)
+                record(
+                    doc_id,
+                    status="done",
+                    chunks_created=update["chunks_added"],
+                    chunks_reused=update["chunks_reused"],
+                    chunks_deleted=update["chunks_deleted"],
+                    pages_changed=update["pages_changed"],
+                )
+            except Exception as e:
+                record(doc_id, status="error", error=str(e))
+
+    extract_threads = [
+        threading.Thread(target=extract_stage, daemon=True)
+        for _ in range(extract_workers)
+    ]
+    embed_threads = [
+        threading.Thread(target=embed_stage, daemon=True)
+        for _ in range(embed_workers)
+    ]
+    insert_thread = threading.Thread(target=insert_stage, daemon=True)
+
+    for thread in extract_threads + embed_threads + [insert_thread]:
+        thread.start()
+
+    for item in files:
+        input_queue.put(item)
+    for _ in extract_threads:
+        input_queue.put(_DONE)
+
+    # Cierre ordenado: cada etapa termina cuando la anterior vació su cola
+    for thread in extract_threads:
+        thread.join()
+    for _ in embed_threads:
+        embed_queue.put(_DONE)
+
+    for thread in embed_threads:
+        thread.join()
+    insert_queue.put(_DONE)
+
+    insert_thread.join()
+
+    logger.info(f"📦 Pipeline de ingesta: {len(files)} archivo(s) procesado(s)")
+
+    return [results[doc_id] for doc_id, _ in files]
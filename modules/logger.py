@@ -0,0 +1,27 @@
+import os
+import logging
+
+# =========================
+# Configuración global
+# =========================
+
+# Nivel de log configurable (DEBUG, INFO, WARNING, ERROR)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+_root = logging.getLogger("chatpdf")
+
+if not _root.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+    )
+    _root.addHandler(_handler)
+    _root.setLevel(LOG_LEVEL)
+    _root.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Logger del proyecto (hijo de "chatpdf"), p. ej. get_logger("hybrid_search")
+    """
+    return _root.getChild(name)
@@ -8,3 +8,14 @@ def add_to_memory(session_id, role, text):
 
 def get_memory(session_id):
     return "\n".join([f"{m['role']}: {m['text']}" for m in sessions.get(session_id, [])])
+
+# Fragmentos ya enviados al modelo en cada sesión (contexto reutilizado)
+sent_fragments = {}
+
+def get_sent_fragments(session_id):
+    return sent_fragments.get(session_id, set())
+
+def record_sent_fragments(session_id, fragment_ids, reset=False):
+    if reset or session_id not in sent_fragments:
+        sent_fragments[session_id] = set()
+    sent_fragments[session_id].update(fragment_ids)
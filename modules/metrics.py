@@ -0,0 +1,215 @@
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# =========================
+# Configuración global
+# =========================
+
+# Ventana de tiempo sobre la que se calculan los percentiles
+WINDOW_SECONDS = int(os.getenv("METRICS_WINDOW_SECONDS", "600"))
+
+# Máximo de muestras guardadas por serie (acota la memoria)
+MAX_SAMPLES = int(os.getenv("METRICS_MAX_SAMPLES", "2048"))
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+STAGE_METRIC = "chatpdf_stage_seconds"
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Percentil por vecino más cercano sobre una lista ya ordenada"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class Histogram:
+    """
+    Serie de latencias thread-safe.
+    Guarda totales acumulados (count/sum) y una ventana deslizante de
+    muestras recientes para calcular p50/p95/p99.
+    """
+
+    def __init__(self, window_seconds: int = WINDOW_SECONDS, max_samples: int = MAX_SAMPLES):
+        self.window_seconds = window_seconds
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._samples.append((now, value))
+            self.count += 1
+            self.sum += value
+
+    def values(self, window_seconds: Optional[int] = None) -> List[float]:
+        """Muestras dentro de la ventana (por defecto, la de la serie)"""
+        now = time.monotonic()
+        window = self.window_seconds if window_seconds is None else window_seconds
+        cutoff = now - min(window, self.window_seconds)
+
+        with self._lock:
+            # Descartar muestras fuera de la ventana de la serie
+            while self._samples and self._samples[0][0] < now - self.window_seconds:
+                self._samples.popleft()
+            return [value for ts, value in self._samples if ts >= cutoff]
+
+    def quantiles(self, qs=QUANTILES, window_seconds: Optional[int] = None) -> Dict[float, float]:
+        ordered = sorted(self.values(window_seconds))
+        return {q: _percentile(ordered, q) for q in qs}
+
+    def snapshot(self) -> Dict[str, float]:
+        q = self.quantiles()
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": round(q[0.5], 6),
+            "p95": round(q[0.95], 6),
+            "p99": round(q[0.99], 6),
+        }
+
+
+class Counter:
+    """Contador monótono thread-safe"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class MetricsRegistry:
+    """
+    Registro de histogramas y contadores por (nombre, etiquetas).
+    Se exporta en formato texto de Prometheus (tipos summary y counter).
+    """
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, Tuple], Histogram] = {}
+        self._counters: Dict[Tuple[str, Tuple], Counter] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram()
+            return hist
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        self.histogram(name, **labels).observe(value)
+
+    def counter(self, name: str, **labels) -> Counter:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                counter = self._counters[key] = Counter()
+            return counter
+
+    def inc(self, name: str, amount: int = 1, **labels) -> None:
+        self.counter(name, **labels).inc(amount)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """
+        Vista JSON: {nombre: {"etiqueta=valor,...": {count, sum, p50...}}}
+        (en los contadores, el valor es directamente el número)
+        """
+        with self._lock:
+            items = list(self._histograms.items())
+            counters = list(self._counters.items())
+
+        result: Dict[str, Dict] = {}
+        for (name, labels), hist in sorted(items):
+            label_key = ",".join(f"{k}={v}" for k, v in labels)
+            result.setdefault(name, {})[label_key] = hist.snapshot()
+        for (name, labels), counter in sorted(counters, key=lambda item: item[0]):
+            label_key = ",".join(f"{k}={v}" for k, v in labels)
+            result.setdefault(name, {})[label_key] = counter.value
+        return result
+
+    def render_prometheus(self) -> str:
+        """Exposición en formato texto de Prometheus"""
+        with self._lock:
+            items = list(self._histograms.items())
+            counters = list(self._counters.items())
+
+        lines = []
+        current = None
+
+        for (name, labels), hist in sorted(items):
+            if name != current:
+                current = name
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} summary")
+
+            quantiles = hist.quantiles()
+            for q in QUANTILES:
+                label_str = _format_labels(labels + (("quantile", str(q)),))
+                lines.append(f"{name}{label_str} {quantiles[q]:.6f}")
+
+            label_str = _format_labels(labels)
+            lines.append(f"{name}_sum{label_str} {hist.sum:.6f}")
+            lines.append(f"{name}_count{label_str} {hist.count}")
+
+        for (name, labels), counter in sorted(counters, key=lambda item: item[0]):
+            if name != current:
+                current = name
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_format_labels(labels)} {counter.value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels) + "}"
+
+
+# Instancia global (singleton)
+registry = MetricsRegistry()
+registry.describe(STAGE_METRIC, "Latencia por etapa del pipeline (segundos)")
+
+
+def timed(stage: str, **labels):
+    """
+    Context manager para medir una etapa del pipeline:
+
+        with timed("embedding"):
+            ...
+    """
+    return registry.timer(STAGE_METRIC, stage=stage, **labels)
+
+
+def observe_stage(stage: str, seconds: float, **labels) -> None:
+    """Registra una duración ya medida para una etapa"""
+    registry.observe(STAGE_METRIC, seconds, stage=stage, **labels)
@@ -1,8 +1,132 @@
 import os
+import time
+import threading
 import requests
-from typing import Dict, Any, Optional
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 
+from modules.logger import get_logger
+from modules.metrics import Histogram, observe_stage
+from modules.deadline import Deadline
+from modules.rate_limiter import ProviderLimiter, estimate_tokens, parse_duration
+
+logger = get_logger("multi_model_manager")
+
+# Endpoints de los proveedores (sobrescribibles para pruebas/benchmarks)
+GROQ_API_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+
+# Tiempo que Ollama mantiene el modelo cargado entre llamadas
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+# Ventana de contexto de Ollama (tokens) y sesiones con contexto reutilizable
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "4096"))
+OLLAMA_MAX_SESSIONS = int(os.getenv("OLLAMA_MAX_SESSIONS", "100"))
+
+OLLAMA_NUM_PREDICT = 1000
+
+# Cuotas de Groq (se ajustan con las cabeceras x-ratelimit-* de cada respuesta)
+GROQ_RPM = int(os.getenv("GROQ_RPM", "30"))
+GROQ_TPM = int(os.getenv("GROQ_TPM", "6000"))
+GROQ_MAX_TOKENS = 1000
+
+# Espera máxima en la cola de Groq antes de pasar al siguiente proveedor
+GROQ_MAX_QUEUE_WAIT = float(os.getenv("GROQ_MAX_QUEUE_WAIT", "5"))
+GROQ_MAX_QUEUE = int(os.getenv("GROQ_MAX_QUEUE", "32"))
+
+# Presupuesto mínimo (s) del plazo de la petición para intentar un proveedor
+LLM_MIN_BUDGET = float(os.getenv("LLM_MIN_BUDGET", "2"))
+
+# Ventana (s) de las estadísticas por proveedor (percentiles, tasa de error)
+PROVIDER_STATS_WINDOW = int(os.getenv("PROVIDER_STATS_WINDOW", "600"))
+
+# Timeout adaptativo: p99 observado en la ventana × factor, acotado.
+# Hasta tener LLM_TIMEOUT_MIN_SAMPLES muestras se usa el inicial de cada proveedor.
+LLM_TIMEOUT_P99_FACTOR = float(os.getenv("LLM_TIMEOUT_P99_FACTOR", "2"))
+LLM_TIMEOUT_MIN = float(os.getenv("LLM_TIMEOUT_MIN", "5"))
+LLM_TIMEOUT_MAX = float(os.getenv("LLM_TIMEOUT_MAX", "60"))
+LLM_TIMEOUT_MIN_SAMPLES = int(os.getenv("LLM_TIMEOUT_MIN_SAMPLES", "20"))
+
+
+class ProviderStats:
+    """
+    Estadísticas thread-safe de un proveedor: totales desde el arranque y
+    ventana deslizante (metrics.Histogram) de latencias y resultados, de
+    la que salen los percentiles, la tasa de error reciente y el timeout.
+
+    Las latencias solo incluyen llamadas con respuesta o que agotaron el
+    timeout: los fallos inmediatos (conexión rechazada) no deben bajarlo.
+    Un timeout entra con su duración, así que si se repiten el p99 sube
+    y el siguiente timeout se amplía.
+    """
+
+    def __init__(self, initial_timeout: float, window_seconds: int = PROVIDER_STATS_WINDOW):
+        self.initial_timeout = float(initial_timeout)
+        self.latency = Histogram(window_seconds)
+        self.outcomes = Histogram(window_seconds)  # 1.0 = error, 0.0 = éxito
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.throttled = 0
+        self.total_time = 0.0
+        self._timeout = self.initial_timeout
+
+    def record(self, elapsed: float, success: bool, timed_out: bool = False) -> None:
+        if success or timed_out:
+            self.latency.observe(elapsed)
+        self.outcomes.observe(0.0 if success else 1.0)
+
+        timeout = self._compute_timeout()
+        with self._lock:
+            self.calls += 1
+            self.errors += 0 if success else 1
+            self.total_time += elapsed
+            self._timeout = timeout
+
+    def record_throttled(self) -> None:
+        with self._lock:
+            self.throttled += 1
+
+    def _compute_timeout(self) -> float:
+        latencies = self.latency.values()
+        if len(latencies) < LLM_TIMEOUT_MIN_SAMPLES:
+            return self.initial_timeout
+        p99 = self.latency.quantiles((0.99,))[0.99]
+        return min(max(p99 * LLM_TIMEOUT_P99_FACTOR, LLM_TIMEOUT_MIN), LLM_TIMEOUT_MAX)
+
+    @property
+    def timeout(self) -> float:
+        with self._lock:
+            return self._timeout
+
+    def snapshot(self, window_seconds: Optional[int] = None) -> Dict[str, Any]:
+        with self._lock:
+            calls, errors, throttled, total_time = self.calls, self.errors, self.throttled, self.total_time
+            timeout = self._timeout
+
+        outcomes = self.outcomes.values(window_seconds)
+        q = self.latency.quantiles(window_seconds=window_seconds)
+        window = min(window_seconds or self.latency.window_seconds, self.latency.window_seconds)
+
+        return {
+            "calls": calls,
+            "errors": errors,
+            "avg_time": total_time / calls if calls > 0 else 0,
+            "success_rate": (calls - errors) / calls * 100 if calls > 0 else 0,
+            "throttled": throttled,
+            "timeout": round(timeout, 2),
+            "window": {
+                "seconds": window,
+                "calls": len(outcomes),
+                "errors": int(sum(outcomes)),
+                "error_rate": sum(outcomes) / len(outcomes) if outcomes else 0,
+                "p50": round(q[0.5], 3),
+                "p95": round(q[0.95], 3),
+                "p99": round(q[0.99], 3),
+            },
+        }
+
 
 class MultiModelManager:
     """
@@ -20,30 +144,45 @@ class MultiModelManager:
             "groq": {
                 "enabled": bool(os.getenv("GROQ_API_KEY")),
                 "key": os.getenv("GROQ_API_KEY"),
-                "url": "https://api.groq.com/openai/v1/chat/completions",
+                "url": GROQ_API_URL,
                 "model": "llama-3.3-70b-versatile",
                 "priority": 1,
-                "timeout": 15,
+                "initial_timeout": float(os.getenv("GROQ_TIMEOUT", "15")),
                 "description": "Groq (ultra rápido)",
             },
             "ollama": {
                 "enabled": self._check_ollama_available(),
-                "url": "http://localhost:11434/api/generate",
+                "url": f"{OLLAMA_URL}/api/generate",
                 "model": "llama3.2:1b",
                 "priority": 2,
-                "timeout": 30,
+                "initial_timeout": float(os.getenv("OLLAMA_TIMEOUT", "30")),
                 "description": "Ollama local (sin límites)",
             },
         }
 
         # =========================
-        # Estadísticas de uso
+        # Estadísticas de uso (y timeout adaptativo)
         # =========================
         self.stats = {
-            "groq": {"calls": 0, "errors": 0, "total_time": 0},
-            "ollama": {"calls": 0, "errors": 0, "total_time": 0},
+            name: ProviderStats(config["initial_timeout"])
+            for name, config in self.models.items()
         }
 
+        # =========================
+        # Rate limiting del lado cliente
+        # =========================
+        self.limiters = {
+            "groq": ProviderLimiter("groq", GROQ_RPM, GROQ_TPM, max_queue=GROQ_MAX_QUEUE),
+        }
+
+        # =========================
+        # Contexto de Ollama por sesión
+        # =========================
+        # session_id -> tokens de contexto devueltos por /api/generate
+        # (KV de la conversación: el siguiente turno solo envía lo nuevo)
+        self._ollama_sessions: "OrderedDict[str, List[int]]" = OrderedDict()
+        self._sessions_lock = threading.Lock()
+
     # ------------------------------------------------------------------
     # Utilidades internas
     # ------------------------------------------------------------------
@@ -51,27 +190,84 @@ class MultiModelManager:
     def _check_ollama_available(self) -> bool:
         """Verifica si Ollama está corriendo localmente"""
         try:
-            response = requests.get("http://localhost:11434/api/tags", timeout=5)
+            response = requests.get(f"{OLLAMA_URL}/api/tags", timeout=5)
             return response.status_code == 200
         except Exception:
             return False
 
+    def _get_session_context(self, session_id: Optional[str]) -> Optional[List[int]]:
+        if not session_id:
+            return None
+        with self._sessions_lock:
+            context = self._ollama_sessions.get(session_id)
+            if context is not None:
+                self._ollama_sessions.move_to_end(session_id)
+            return context
+
+    def _set_session_context(self, session_id: Optional[str], context: Optional[List[int]]) -> None:
+        if not session_id:
+            return
+        with self._sessions_lock:
+            # Sin contexto o demasiado largo para la ventana: se reinicia la sesión
+            if not context or len(context) > OLLAMA_NUM_CTX - OLLAMA_NUM_PREDICT:
+                self._ollama_sessions.pop(session_id, None)
+                return
+            self._ollama_sessions[session_id] = context
+            self._ollama_sessions.move_to_end(session_id)
+            while len(self._ollama_sessions) > OLLAMA_MAX_SESSIONS:
+                self._ollama_sessions.popitem(last=False)
+
+    def has_session_context(self, session_id: Optional[str]) -> bool:
+        """Indica si Ollama tiene contexto reutilizable para la sesión"""
+        return self._get_session_context(session_id) is not None
+
+    def reset_session(self, session_id: Optional[str]) -> None:
+        self._set_session_context(session_id, None)
+
     # ------------------------------------------------------------------
     # API pública
     # ------------------------------------------------------------------
 
-    def ask(self, prompt: str, preferred_model: Optional[str] = None) -> Dict[str, Any]:
+    def ask(
+        self,
+        prompt: str,
+        preferred_model: Optional[str] = None,
+        session_id: Optional[str] = None,
+        session_prompt: Optional[str] = None,
+        priority: int = 0,
+        deadline: Optional[Deadline] = None,
+    ) -> Dict[str, Any]:
         """
         Realiza una consulta a los modelos disponibles.
         Si preferred_model falla, usa fallback automático.
+        priority ordena la espera en la cola de rate limit (0 = interactiva,
+        valores mayores = trabajos por lotes).
+        Con deadline, cada proveedor recibe como timeout lo que queda del
+        plazo y no se intentan más proveedores cuando ya no alcanza
+        (el resultado lleva "deadline_exceeded").
+
+        Con session_id, Ollama reutiliza el contexto de los turnos previos
+        de la sesión y recibe solo session_prompt (el turno nuevo); el resto
+        de proveedores reciben siempre el prompt completo. El resultado
+        indica en "session" si el contexto se reutilizó ("reused"), se
+        inició ("new") o no aplica (None).
         """
         all_errors = []
+        call = {
+            "session_id": session_id,
+            "session_prompt": session_prompt,
+            "priority": priority,
+            "deadline": deadline,
+        }
+
+        def out_of_time():
+            return deadline is not None and deadline.remaining() < LLM_MIN_BUDGET
 
         # 1. Intentar modelo preferido si se especifica
-        if preferred_model and preferred_model in self.models:
-            result = self._try_model(preferred_model, prompt)
+        if preferred_model and preferred_model in self.models and not out_of_time():
+            result = self._try_model(preferred_model, prompt, **call)
             if result["success"]:
-                return result
+                return self._finish_session(result, session_id)
             all_errors.append({preferred_model: result.get("error")})
 
         # 2. Intentar modelos habilitados por prioridad
@@ -85,9 +281,13 @@ class MultiModelManager:
         )
 
         for model_name, _ in sorted_models:
-            result = self._try_model(model_name, prompt)
+            if out_of_time():
+                logger.warning(f"⏱️ Sin tiempo para intentar {model_name}")
+                all_errors.append({model_name: "plazo de la petición agotado"})
+                break
+            result = self._try_model(model_name, prompt, **call)
             if result["success"]:
-                return result
+                return self._finish_session(result, session_id)
             all_errors.append({model_name: result.get("error")})
 
         # 3. Si todos fallan
@@ -95,126 +295,232 @@ class MultiModelManager:
             "success": False,
             "answer": "❌ Error: Todos los modelos fallaron. Verifica tu conexión y configuración.",
             "errors": all_errors,
+            "session": None,
+            "deadline_exceeded": out_of_time(),
         }
 
+    def _finish_session(self, result: Dict[str, Any], session_id: Optional[str]) -> Dict[str, Any]:
+        # Si respondió otro proveedor, el contexto de Ollama ya no refleja
+        # la conversación: el próximo turno vuelve a enviar el prompt completo
+        if result.get("model") != "ollama":
+            self.reset_session(session_id)
+        result.setdefault("session", None)
+        return result
+
     # ------------------------------------------------------------------
     # Ejecución por modelo
     # ------------------------------------------------------------------
 
-    def _try_model(self, model_name: str, prompt: str) -> Dict[str, Any]:
+    def _try_model(
+        self,
+        model_name: str,
+        prompt: str,
+        session_id: Optional[str] = None,
+        session_prompt: Optional[str] = None,
+        priority: int = 0,
+        deadline: Optional[Deadline] = None,
+    ) -> Dict[str, Any]:
         """Intenta ejecutar un modelo específico"""
         config = self.models[model_name]
 
         if not config["enabled"]:
             return {"success": False, "error": f"{model_name} no está habilitado"}
 
-        self.stats[model_name]["calls"] += 1
+        # Esperar hueco en la cuota del proveedor (o ceder al siguiente)
+        limiter = self.limiters.get(model_name)
+        if limiter and not limiter.acquire(self._estimate_tokens(prompt), self._queue_wait(deadline), priority):
+            self.stats[model_name].record_throttled()
+            return {"success": False, "error": f"{model_name}: cuota agotada (rate limit local)"}
+
+        # Timeout de la llamada: el adaptativo del proveedor, acotado por el plazo
+        timeout = self.timeout_for(model_name, deadline)
+
         start_time = datetime.now()
 
         try:
-            print(f"🤖 Intentando con {config['description']}...")
+            logger.info(f"🤖 Intentando con {config['description']}...")
 
             if model_name == "groq":
-                result = self._call_groq(config, prompt)
+                result = self._call_groq(config, prompt, priority, timeout, deadline)
             elif model_name == "ollama":
-                result = self._call_ollama(config, prompt)
+                result = self._call_ollama(config, prompt, session_id, session_prompt, timeout)
             else:
                 raise ValueError("Modelo desconocido")
 
             elapsed = (datetime.now() - start_time).total_seconds()
-            self.stats[model_name]["total_time"] += elapsed
+            # La latencia del proveedor es la de su última petición HTTP
+            # (sin esperas de rate limit ni reintentos tras un 429)
+            self.stats[model_name].record(result.pop("latency", elapsed), result["success"])
+            observe_stage("llm_call", elapsed, provider=model_name)
 
             if result["success"]:
                 result["time"] = elapsed
                 result["model"] = model_name
-                print(f"✅ Respuesta de {config['description']} en {elapsed:.2f}s")
+                logger.info(f"✅ Respuesta de {config['description']} en {elapsed:.2f}s")
             else:
-                self.stats[model_name]["errors"] += 1
-                print(f"❌ Error en {model_name}: {result.get('error')}")
+                logger.warning(f"❌ Error en {model_name}: {result.get('error')}")
 
             return result
 
         except Exception as e:
-            self.stats[model_name]["errors"] += 1
-            print(f"❌ Excepción en {model_name}: {str(e)}")
+            elapsed = (datetime.now() - start_time).total_seconds()
+            self.stats[model_name].record(
+                getattr(e, "latency", elapsed), False, timed_out=isinstance(e, requests.Timeout)
+            )
+            logger.warning(f"❌ Excepción en {model_name}: {str(e)}")
             return {"success": False, "error": str(e)}
 
+    def timeout_for(self, model_name: str, deadline: Optional[Deadline] = None) -> float:
+        """Timeout adaptativo del proveedor (p99 reciente), acotado por el plazo"""
+        timeout = self.stats[model_name].timeout
+        return deadline.timeout(timeout) if deadline else timeout
+
     # ------------------------------------------------------------------
     # Implementaciones por proveedor
     # ------------------------------------------------------------------
 
-    def _call_groq(self, config: Dict, prompt: str) -> Dict[str, Any]:
-        """Llama a la API de Groq"""
-        response = requests.post(
-            config["url"],
-            headers={
-                "Authorization": f"Bearer {config['key']}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": config["model"],
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.3,
-                "max_tokens": 1000,
-                "top_p": 0.9,
-            },
-            timeout=config["timeout"],
-        )
+    @staticmethod
+    def _post(url: str, **kwargs):
+        """
+        requests.post midiendo solo el viaje HTTP. Retorna (respuesta,
+        segundos); si falla, la excepción lleva los segundos en `latency`.
+        """
+        start = time.perf_counter()
+        try:
+            return requests.post(url, **kwargs), time.perf_counter() - start
+        except Exception as e:
+            e.latency = time.perf_counter() - start
+            raise
+
+    @staticmethod
+    def _estimate_tokens(prompt: str) -> int:
+        return estimate_tokens(prompt, GROQ_MAX_TOKENS)
+
+    @staticmethod
+    def _queue_wait(deadline: Optional[Deadline]) -> float:
+        # La espera en cola debe dejar tiempo para la propia llamada
+        if deadline is None:
+            return GROQ_MAX_QUEUE_WAIT
+        return max(0.0, min(GROQ_MAX_QUEUE_WAIT, deadline.remaining() - LLM_MIN_BUDGET))
+
+    def _call_groq(self, config: Dict, prompt: str, priority: int = 0,
+                   timeout: Optional[float] = None, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """
+        Llama a la API de Groq.
+        El hueco en la cuota ya fue reservado por _try_model; ante un 429
+        se respeta retry-after y se reintenta una vez si llega a tiempo.
+        """
+        limiter = self.limiters["groq"]
+        estimated = self._estimate_tokens(prompt)
+
+        for attempt in range(2):
+            response, latency = self._post(
+                config["url"],
+                headers={
+                    "Authorization": f"Bearer {config['key']}",
+                    "Content-Type": "application/json",
+                },
+                json={
+                    "model": config["model"],
+                    "messages": [{"role": "user", "content": prompt}],
+                    "temperature": 0.3,
+                    "max_tokens": GROQ_MAX_TOKENS,
+                    "top_p": 0.9,
+                },
+                timeout=timeout if timeout is not None else self.timeout_for("groq"),
+            )
+
+            limiter.update_from_headers(response.headers)
+
+            if response.status_code != 429:
+                break
+
+            limiter.penalize(parse_duration(response.headers.get("retry-after")))
+            if attempt or not limiter.acquire(estimated, self._queue_wait(deadline), priority):
+                break
+            timeout = self.timeout_for("groq", deadline)
+            logger.info("⏳ Groq respondió 429, reintentando tras retry-after")
 
         if response.status_code == 200:
             data = response.json()
+            limiter.settle(estimated, (data.get("usage") or {}).get("total_tokens"))
             return {
                 "success": True,
                 "answer": data["choices"][0]["message"]["content"],
+                "latency": latency,
             }
 
         return {
             "success": False,
             "error": f"HTTP {response.status_code}: {response.text}",
+            "latency": latency,
         }
 
-    def _call_ollama(self, config: Dict, prompt: str) -> Dict[str, Any]:
-        """Llama a Ollama local"""
-        response = requests.post(
-            config["url"],
-            json={
-                "model": config["model"],
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.3,
-                    "top_p": 0.9,
-                    "num_predict": 1000,
-                },
+    def _call_ollama(
+        self,
+        config: Dict,
+        prompt: str,
+        session_id: Optional[str] = None,
+        session_prompt: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Llama a Ollama local.
+        keep_alive mantiene el modelo cargado; en una sesión con contexto
+        previo solo se envía el turno nuevo junto al contexto devuelto por
+        la llamada anterior, evitando re-procesar todo el historial.
+        """
+        context = self._get_session_context(session_id)
+        reuse = context is not None and bool(session_prompt)
+
+        payload = {
+            "model": config["model"],
+            "prompt": session_prompt if reuse else prompt,
+            "stream": False,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "options": {
+                "temperature": 0.3,
+                "top_p": 0.9,
+                "num_predict": OLLAMA_NUM_PREDICT,
+                "num_ctx": OLLAMA_NUM_CTX,
             },
-            timeout=config["timeout"],
+        }
+        if reuse:
+            payload["context"] = context
+
+        response, latency = self._post(
+            config["url"], json=payload, timeout=timeout if timeout is not None else self.timeout_for("ollama")
         )
 
         if response.status_code == 200:
             data = response.json()
-            return {"success": True, "answer": data["response"]}
+            self._set_session_context(session_id, data.get("context"))
+            return {
+                "success": True,
+                "answer": data["response"],
+                "session": ("reused" if reuse else "new") if session_id else None,
+                "latency": latency,
+            }
 
-        return {"success": False, "error": f"HTTP {response.status_code}"}
+        return {"success": False, "error": f"HTTP {response.status_code}", "latency": latency}
 
     # ------------------------------------------------------------------
     # Información y métricas
     # ------------------------------------------------------------------
 
-    def get_stats(self) -> Dict[str, Dict[str, float]]:
-        """Retorna estadísticas de uso por modelo"""
+    def get_stats(self, window_seconds: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Retorna estadísticas de uso por modelo: totales desde el arranque,
+        timeout actual y, en "window", percentiles de latencia y tasa de
+        error de los últimos window_seconds (por defecto PROVIDER_STATS_WINDOW)
+        """
         return {
             model: {
-                "calls": stats["calls"],
-                "errors": stats["errors"],
-                "avg_time": (
-                    stats["total_time"] / stats["calls"]
-                    if stats["calls"] > 0
-                    else 0
-                ),
-                "success_rate": (
-                    (stats["calls"] - stats["errors"]) / stats["calls"] * 100
-                    if stats["calls"] > 0
-                    else 0
+                **stats.snapshot(window_seconds),
+                **(
+                    {"rate_limit": self.limiters[model].get_stats()}
+                    if model in self.limiters
+                    else {}
                 ),
             }
             for model, stats in self.stats.items()
@@ -0,0 +1,145 @@
+import os
+import hashlib
+import threading
+from typing import Optional
+
+from modules.logger import get_logger
+
+logger = get_logger("ocr_cache")
+
+# =========================
+# Configuración global
+# =========================
+
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "ocr_cache")
+
+# Tamaño máximo del caché en disco (MB). 0 desactiva el caché.
+OCR_CACHE_MAX_MB = int(os.getenv("OCR_CACHE_MAX_MB", "256"))
+
+# Al desalojar, se baja hasta este porcentaje del máximo
+EVICT_TARGET_RATIO = 0.9
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 del contenido de un archivo (lectura por bloques)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(pdf_hash: str, page: int, dpi, lang: str, config: str) -> str:
+    """Clave de una página: (contenido del PDF, página, DPI, idioma, config)"""
+    raw = f"{pdf_hash}|{page}|{dpi}|{lang}|{config}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class OCRCache:
+    """
+    Caché persistente de texto OCR por página.
+    Un archivo por entrada; el mtime hace de marca LRU y se desalojan
+    las entradas más antiguas cuando se supera el tamaño máximo.
+    """
+
+    def __init__(self, directory: str = OCR_CACHE_DIR, max_bytes: int = OCR_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None  # se calcula en el primer uso
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.txt")
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".txt"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def _current_size(self) -> int:
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        return self._size
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except FileNotFoundError:
+            return None
+
+        # Marcar como usado recientemente (LRU)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        if not self.enabled:
+            return
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        data = text.encode("utf-8")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+
+        with self._lock:
+            size = self._current_size()
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self._size = size - previous + len(data)
+
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Elimina las entradas menos usadas hasta bajar del objetivo"""
+        target = int(self.max_bytes * EVICT_TARGET_RATIO)
+        entries = sorted(self._entries(), key=lambda e: e[2])
+
+        removed = 0
+        size = sum(s for _, s, _ in entries)
+        for path, entry_size, _ in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+                size -= entry_size
+                removed += 1
+            except FileNotFoundError:
+                continue
+
+        self._size = size
+        logger.info(f"🧹 Caché OCR: {removed} página(s) desalojada(s), {size / 1e6:.1f} MB en uso")
+
+    def clear(self) -> None:
+        with self._lock:
+            for path, _, _ in list(self._entries()):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self._size = 0
+
+
+# Instancia global (singleton)
+ocr_cache = OCRCache()
@@ -0,0 +1,224 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import PyPDF2
+
+from modules.logger import get_logger
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # backend opcional
+    pdfium = None
+
+logger = get_logger("pdf_backends")
+
+# =========================
+# Configuración global
+# =========================
+
+# Backend por defecto: pdfium si está instalado (mucho más rápido)
+PDF_BACKEND = os.getenv("PDF_BACKEND", "pdfium")
+
+# A partir de cuántas páginas se extrae en paralelo (procesos)
+PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# PDFium no es thread-safe (ni entre documentos distintos): toda llamada a
+# pypdfium2 de este proceso se serializa. El paralelismo real en PDFs
+# grandes viene de los procesos de extract_all_pages.
+_pdfium_lock = threading.RLock()
+
+
+# =========================
+# Interfaz de backends
+# =========================
+
+class PDFDocument:
+    """
+    Documento PDF abierto. Se abre una sola vez y se comparte entre la
+    detección de escaneos y la extracción; el texto por página se memoriza.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._texts: Dict[int, str] = {}
+
+    @property
+    def page_count(self) -> int:
+        raise NotImplementedError
+
+    def _extract_page(self, index: int) -> str:
+        raise NotImplementedError
+
+    def page_text(self, index: int) -> str:
+        if index not in self._texts:
+            self._texts[index] = self._extract_page(index) or ""
+        return self._texts[index]
+
+    def extracted_prefix(self) -> int:
+        """Número de páginas iniciales cuyo texto ya fue extraído"""
+        count = 0
+        while count in self._texts:
+            count += 1
+        return count
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PDFBackend:
+    """Backend de extracción de texto nativo"""
+
+    name = "base"
+
+    def open(self, path: str) -> PDFDocument:
+        raise NotImplementedError
+
+
+# ---------- PyPDF2 ----------
+
+class PyPDF2Document(PDFDocument):
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._reader = PyPDF2.PdfReader(path)
+
+    @property
+    def page_count(self) -> int:
+        return len(self._reader.pages)
+
+    def _extract_page(self, index: int) -> str:
+        return self._reader.pages[index].extract_text()
+
+
+class PyPDF2Backend(PDFBackend):
+    name = "pypdf2"
+
+    def open(self, path: str) -> PDFDocument:
+        return PyPDF2Document(path)
+
+
+# ---------- pdfium (pypdfium2) ----------
+
+class PdfiumDocument(PDFDocument):
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        with _pdfium_lock:
+            self._pdf = pdfium.PdfDocument(path)
+
+    @property
+    def page_count(self) -> int:
+        with _pdfium_lock:
+            return len(self._pdf)
+
+    def _extract_page(self, index: int) -> str:
+        with _pdfium_lock:
+            page = self._pdf[index]
+            textpage = page.get_textpage()
+            try:
+                return textpage.get_text_range().replace("\r\n", "\n")
+            finally:
+                textpage.close()
+                page.close()
+
+    def close(self) -> None:
+        with _pdfium_lock:
+            self._pdf.close()
+
+
+class PdfiumBackend(PDFBackend):
+    name = "pdfium"
+
+    def open(self, path: str) -> PDFDocument:
+        return PdfiumDocument(path)
+
+
+BACKENDS = {
+    "pypdf2": PyPDF2Backend,
+    "pdfium": PdfiumBackend,
+}
+
+
+def available_backends() -> List[str]:
+    return [name for name in BACKENDS if name != "pdfium" or pdfium is not None]
+
+
+def get_backend(name: Optional[str] = None) -> PDFBackend:
+    """
+    Retorna el backend pedido (o PDF_BACKEND). Si pdfium no está
+    instalado, usa PyPDF2.
+    """
+    name = (name or PDF_BACKEND).lower()
+
+    if name not in BACKENDS:
+        raise ValueError(f"Backend de PDF desconocido: {name}")
+
+    if name == "pdfium" and pdfium is None:
+        logger.debug("pypdfium2 no está instalado, se usa PyPDF2")
+        name = "pypdf2"
+
+    return BACKENDS[name]()
+
+
+# =========================
+# Extracción en paralelo
+# =========================
+
+_pool = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    # "spawn": el proceso principal tiene hilos (uvicorn, torch) y fork no es seguro
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=PDF_EXTRACT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def _extract_range(backend_name: str, path: str, start: int, end: int) -> List[str]:
+    """Worker: abre el PDF en el proceso hijo y extrae las páginas [start, end)"""
+    with get_backend(backend_name).open(path) as document:
+        return [document.page_text(i) for i in range(start, end)]
+
+
+def extract_all_pages(document: PDFDocument, backend: PDFBackend,
+                      workers: int = PDF_EXTRACT_WORKERS) -> List[str]:
+    """
+    Texto de todas las páginas de un documento abierto.
+    En PDFs grandes reparte rangos de páginas entre procesos (pdfium se
+    serializa con _pdfium_lock y PyPDF2 está limitado por el GIL); las
+    páginas ya leídas en el documento (p. ej. por is_scanned_pdf) se
+    reutilizan.
+    """
+    count = document.page_count
+
+    if count < PARALLEL_MIN_PAGES or workers <= 1:
+        return [document.page_text(i) for i in range(count)]
+
+    # Rangos contiguos, saltando las páginas ya leídas al inicio
+    first = min(document.extracted_prefix(), count)
+
+    step = max(1, -(-(count - first) // workers))
+    ranges = [(s, min(s + step, count)) for s in range(first, count, step)]
+
+    pool = _get_pool()
+    futures = [pool.submit(_extract_range, backend.name, document.path, s, e) for s, e in ranges]
+
+    texts = [document.page_text(i) for i in range(first)]
+    for future in futures:
+        texts.extend(future.result())
+
+    return texts
@@ -1,109 +1,277 @@
-import PyPDF2
 import pytesseract
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 import os
 import platform
+import time
+
+from modules.logger import get_logger
+from modules.metrics import timed, observe_stage
+from modules.ocr_cache import ocr_cache, file_hash, cache_key
+from modules.pdf_backends import get_backend, extract_all_pages
+
+logger = get_logger("pdf_reader")
 
 # Configuración para Windows
 if platform.system() == 'Windows':
     pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
+# Parámetros de OCR (forman parte de la clave del caché)
+OCR_DPI = 300
+OCR_LANG = 'spa+eng'  # Español e inglés
+OCR_CONFIG = '--psm 1'  # Automatic page segmentation with OSD
+OCR_CONFIG_NO_OSD = '--psm 3'  # Automatic page segmentation, sin OSD
+
+# Modo de OCR:
+# - "adaptive": primera pasada en gris a baja resolución y solo las páginas
+#   con baja confianza se repiten a OCR_DPI
+# - "fixed": todas las páginas a OCR_DPI en color (comportamiento original)
+OCR_MODE = os.getenv("OCR_MODE", "adaptive")
+OCR_FAST_DPI = int(os.getenv("OCR_FAST_DPI", "150"))
+OCR_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", "75"))
+
+# Si los escaneos vienen siempre derechos, se puede saltar la detección
+# de orientación (OSD) de Tesseract
+OCR_ASSUME_UPRIGHT = os.getenv("OCR_ASSUME_UPRIGHT", "0") == "1"
+
 def extract_text_from_pdf(pdf_path):
     """
     Extrae texto de un PDF.
     - Si tiene texto nativo, lo extrae directamente (rápido)
     - Si es escaneo/imagen, usa OCR (más lento)
     """
+    return "".join(extract_pages_from_pdf(pdf_path))
+
+def extract_pages_from_pdf(pdf_path):
+    """
+    Igual que extract_text_from_pdf pero retorna el texto por página.
+    Cada elemento ya incluye sus separadores, de modo que
+    "".join(pages) es el texto completo del documento.
+    """
     text = ""
     
     try:
         # PASO 1: Intentar extraer texto nativo
-        print(f"📖 Intentando extraer texto nativo de {pdf_path}...")
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            
-            for page_num, page in enumerate(pdf_reader.pages):
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-            
-            # Verificar si se extrajo texto suficiente
-            if len(text.strip()) > 100:  # Si hay más de 100 caracteres
-                print(f"✅ Texto nativo extraído: {len(text)} caracteres")
-                return text
+        # El PDF se abre una sola vez y se comparte entre detección y extracción
+        backend = get_backend()
+        logger.info(f"📖 Intentando extraer texto nativo de {pdf_path} ({backend.name})...")
+        with backend.open(pdf_path) as document:
+            # Detección de escaneo con las primeras páginas; su texto ya
+            # extraído se reutiliza en la extracción completa
+            if is_scanned_pdf(pdf_path, document):
+                logger.info("⚠️ Sin texto nativo en las primeras páginas (escaneo), intentando OCR...")
             else:
-                print("⚠️ Poco o ningún texto nativo, intentando OCR...")
-        
+                with timed("native_extraction"):
+                    page_texts = extract_all_pages(document, backend)
+
+                pages = [page_text + "\n" if page_text else "" for page_text in page_texts]
+                text = "".join(pages)
+
+                # Verificar si se extrajo texto suficiente
+                if len(text.strip()) > 100:  # Si hay más de 100 caracteres
+                    logger.info(f"✅ Texto nativo extraído: {len(text)} caracteres")
+                    return pages
+                else:
+                    logger.info("⚠️ Poco o ningún texto nativo, intentando OCR...")
+
         # PASO 2: Si no hay texto o es muy poco, usar OCR
-        print(f"🔍 Aplicando OCR a {pdf_path}...")
-        text = extract_text_with_ocr(pdf_path)
-        print(f"✅ OCR completado: {len(text)} caracteres")
+        logger.info(f"🔍 Aplicando OCR a {pdf_path}...")
+        pages = extract_pages_with_ocr(pdf_path)
+        logger.info(f"✅ OCR completado: {sum(len(p) for p in pages)} caracteres")
         
-        return text
+        return pages
     
     except Exception as e:
-        print(f"❌ Error al procesar PDF: {str(e)}")
+        logger.error(f"❌ Error al procesar PDF: {str(e)}")
         # Como último recurso, intentar OCR
         try:
-            return extract_text_with_ocr(pdf_path)
+            return extract_pages_with_ocr(pdf_path)
         except Exception as ocr_error:
-            return f"Error: No se pudo extraer texto del PDF. {str(e)}"
+            return [f"Error: No se pudo extraer texto del PDF. {str(e)}"]
+
+def _poppler_kwargs():
+    """Ruta de poppler en Windows (en Linux/Mac está en el PATH)"""
+    if platform.system() == 'Windows':
+        return {"poppler_path": r'C:\poppler\Library\bin'}
+    return {}
 
-def extract_text_with_ocr(pdf_path):
+def _page_runs(pages):
+    """Agrupa números de página consecutivos: [1,2,3,7] -> [(1,3),(7,7)]"""
+    runs = []
+    for page in pages:
+        if runs and page == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], page)
+        else:
+            runs.append((page, page))
+    return runs
+
+def _render_pages(pdf_path, first, last, dpi, grayscale=False):
+    """Rasteriza un tramo de páginas"""
+    logger.info(f"🖼️ Convirtiendo páginas {first}-{last} a imágenes ({dpi} DPI)...")
+    with timed("ocr_render"):
+        return convert_from_path(
+            pdf_path,
+            dpi=dpi,
+            first_page=first,
+            last_page=last,
+            grayscale=grayscale,
+            **_poppler_kwargs()
+        )
+
+def _ocr_image(image, config):
     """
-    Usa OCR (Tesseract) para extraer texto de PDFs escaneados
+    OCR de una imagen con la confianza media de Tesseract.
+    Retorna (texto, confianza 0-100).
     """
-    text = ""
-    
-    try:
-        # Convertir PDF a imágenes
-        print("🖼️ Convirtiendo PDF a imágenes...")
-        
-        # Detectar poppler path en Windows
-        if platform.system() == 'Windows':
-            poppler_path = r'C:\poppler\Library\bin'
-            images = convert_from_path(pdf_path, dpi=300, poppler_path=poppler_path)
-        else:
-            images = convert_from_path(pdf_path, dpi=300)
-        
-        print(f"📄 Procesando {len(images)} página(s) con OCR...")
-        
-        # Aplicar OCR a cada imagen
-        for i, image in enumerate(images):
-            print(f"   Página {i+1}/{len(images)}...")
-            
-            # OCR con Tesseract (español + inglés)
-            page_text = pytesseract.image_to_string(
+    page_start = time.perf_counter()
+    data = pytesseract.image_to_data(
+        image,
+        lang=OCR_LANG,
+        config=config,
+        output_type=pytesseract.Output.DICT
+    )
+    observe_stage("ocr_page", time.perf_counter() - page_start)
+
+    # Reconstruir el texto por líneas y párrafos
+    paragraphs = {}
+    confidences = []
+    for i, word in enumerate(data["text"]):
+        if not word.strip():
+            continue
+        paragraph = (data["block_num"][i], data["par_num"][i])
+        line = data["line_num"][i]
+        paragraphs.setdefault(paragraph, {}).setdefault(line, []).append(word)
+
+        conf = float(data["conf"][i])
+        if conf >= 0:
+            confidences.append(conf)
+
+    text = "\n\n".join(
+        "\n".join(" ".join(words) for _, words in sorted(lines.items()))
+        for _, lines in sorted(paragraphs.items())
+    )
+    confidence = sum(confidences) / len(confidences) if confidences else 0.0
+
+    return text, confidence
+
+def _ocr_fixed(pdf_path, pages, config):
+    """Todas las páginas a OCR_DPI en color"""
+    results = {}
+    for first, last in _page_runs(pages):
+        images = _render_pages(pdf_path, first, last, OCR_DPI)
+        for page, image in zip(range(first, last + 1), images):
+            page_start = time.perf_counter()
+            results[page] = pytesseract.image_to_string(
                 image,
-                lang='spa+eng',  # Español e inglés
-                config='--psm 1'  # Automatic page segmentation with OSD
+                lang=OCR_LANG,
+                config=config
             )
-            
-            text += f"\n--- Página {i+1} ---\n{page_text}\n"
-        
-        return text
+            observe_stage("ocr_page", time.perf_counter() - page_start)
+    return results
+
+def _ocr_adaptive(pdf_path, pages, config):
+    """
+    Pasada rápida en gris a OCR_FAST_DPI; las páginas con confianza menor
+    que OCR_MIN_CONFIDENCE se repiten a OCR_DPI.
+    """
+    results = {}
+    retry = []
+
+    for first, last in _page_runs(pages):
+        images = _render_pages(pdf_path, first, last, OCR_FAST_DPI, grayscale=True)
+        for page, image in zip(range(first, last + 1), images):
+            text, confidence = _ocr_image(image, config)
+            if confidence >= OCR_MIN_CONFIDENCE:
+                results[page] = text
+            else:
+                logger.debug(f"   Página {page}: confianza {confidence:.0f}, se repite a {OCR_DPI} DPI")
+                retry.append(page)
+
+    for first, last in _page_runs(retry):
+        images = _render_pages(pdf_path, first, last, OCR_DPI, grayscale=True)
+        for page, image in zip(range(first, last + 1), images):
+            results[page], _ = _ocr_image(image, config)
+
+    logger.info(f"⚡ OCR adaptativo: {len(pages) - len(retry)} página(s) en pasada rápida, {len(retry)} repetida(s)")
+    return results
+
+def extract_text_with_ocr(pdf_path, mode=None, assume_upright=None):
+    """
+    Usa OCR (Tesseract) para extraer texto de PDFs escaneados.
+    Ver extract_pages_with_ocr.
+    """
+    return "".join(extract_pages_with_ocr(pdf_path, mode, assume_upright))
+
+def extract_pages_with_ocr(pdf_path, mode=None, assume_upright=None):
+    """
+    OCR por página (cada elemento con su encabezado "--- Página N ---").
+    Consulta el caché de OCR por página antes de renderizar: solo se
+    rasterizan y procesan las páginas que no estén en caché.
+    mode: "adaptive" o "fixed" (por defecto OCR_MODE).
+    assume_upright: saltar la detección de orientación (OSD).
+    """
+    mode = mode or OCR_MODE
+    if assume_upright is None:
+        assume_upright = OCR_ASSUME_UPRIGHT
+    config = OCR_CONFIG_NO_OSD if assume_upright else OCR_CONFIG
+
+    # La resolución forma parte de la clave: en modo adaptativo, el par de DPI
+    dpi_key = OCR_DPI if mode == "fixed" else f"adaptive:{OCR_FAST_DPI}/{OCR_DPI}@{OCR_MIN_CONFIDENCE:g}"
+
+    try:
+        pdf_hash = file_hash(pdf_path)
+        num_pages = pdfinfo_from_path(pdf_path, **_poppler_kwargs())["Pages"]
+
+        # Páginas ya procesadas en ejecuciones anteriores
+        page_texts = {}
+        for page in range(1, num_pages + 1):
+            cached = ocr_cache.get(cache_key(pdf_hash, page, dpi_key, OCR_LANG, config))
+            if cached is not None:
+                page_texts[page] = cached
+
+        missing = [p for p in range(1, num_pages + 1) if p not in page_texts]
+        logger.info(
+            f"📄 OCR de {num_pages} página(s): {num_pages - len(missing)} en caché, "
+            f"{len(missing)} por procesar"
+        )
+
+        if mode == "fixed":
+            new_texts = _ocr_fixed(pdf_path, missing, config)
+        else:
+            new_texts = _ocr_adaptive(pdf_path, missing, config)
+
+        for page, page_text in new_texts.items():
+            ocr_cache.put(cache_key(pdf_hash, page, dpi_key, OCR_LANG, config), page_text)
+            page_texts[page] = page_text
+
+        return [
+            f"\n--- Página {page} ---\n{page_texts[page]}\n"
+            for page in range(1, num_pages + 1)
+        ]
     
     except Exception as e:
         raise Exception(f"Error en OCR: {str(e)}")
 
-def is_scanned_pdf(pdf_path):
+def is_scanned_pdf(pdf_path, document=None):
     """
     Detecta si un PDF es escaneo o tiene texto nativo
     Retorna True si es escaneo (necesita OCR)
+    Acepta un documento ya abierto (modules.pdf_backends) para no
+    volver a parsear el archivo.
     """
     try:
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            
-            # Revisar las primeras 3 páginas
-            pages_to_check = min(3, len(pdf_reader.pages))
-            total_text = ""
-            
-            for i in range(pages_to_check):
-                total_text += pdf_reader.pages[i].extract_text()
-            
-            # Si hay muy poco texto, probablemente es escaneo
-            return len(total_text.strip()) < 50
+        if document is None:
+            with get_backend().open(pdf_path) as opened:
+                return is_scanned_pdf(pdf_path, opened)
+
+        # Revisar las primeras 3 páginas
+        pages_to_check = min(3, document.page_count)
+        total_text = ""
+        
+        for i in range(pages_to_check):
+            total_text += document.page_text(i)
+        
+        # Si hay muy poco texto, probablemente es escaneo
+        return len(total_text.strip()) < 50
     
     except Exception:
-        return True  # Si hay error, asumir que necesita OCR
\ No newline at end of file
+        return True  # Si hay error, asumir que necesita OCR
@@ -0,0 +1,217 @@
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import contextvars
+from collections import Counter
+from typing import Callable, List, Optional
+
+from starlette.concurrency import run_in_threadpool as _run_in_threadpool
+
+from modules.logger import get_logger
+
+logger = get_logger("profiler")
+
+# =========================
+# Configuración global
+# =========================
+
+# Intervalo entre muestras del profiler por muestreo (s)
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+MAX_PROFILE_SECONDS = 60
+
+# Carpeta donde se guardan los cProfile por petición (.prof)
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# Frames hoja que indican un hilo en espera (se omiten por defecto)
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py", os.path.join("concurrent", "futures", "thread.py"))
+
+
+# =========================
+# Profiler por muestreo (todo el worker)
+# =========================
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_idle(frame) -> bool:
+    return frame.f_code.co_filename.endswith(_IDLE_FILES)
+
+
+class SamplingProfiler:
+    """
+    Profiler por muestreo de bajo overhead: cada SAMPLE_INTERVAL lee las
+    pilas de todos los hilos (sys._current_frames) y cuenta cada pila.
+    La salida es el formato "collapsed" (una pila por línea, frames
+    separados por ';' y el número de muestras), que aceptan flamegraph.pl
+    y speedscope.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def sample(self, seconds: float, interval: float = SAMPLE_INTERVAL,
+               include_idle: bool = False) -> Optional[str]:
+        """Muestrea durante `seconds`. Retorna None si ya hay otro en curso."""
+        if not self._lock.acquire(blocking=False):
+            return None
+
+        try:
+            seconds = min(max(seconds, interval), MAX_PROFILE_SECONDS)
+            me = threading.get_ident()
+            names = {}
+            stacks = Counter()
+            samples = 0
+
+            end = time.monotonic() + seconds
+            while time.monotonic() < end:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == me or (not include_idle and _is_idle(frame)):
+                        continue
+
+                    if thread_id not in names:
+                        names = {t.ident: t.name for t in threading.enumerate()}
+
+                    labels = []
+                    while frame is not None:
+                        labels.append(_frame_label(frame))
+                        frame = frame.f_back
+                    labels.append(names.get(thread_id, str(thread_id)))
+
+                    stacks[";".join(reversed(labels))] += 1
+
+                samples += 1
+                time.sleep(interval)
+
+            logger.info(f"🔬 Profiling: {samples} muestras en {seconds:.1f}s, {len(stacks)} pilas distintas")
+            return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+        finally:
+            self._lock.release()
+
+
+# Instancia global (singleton)
+sampling_profiler = SamplingProfiler()
+
+
+# =========================
+# cProfile por petición
+# =========================
+
+# Perfiles de la petición en curso (uno por cada llamada al threadpool)
+_request_profiles: contextvars.ContextVar[Optional[List[cProfile.Profile]]] = contextvars.ContextVar(
+    "request_profiles", default=None
+)
+
+
+def start_request_profile() -> contextvars.Token:
+    return _request_profiles.set([])
+
+
+def finish_request_profile(token: contextvars.Token) -> None:
+    # Debe llamarse en el mismo contexto que start_request_profile
+    _request_profiles.reset(token)
+
+
+def dump_request_profile(profiles: List[cProfile.Profile], name: str) -> Optional[str]:
+    """
+    Combina los perfiles recogidos durante la petición y los guarda en
+    PROFILE_DIR como .prof (pstats / snakeviz). Retorna la ruta.
+    """
+    if not profiles:
+        return None
+
+    stats = pstats.Stats(profiles[0])
+    for profile in profiles[1:]:
+        stats.add(profile)
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}_{name}.prof")
+    stats.dump_stats(path)
+
+    logger.info(f"🔬 cProfile de la petición guardado en {path}")
+    return path
+
+
+def _profiled(profiles: List[cProfile.Profile], func: Callable, *args, **kwargs):
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profile.disable()
+        profiles.append(profile)
+
+
+async def run_in_threadpool(func: Callable, *args, **kwargs):
+    """
+    Igual que starlette.concurrency.run_in_threadpool, pero si la petición
+    pidió profiling, la llamada se perfila con cProfile en su hilo.
+    """
+    profiles = _request_profiles.get()
+    if profiles is None:
+        return await _run_in_threadpool(func, *args, **kwargs)
+    return await _run_in_threadpool(_profiled, profiles, func, *args, **kwargs)
+
+
+# Nota cuando la petición no pasó por run_in_threadpool (p. ej. endpoints
+# síncronos, que Starlette ejecuta en su propio threadpool)
+NOT_PROFILED_NOTE = "sin etapas perfiladas: el endpoint no usa modules.profiler.run_in_threadpool"
+
+
+class ProfileMiddleware:
+    """
+    Middleware ASGI puro: con las cabeceras X-Profile: 1 y un token que
+    acepte `authorize`, perfila con cProfile las etapas que la petición
+    ejecuta con run_in_threadpool y devuelve la ruta del .prof en
+    X-Profile-File (o X-Profile-Note si no se perfiló nada).
+    El resto de peticiones pasan sin coste extra; main.py solo lo
+    registra si hay ADMIN_TOKEN.
+    """
+
+    def __init__(self, app, authorize: Callable[[str], bool]):
+        self.app = app
+        self.authorize = authorize
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        if headers.get(b"x-profile") != b"1" or not self.authorize(headers.get(b"x-admin-token", b"").decode("latin-1")):
+            await self.app(scope, receive, send)
+            return
+
+        token = start_request_profile()
+        profiles = _request_profiles.get()
+        name = scope["path"].strip("/").replace("/", "_") or "root"
+        dumped = None
+
+        async def send_with_profile(message):
+            # Al empezar la respuesta el endpoint ya terminó su trabajo.
+            # En un StreamingResponse este send corre en otra tarea (otro
+            # Context), así que aquí solo se lee la lista de perfiles
+            nonlocal dumped
+            if message["type"] == "http.response.start" and dumped is None:
+                dumped = len(profiles)
+                path = dump_request_profile(profiles, name)
+                header = (b"x-profile-file", path.encode()) if path else (b"x-profile-note", NOT_PROFILED_NOTE.encode())
+                message = {**message, "headers": [*message.get("headers", []), header]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            finish_request_profile(token)
+            # Etapas que corrieron después de las cabeceras (streaming)
+            if len(profiles) > (dumped or 0):
+                dump_request_profile(profiles, name)
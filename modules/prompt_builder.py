@@ -0,0 +1,159 @@
+from typing import Dict, List, Optional, Set, Tuple
+
+from modules.logger import get_logger
+from modules.metrics import timed
+
+logger = get_logger("prompt_builder")
+
+
+def build_prompt(
+    question: str,
+    chunks: List[str],
+    metadatas: List[Dict],
+    doc_id: Optional[str] = None,
+    history: str = "",
+    log_fragments: bool = False,
+) -> Tuple[str, List[Dict]]:
+    """
+    Construye el prompt final a partir de los fragmentos recuperados.
+    Retorna (prompt, sources).
+    """
+    with timed("prompt_build"):
+        return _build_prompt(question, chunks, metadatas, doc_id, history, log_fragments)
+
+
+def build_followup_prompt(
+    question: str,
+    chunks: List[str],
+    metadatas: List[Dict],
+    ids: List[str],
+    sent_ids: Set[str],
+) -> str:
+    """
+    Prompt de un turno de seguimiento cuando el modelo conserva el contexto
+    de la sesión: solo la pregunta nueva y los fragmentos que aún no vio.
+    """
+    with timed("prompt_build"):
+        new_parts = [
+            f"[FRAGMENTO NUEVO - {meta.get('doc_id', 'desconocido')} - Página ~{meta.get('approx_page', '?')}]\n{chunk}"
+            for chunk, meta, chunk_id in zip(chunks, metadatas, ids)
+            if chunk_id not in sent_ids
+        ]
+
+        context = (
+            "CONTENIDO ADICIONAL DEL PDF:\n" + "\n\n".join(new_parts) + "\n\n"
+            if new_parts
+            else ""
+        )
+
+        return f"""{context}PREGUNTA DEL USUARIO:
+{question}
+
+Responde siguiendo las mismas instrucciones, usando los fragmentos ya proporcionados en la conversación{' y los nuevos' if new_parts else ''}.
+
+RESPUESTA:"""
+
+
+def build_history_prompt(question: str, history: str) -> str:
+    """
+    Prompt de un mensaje que se responde con la conversación (el router
+    decidió que no hace falta buscar en los PDFs: seguimientos y charla).
+    """
+    with timed("prompt_build"):
+        return f"""Eres un asistente que responde preguntas sobre documentos PDF. Para este mensaje no se consultaron los documentos: responde a partir de la conversación.
+
+HISTORIAL DE LA CONVERSACIÓN:
+{history}
+
+PREGUNTA DEL USUARIO:
+{question}
+
+Responde basándote en tus respuestas anteriores del historial, sin inventar información nueva sobre los documentos. Si la pregunta necesita datos de los documentos que no están en el historial, pide al usuario que la formule de forma más concreta.
+
+RESPUESTA:"""
+
+
+def _build_prompt(question, chunks, metadatas, doc_id, history, log_fragments):
+
+    if not chunks:
+        # Caso sin PDFs o sin resultados relevantes
+        prompt = f"""El usuario pregunta: "{question}"
+
+Pero NO hay documentos PDF cargados en el sistema todavía, o no hay información relevante{' en el documento seleccionado' if doc_id else ''}.
+
+Responde de manera amigable explicando que:
+1. Necesita subir documentos PDF primero
+2. Una vez subidos, podrás responder preguntas sobre su contenido
+3. Mantén un tono útil y guía al usuario
+4. Responde vagamente con conocimiento general
+
+RESPUESTA:"""
+
+        return prompt, []
+
+    context_parts = []
+    sources = []
+
+    for idx, (chunk, meta) in enumerate(zip(chunks, metadatas)):
+        doc_name = meta.get("doc_id", "desconocido")
+        page = meta.get("approx_page", "?")
+        chunk_num = meta.get("chunk_index", idx)
+
+        context_parts.append(
+            f"[FRAGMENTO {idx+1} - {doc_name} - Página ~{page}]\n{chunk}"
+        )
+
+        sources.append({
+            "fragment": idx + 1,
+            "document": doc_name,
+            "page": page,
+            "chunk_index": chunk_num,
+        })
+
+    context = "\n\n".join(context_parts)
+
+    doc_info = (
+        f" del documento '{doc_id}'"
+        if doc_id
+        else " de los documentos disponibles"
+    )
+
+    # =========================
+    # DEBUG: mostrar fragmentos enviados a la IA
+    # =========================
+    # Se pidió explícitamente (LOG_FRAGMENTS o "debug" en /ask): se loguea
+    # en INFO para que no dependa de LOG_LEVEL
+    if log_fragments:
+        logger.info("FRAGMENTOS ENVIADOS A LA IA:")
+        for idx, part in enumerate(context_parts[:5]):  # Mostrar primeros 5
+            logger.info(
+                f"--- Fragmento {idx+1} ---\n"
+                + (part[:200] + "..." if len(part) > 200 else part)
+            )
+
+    # =========================
+    # Prompt final
+    # =========================
+    prompt = f"""Eres un asistente que responde preguntas basándose ÚNICAMENTE en el siguiente contenido{doc_info}.
+
+CONTENIDO DEL PDF:
+{context}
+
+HISTORIAL DE LA CONVERSACIÓN:
+{history}
+
+PREGUNTA DEL USUARIO:
+{question}
+
+INSTRUCCIONES CRÍTICAS:
+1. Lee TODOS los fragmentos cuidadosamente antes de responder
+2. Si la respuesta está en algún fragmento, cítalo específicamente: "Según el Fragmento X..."
+3. Si buscas un número, fecha o dato específico, revisa TODOS los fragmentos
+4. Si te hacen una pregunta que no se relaciona con el contenido, respondela vagamente basándote en tu conocimiento general
+5. NO inventes información que no esté en los fragmentos
+6. Si un fragmento menciona algo parcialmente relacionado, menciónalo
+7. Si NO encuentras la información en NINGÚN fragmento, responde usando conocimiento general
+
+RESPUESTA:"""
+
+    return prompt, sources
@@ -0,0 +1,250 @@
+import os
+import re
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from modules.embeddings_manager import embed_queries
+from modules.hybrid_search import choose_top_k, extract_keywords
+from modules.logger import get_logger
+from modules.metrics import registry, timed
+
+logger = get_logger("query_router")
+
+# =========================
+# Configuración global
+# =========================
+
+# Router de preguntas (0 = siempre búsqueda híbrida completa + LLM)
+QUERY_ROUTER_ENABLED = os.getenv("QUERY_ROUTER", "1") == "1"
+
+# Similitud coseno mínima con un centroide para fiarse del clasificador;
+# por debajo se usa la búsqueda híbrida completa
+ROUTER_MIN_SIMILARITY = float(os.getenv("ROUTER_MIN_SIMILARITY", "0.5"))
+
+# Solo los mensajes cortos pueden quedarse sin recuperación
+CHAT_MAX_WORDS = 6
+FOLLOWUP_MAX_WORDS = 8
+
+# Rutas:
+#   chat      saludo / agradecimiento: sin búsqueda. Solo los saludos que
+#             reconoce la regex reciben la respuesta fija sin LLM ("canned");
+#             si lo decide el clasificador, responde el LLM con el historial
+#   history   seguimiento de la conversación: LLM con el historial, sin búsqueda
+#   keyword   dato exacto (número, fecha, cita): solo búsqueda por keywords
+#   semantic  pregunta conceptual: solo búsqueda semántica
+#   hybrid    el resto: búsqueda híbrida completa
+SEARCH_MODES = {"keyword": "keyword", "semantic": "semantic", "hybrid": "hybrid"}
+
+# Etapas que evita cada modo de búsqueda (el que realmente se ejecutó)
+MODE_SKIPPED_STAGES = {
+    "keyword": ("vector_search",),
+    "semantic": ("keyword_search",),
+    "hybrid": (),
+}
+
+registry.describe("chatpdf_route_total", "Preguntas de /ask por ruta del router")
+registry.describe("chatpdf_stage_skipped_total", "Etapas evitadas por el router de preguntas")
+
+# =========================
+# Reglas (regex)
+# =========================
+
+_GREETING = re.compile(
+    r"^\s*(hola|buen[oa]s( d[ií]as| tardes| noches)?|hey|saludos|qu[eé] tal|"
+    r"(muchas )?gracias|ok(ay)?|vale|perfecto|genial|adi[oó]s|hasta luego|chao)\b",
+    re.IGNORECASE,
+)
+
+_FOLLOWUP = re.compile(
+    r"^\s*(y (eso|esto|eso qu[eé])|resume(lo)?( eso| lo anterior)?|res[uú]melo|"
+    r"expl[ií]ca(lo|me)?( eso| mejor| de nuevo| otra vez)|"
+    r"(dame|pon) (un|otro) ejemplo|m[aá]s detalles?|ampl[ií]a(lo)?|"
+    r"no (lo )?entend[ií]|a qu[eé] te refieres|por qu[eé]\?*$|"
+    r"(dilo|expl[ií]calo) (m[aá]s )?(simple|corto|f[aá]cil))",
+    re.IGNORECASE,
+)
+
+_EXACT_LOOKUP = re.compile(
+    r"\d{3,}"                               # números de 3+ dígitos (facturas, importes)
+    r"|\d{1,2}[-/]\d{1,2}[-/]\d{2,4}"       # fechas
+    r"|\"[^\"]{2,}\"|«[^»]{2,}»"            # texto literal entre comillas
+    r"|\b[A-Z]{2,}[-_]?\d+\b"               # códigos (ABC-123)
+)
+
+# =========================
+# Clasificador por centroides
+# =========================
+
+# Frases prototipo de cada ruta: su embedding medio es el centroide
+PROTOTYPES = {
+    "chat": [
+        "hola", "buenos días", "muchas gracias", "qué tal estás",
+        "quién eres", "adiós, hasta luego",
+    ],
+    "history": [
+        "resume lo que dijiste", "explícalo de otra forma",
+        "dame más detalles de eso", "no entendí tu respuesta anterior",
+        "y eso qué significa",
+    ],
+    "semantic": [
+        "de qué trata el documento", "cuál es la idea principal",
+        "explica el concepto general", "resume el documento",
+        "qué conclusiones plantea el texto",
+    ],
+    "hybrid": [
+        "cuál es el monto total a pagar", "quién firmó el contrato",
+        "qué dice la sección sobre garantías", "cuándo vence el plazo de entrega",
+        "qué requisitos se mencionan para la solicitud",
+    ],
+}
+
+
+class QueryRouter:
+    """
+    Clasificación local y barata de cada pregunta: primero reglas regex
+    (sin embeddings) y, si ninguna aplica, el centroide más cercano al
+    embedding de la pregunta. Ese embedding se devuelve para que la
+    búsqueda semántica no vuelva a calcularlo.
+    """
+
+    def __init__(self, prototypes: Dict = PROTOTYPES, min_similarity: float = ROUTER_MIN_SIMILARITY):
+        self.prototypes = prototypes
+        self.min_similarity = min_similarity
+        self._centroids = None
+        self._lock = threading.Lock()
+
+    def _get_centroids(self):
+        # Se codifican una sola vez, en la primera pregunta que los necesita
+        with self._lock:
+            if self._centroids is None:
+                names = list(self.prototypes)
+                centroids = []
+                for name in names:
+                    vectors = _normalize(np.asarray(embed_queries(self.prototypes[name]), dtype=np.float32))
+                    centroids.append(vectors.mean(axis=0))
+                self._centroids = (names, _normalize(np.stack(centroids)))
+            return self._centroids
+
+    def classify(self, query_embedding) -> Tuple[str, float]:
+        """Ruta del centroide más cercano y su similitud coseno"""
+        names, centroids = self._get_centroids()
+        vector = _normalize(np.asarray(query_embedding, dtype=np.float32)[0])
+        similarities = centroids @ vector
+        best = int(np.argmax(similarities))
+        return names[best], float(similarities[best])
+
+    def route(self, query: str, has_history: bool = False) -> Dict:
+        """
+        Decide cómo atender la pregunta. Retorna:
+        {"route", "mode", "top_k", "query_embedding", "reason", "canned"}
+        mode es None cuando no hace falta buscar; canned indica que se
+        responde con chat_answer, sin LLM.
+        """
+        with timed("query_routing"):
+            decision = self._route(query, has_history)
+
+        registry.inc("chatpdf_route_total", route=decision["route"])
+
+        logger.debug(f"🧭 Ruta '{decision['route']}' ({decision['reason']}) top_k={decision['top_k']}")
+        return decision
+
+    def _route(self, query: str, has_history: bool) -> Dict:
+        words = len(query.split())
+
+        if not QUERY_ROUTER_ENABLED:
+            return _decision("hybrid", query, "router desactivado")
+
+        # 1. Reglas: no necesitan embedding
+        if words <= CHAT_MAX_WORDS and _GREETING.match(query) and not extract_keywords(_GREETING.sub("", query)):
+            return _decision("chat", query, "saludo", canned=True)
+
+        if has_history and words <= FOLLOWUP_MAX_WORDS and _FOLLOWUP.match(query):
+            return _decision("history", query, "seguimiento")
+
+        if _EXACT_LOOKUP.search(query) and extract_keywords(query):
+            return _decision("keyword", query, "dato exacto")
+
+        # 2. Clasificador sobre el embedding de la pregunta
+        query_embedding = embed_queries([query])
+        route, similarity = self.classify(query_embedding)
+        reason = f"centroide {similarity:.2f}"
+
+        if similarity < self.min_similarity:
+            route, reason = "hybrid", f"similitud baja ({similarity:.2f})"
+        elif route == "chat" and words > CHAT_MAX_WORDS:
+            route = "hybrid"
+        elif route == "history" and (not has_history or words > FOLLOWUP_MAX_WORDS):
+            route = "hybrid"
+
+        return _decision(route, query, reason, query_embedding)
+
+    def record_skipped(self, decision: Dict, search_results: Optional[Dict] = None) -> None:
+        """
+        Cuenta las etapas que la petición no ejecutó, según lo que realmente
+        corrió: una búsqueda "keyword" sin coincidencias vuelve al modo
+        híbrido y entonces no se ahorró nada.
+        """
+        if decision["mode"] is None:
+            skipped = ["retrieval"] + (["llm"] if decision["canned"] else [])
+            ran_embedding = decision["query_embedding"] is not None
+        else:
+            mode = (search_results or {}).get("mode", decision["mode"])
+            skipped = list(MODE_SKIPPED_STAGES.get(mode, ()))
+            ran_embedding = decision["query_embedding"] is not None or mode != "keyword"
+
+        if not ran_embedding:
+            skipped.append("embedding")
+
+        for stage in skipped:
+            registry.inc("chatpdf_stage_skipped_total", stage=stage)
+
+    def get_stats(self) -> Dict:
+        """Preguntas por ruta y etapas evitadas (desde los contadores)"""
+        snapshot = registry.snapshot()
+        return {
+            "enabled": QUERY_ROUTER_ENABLED,
+            "routes": {
+                key.split("=", 1)[1]: value
+                for key, value in snapshot.get("chatpdf_route_total", {}).items()
+            },
+            "skipped": {
+                key.split("=", 1)[1]: value
+                for key, value in snapshot.get("chatpdf_stage_skipped_total", {}).items()
+            },
+        }
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def _decision(route: str, query: str, reason: str, query_embedding=None, canned: bool = False) -> Dict:
+    # top_k adaptativo: los datos exactos necesitan más candidatos
+    top_k = choose_top_k(query) if route in SEARCH_MODES else 0
+    if route == "keyword":
+        top_k = max(top_k, 10)
+
+    return {
+        "route": route,
+        "mode": SEARCH_MODES.get(route),
+        "top_k": top_k,
+        "query_embedding": query_embedding,
+        "reason": reason,
+        "canned": canned,
+    }
+
+
+def chat_answer(query: str) -> str:
+    """Respuesta fija de los saludos de la ruta "chat" (no se llama al LLM)"""
+    if re.search(r"gracias", query, re.IGNORECASE):
+        return "¡De nada! Si tienes otra pregunta sobre tus documentos, aquí estoy."
+    if re.search(r"adi[oó]s|hasta luego|chao", query, re.IGNORECASE):
+        return "¡Hasta luego! Tus documentos seguirán disponibles cuando vuelvas."
+    return "¡Hola! Pregúntame lo que quieras sobre los PDFs que hayas subido."
+
+
+# Instancia global (singleton)
+query_router = QueryRouter()
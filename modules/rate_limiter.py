@@ -0,0 +1,207 @@
+import re
+import time
+import heapq
+import itertools
+import threading
+from typing import Mapping, Optional
+
+from modules.logger import get_logger
+from modules.metrics import observe_stage
+
+logger = get_logger("rate_limiter")
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Convierte duraciones de cabeceras de rate limit a segundos:
+    "7.66s", "2m59.56s", "1h2m", "120ms" o un número de segundos.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not parts:
+        return None
+
+    factors = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    return sum(float(number) * factors[unit] for number, unit in parts)
+
+
+def estimate_tokens(text: str, max_output_tokens: int = 0) -> int:
+    """Tokens estimados de una petición (≈4 caracteres por token + salida)"""
+    return max(1, len(text) // 4) + max_output_tokens
+
+
+class TokenBucket:
+    """
+    Cubo de tokens con recarga continua (capacity por período).
+    No es thread-safe: lo protege el ProviderLimiter que lo contiene.
+    """
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = float(capacity)
+        self.period = period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Segundos hasta que haya `amount` tokens disponibles"""
+        self._refill(now)
+        amount = min(amount, self.capacity)  # una petición enorme no debe esperar para siempre
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < amount:
+            wait = max(wait, (amount - self.tokens) / self.rate)
+        return wait
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def sync(self, remaining: Optional[float], reset: Optional[float],
+             limit: Optional[float] = None, now: Optional[float] = None) -> None:
+        """Ajusta el cubo al estado que informa el proveedor"""
+        now = now if now is not None else time.monotonic()
+        self._refill(now)
+        if limit:
+            self.capacity = float(limit)
+        if remaining is not None:
+            self.tokens = min(self.tokens, float(remaining))
+            if remaining <= 0 and reset:
+                self.blocked_until = max(self.blocked_until, now + reset)
+
+    def block(self, seconds: float, now: Optional[float] = None) -> None:
+        now = now if now is not None else time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = min(self.tokens, 0.0)
+
+
+class ProviderLimiter:
+    """
+    Limitador del lado cliente para un proveedor con cuotas por minuto:
+    peticiones/min y tokens estimados/min.
+
+    Las peticiones esperan en una cola por prioridad (0 = más urgente) y
+    solo la cabeza de la cola consume del cubo. Si una petición no va a
+    obtener hueco antes de su plazo máximo de espera, se rechaza de
+    inmediato para que el llamador use otro proveedor.
+    """
+
+    def __init__(self, name: str, requests_per_minute: int, tokens_per_minute: int,
+                 max_queue: int = 32):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+
+    def acquire(self, tokens: int, max_wait: float, priority: int = 0) -> bool:
+        start = time.monotonic()
+        deadline = start + max_wait
+
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                logger.warning(f"⏳ {self.name}: cola de rate limit llena")
+                return False
+
+            entry = (priority, next(self._seq))
+            heapq.heappush(self._queue, entry)
+
+            try:
+                while True:
+                    now = time.monotonic()
+                    remaining = deadline - now
+
+                    if self._queue[0] == entry:
+                        wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+                        if wait <= 0:
+                            self.requests.take(1, now)
+                            self.tokens.take(tokens, now)
+                            observe_stage("rate_limit_wait", now - start, provider=self.name)
+                            return True
+                        if wait > remaining:
+                            logger.info(f"⏳ {self.name}: sin hueco en {max_wait:.1f}s (faltan {wait:.1f}s)")
+                            return False
+                        self._cond.wait(wait)
+                    else:
+                        if remaining <= 0:
+                            return False
+                        self._cond.wait(remaining)
+            finally:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+    def settle(self, estimated: int, actual: Optional[int]) -> None:
+        """Devuelve al cubo los tokens estimados de más (uso real conocido)"""
+        if actual is None or actual >= estimated:
+            return
+        with self._cond:
+            self.tokens.give_back(estimated - actual)
+            self._cond.notify_all()
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """
+        Sincroniza los cubos con las cabeceras x-ratelimit-* del proveedor.
+        El límite de peticiones de Groq es diario: solo se usa para
+        bloquear cuando se agota; el de tokens es por minuto.
+        """
+        def number(name):
+            try:
+                return float(headers[name])
+            except (KeyError, TypeError, ValueError):
+                return None
+
+        with self._cond:
+            now = time.monotonic()
+            self.requests.sync(
+                number("x-ratelimit-remaining-requests"),
+                parse_duration(headers.get("x-ratelimit-reset-requests")),
+                now=now,
+            )
+            self.tokens.sync(
+                number("x-ratelimit-remaining-tokens"),
+                parse_duration(headers.get("x-ratelimit-reset-tokens")),
+                limit=number("x-ratelimit-limit-tokens"),
+                now=now,
+            )
+            self._cond.notify_all()
+
+    def penalize(self, retry_after: Optional[float]) -> None:
+        """Tras un 429: no enviar nada hasta que pase retry-after"""
+        seconds = retry_after if retry_after is not None else 1.0
+        with self._cond:
+            now = time.monotonic()
+            self.requests.block(seconds, now)
+            self.tokens.block(seconds, now)
+            self._cond.notify_all()
+
+    def get_stats(self):
+        with self._cond:
+            now = time.monotonic()
+            self.requests._refill(now)
+            self.tokens._refill(now)
+            return {
+                "queued": len(self._queue),
+                "requests_available": round(self.requests.tokens, 1),
+                "tokens_available": round(self.tokens.tokens, 1),
+                "tokens_per_minute": self.tokens.capacity,
+            }
@@ -0,0 +1,91 @@
+import os
+from typing import Dict, Iterable, Optional, Set, Union
+
+from fastapi.responses import JSONResponse
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    import orjson  # serialización JSON rápida (opcional)
+    from fastapi.responses import ORJSONResponse
+except ImportError:
+    orjson = None
+    ORJSONResponse = None
+
+# =========================
+# Configuración global
+# =========================
+
+# Clase de respuesta por defecto: orjson si está instalado
+FastJSONResponse = ORJSONResponse if orjson is not None else JSONResponse
+
+# Tamaño mínimo (bytes) para comprimir respuestas con gzip
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+
+# Longitud por defecto de los snippets en /search
+SNIPPET_CHARS = 200
+
+# Campos proyectables de /search (formato columnar de Chroma) y de /ask
+SEARCH_FIELDS = {"ids", "distances", "metadatas", "documents", "snippets"}
+ASK_FIELDS = {
+    "session_id", "question", "answer", "chunks_found", "sources",
+    "searched_in", "partial", "degraded", "route",
+}
+
+# Respuestas que no se comprimen: streaming NDJSON (gzip retrasaría cada
+# línea) y snapshots binarios (float16 apenas comprime)
+GZIP_EXCLUDED_PATHS = {"/ask/batch", "/admin/snapshot"}
+
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware que omite las rutas de GZIP_EXCLUDED_PATHS"""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in GZIP_EXCLUDED_PATHS:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+def parse_fields(value: Union[str, Iterable[str], None], allowed: Set[str]) -> Optional[Set[str]]:
+    """
+    'ids,distances' o ["ids", "distances"] -> {"ids", "distances"}.
+    None = todos los campos. Lanza ValueError con campos desconocidos.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(",")
+    fields = {field.strip() for field in value if field and field.strip()}
+
+    unknown = fields - allowed
+    if unknown:
+        raise ValueError(f"Campos desconocidos: {', '.join(sorted(unknown))}")
+
+    return fields or None
+
+
+def project_search(results: Dict, fields: Optional[Set[str]], snippet_chars: int = SNIPPET_CHARS) -> Dict:
+    """
+    Proyecta un resultado de search_similar a los campos pedidos.
+    "snippets" devuelve los documentos recortados a snippet_chars.
+    """
+    if fields is None:
+        return results
+
+    projected = {key: results[key] for key in fields & {"ids", "distances", "metadatas", "documents"}}
+
+    if "snippets" in fields:
+        projected["snippets"] = [
+            [document[:snippet_chars] for document in row]
+            for row in results.get("documents", [])
+        ]
+
+    return projected
+
+
+def project_fields(payload: Dict, fields: Optional[Set[str]]) -> Dict:
+    """Deja solo las claves pedidas de una respuesta plana (p. ej. /ask)"""
+    if fields is None:
+        return payload
+
+    return {key: value for key, value in payload.items() if key in fields}
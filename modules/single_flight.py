@@ -0,0 +1,85 @@
+import re
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from modules.deadline import Deadline
+from modules.logger import get_logger
+
+logger = get_logger("single_flight")
+
+
+def normalize_query(query: str) -> str:
+    """Normaliza una pregunta para detectar duplicados (mayúsculas, espacios)"""
+    return re.sub(r"\s+", " ", (query or "").strip().lower())
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalescencia de llamadas idénticas en curso: la primera llamada con una
+    clave ejecuta la función y las que llegan mientras tanto esperan y
+    reciben el mismo resultado (o la misma excepción).
+    No es un caché: al terminar, la siguiente llamada vuelve a ejecutar.
+
+    Con wait_deadline, quien espera a otra llamada lo hace como mucho hasta
+    su propio plazo (TimeoutError): un líder lento no arrastra a peticiones
+    con un plazo más corto.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.stats = {"executed": 0, "shared": 0, "wait_timeouts": 0}
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args,
+           wait_deadline: Optional[Deadline] = None, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.stats["shared"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.stats["executed"] += 1
+                leader = True
+
+        if not leader:
+            logger.debug(f"🔗 {self.name}: llamada idéntica en curso, se comparte el resultado")
+            timeout = wait_deadline.remaining() if wait_deadline else None
+            if not call.done.wait(timeout):
+                with self._lock:
+                    self.stats["wait_timeouts"] += 1
+                raise TimeoutError(f"{self.name}: plazo agotado esperando una llamada idéntica en curso")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self.stats, "in_flight": len(self._calls)}
+
+
+# Instancias globales por ruta
+search_flight = SingleFlight("search")
+ask_flight = SingleFlight("ask")
@@ -0,0 +1,349 @@
+import os
+import sys
+import json
+import zlib
+import time
+import struct
+import hashlib
+import argparse
+from typing import Dict, List
+
+import numpy as np
+
+from modules import text_store
+from modules.embeddings_manager import shards, group_by_shard
+from modules.logger import get_logger
+
+logger = get_logger("snapshot")
+
+# =========================
+# Formato del snapshot
+# =========================
+#
+#   MAGIC | sección 1 | sección 2 | ... | índice JSON | len(índice) u64 | MAGIC
+#
+# Secciones (columnares, cada una con su sha256 en el índice):
+#   ids        ids de los chunks, UTF-8 separados por "\n" (zlib)
+#   vectors    matriz float16 (n, dim) en little-endian, sin comprimir
+#   metadatas  {clave: [valor por chunk]} en JSON (zlib)
+#   documents  texto de los chunks guardado en Chroma, o null (zlib)
+#   catalog    {doc_id: texto completo del text store} en JSON (zlib)
+#
+# La búsqueda por keywords trabaja sobre el texto de los chunks, que se
+# reconstruye del catálogo (text store), así que no necesita otro índice.
+
+MAGIC = b"CPDFSNP1"
+FORMAT_VERSION = 1
+
+# Secciones sin las que no se puede importar ("documents" es opcional)
+REQUIRED_SECTIONS = ("vectors", "ids", "metadatas", "catalog")
+
+EXPORT_BATCH_SIZE = int(os.getenv("SNAPSHOT_EXPORT_BATCH", "5000"))
+IMPORT_BATCH_SIZE = int(os.getenv("SNAPSHOT_IMPORT_BATCH", "5000"))
+
+
+class SnapshotError(Exception):
+    """Snapshot inválido o corrupto"""
+
+
+def _pack_json(value) -> bytes:
+    return zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"), 6)
+
+
+def _unpack_json(data: bytes):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+class _SectionWriter:
+    def __init__(self, f):
+        self.f = f
+        self.sections = []
+
+    def begin(self, name: str, codec: str):
+        self._current = {"name": name, "codec": codec, "offset": self.f.tell(), "length": 0}
+        self._digest = hashlib.sha256()
+
+    def write(self, data: bytes):
+        self.f.write(data)
+        self._digest.update(data)
+        self._current["length"] += len(data)
+
+    def end(self):
+        self._current["sha256"] = self._digest.hexdigest()
+        self.sections.append(self._current)
+
+    def section(self, name: str, codec: str, data: bytes):
+        self.begin(name, codec)
+        self.write(data)
+        self.end()
+
+
+# =========================
+# Exportación
+# =========================
+
+def export_snapshot(path: str, batch_size: int = EXPORT_BATCH_SIZE) -> Dict:
+    """
+    Exporta todo el índice (vectores, metadatos y texto de los documentos)
+    a un único archivo. Los vectores se leen de Chroma (todos los shards)
+    por lotes y se escriben directamente en float16.
+    """
+    start = time.perf_counter()
+
+    ids: List[str] = []
+    metadatas: List[Dict] = []
+    documents: List = []
+    dim = None
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        writer = _SectionWriter(f)
+
+        # Vectores: se escriben según llegan, el resto se acumula
+        writer.begin("vectors", "float16")
+        for collection in shards:
+            for offset in range(0, collection.count(), batch_size):
+                batch = collection.get(
+                    limit=batch_size,
+                    offset=offset,
+                    include=["embeddings", "metadatas", "documents"],
+                )
+                vectors = np.asarray(batch["embeddings"], dtype="<f2")
+                if len(vectors):
+                    dim = vectors.shape[1]
+                    writer.write(vectors.tobytes())
+
+                ids.extend(batch["ids"])
+                metadatas.extend(meta or {} for meta in batch["metadatas"])
+                documents.extend(batch.get("documents") or [None] * len(batch["ids"]))
+        writer.end()
+
+        writer.section("ids", "zlib", zlib.compress("\n".join(ids).encode("utf-8"), 6))
+
+        keys = sorted({key for meta in metadatas for key in meta})
+        columns = {key: [meta.get(key) for meta in metadatas] for key in keys}
+        writer.section("metadatas", "zlib+json", _pack_json(columns))
+
+        # Solo chunks antiguos guardan su texto en Chroma
+        if any(doc is not None for doc in documents):
+            writer.section("documents", "zlib+json", _pack_json(documents))
+
+        doc_ids = sorted({meta.get("doc_id") for meta in metadatas if meta.get("doc_id")})
+        catalog = {}
+        for doc_id in doc_ids:
+            text = text_store.read_document(doc_id)
+            if text is not None:
+                catalog[doc_id] = text
+        writer.section("catalog", "zlib+json", _pack_json(catalog))
+
+        index = json.dumps({
+            "version": FORMAT_VERSION,
+            "count": len(ids),
+            "dim": dim,
+            "documents": len(doc_ids),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "sections": writer.sections,
+        }).encode("utf-8")
+        f.write(index)
+        f.write(struct.pack("<Q", len(index)))
+        f.write(MAGIC)
+
+    os.replace(tmp_path, path)
+
+    summary = {
+        "path": path,
+        "chunks": len(ids),
+        "documents": len(doc_ids),
+        "bytes": os.path.getsize(path),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    logger.info(f"📤 Snapshot exportado: {summary}")
+    return summary
+
+
+# =========================
+# Importación
+# =========================
+
+def read_snapshot_index(f) -> Dict:
+    f.seek(0)
+    if f.read(len(MAGIC)) != MAGIC:
+        raise SnapshotError("No es un snapshot de ChatPDF")
+
+    try:
+        f.seek(-(len(MAGIC) + 8), os.SEEK_END)
+        (index_length,) = struct.unpack("<Q", f.read(8))
+        if f.read(len(MAGIC)) != MAGIC:
+            raise SnapshotError("Snapshot truncado")
+
+        f.seek(-(len(MAGIC) + 8 + index_length), os.SEEK_END)
+        index = json.loads(f.read(index_length).decode("utf-8"))
+    except (OSError, struct.error, ValueError) as e:
+        # seek antes del inicio, índice ilegible...
+        raise SnapshotError(f"Snapshot truncado o corrupto: {e}") from e
+
+    if not isinstance(index, dict):
+        raise SnapshotError("Índice del snapshot inválido")
+    if index.get("version") != FORMAT_VERSION:
+        raise SnapshotError(f"Versión de snapshot no soportada: {index.get('version')}")
+
+    try:
+        names = {section["name"] for section in index["sections"]}
+        count, dim = int(index["count"]), index["dim"]
+    except (KeyError, TypeError, ValueError) as e:
+        raise SnapshotError(f"Índice del snapshot incompleto: {e}") from e
+
+    missing = [name for name in REQUIRED_SECTIONS if name not in names]
+    if missing:
+        raise SnapshotError(f"Faltan secciones en el snapshot: {', '.join(missing)}")
+    if count < 0 or (count and (not isinstance(dim, int) or dim <= 0)):
+        raise SnapshotError(f"Tamaño de snapshot inválido: count={count}, dim={dim}")
+    return index
+
+
+def _read_section(f, section: Dict) -> bytes:
+    f.seek(section["offset"])
+    data = f.read(section["length"])
+    if len(data) != section["length"] or hashlib.sha256(data).hexdigest() != section["sha256"]:
+        raise SnapshotError(f"Checksum inválido en la sección '{section['name']}'")
+    return data
+
+
+def _verify_section(f, section: Dict, block_size: int = 8 * 1024 * 1024) -> None:
+    """Verifica el checksum de una sección grande sin cargarla entera"""
+    f.seek(section["offset"])
+    digest = hashlib.sha256()
+    remaining = section["length"]
+    while remaining > 0:
+        block = f.read(min(block_size, remaining))
+        if not block:
+            break
+        digest.update(block)
+        remaining -= len(block)
+    if remaining or digest.hexdigest() != section["sha256"]:
+        raise SnapshotError(f"Checksum inválido en la sección '{section['name']}'")
+
+
+def import_snapshot(path: str, batch_size: int = IMPORT_BATCH_SIZE) -> Dict:
+    """
+    Carga un snapshot en la colección y el text store. Se verifican los
+    checksums de todas las secciones antes de escribir nada; los chunks
+    se insertan con upsert en lotes grandes (re-importar es idempotente)
+    en el shard de su documento según el SHARD_COUNT de este nodo.
+    """
+    start = time.perf_counter()
+
+    with open(path, "rb") as f:
+        index = read_snapshot_index(f)
+        sections = {s["name"]: s for s in index["sections"]}
+        count = int(index["count"])
+
+        try:
+            ids = zlib.decompress(_read_section(f, sections["ids"])).decode("utf-8").split("\n")
+            ids = ids if count else []
+            columns = _unpack_json(_read_section(f, sections["metadatas"]))
+            catalog = _unpack_json(_read_section(f, sections["catalog"]))
+            documents = (
+                _unpack_json(_read_section(f, sections["documents"]))
+                if "documents" in sections
+                else None
+            )
+
+            # Vectores: se verifican por bloques y luego se mapean sin copiar
+            vectors_section = sections["vectors"]
+            _verify_section(f, vectors_section)
+        except (OSError, KeyError, TypeError, ValueError, zlib.error) as e:
+            raise SnapshotError(f"Snapshot corrupto: {e}") from e
+
+    # Todas las secciones deben describir los mismos `count` chunks
+    if len(ids) != count:
+        raise SnapshotError(f"El snapshot declara {count} chunks pero tiene {len(ids)} ids")
+    if not isinstance(columns, dict) or any(not isinstance(v, list) or len(v) != count for v in columns.values()):
+        raise SnapshotError("La sección 'metadatas' no coincide con el número de chunks")
+    if not isinstance(catalog, dict):
+        raise SnapshotError("La sección 'catalog' es inválida")
+    if documents is not None and (not isinstance(documents, list) or len(documents) != count):
+        raise SnapshotError("La sección 'documents' no coincide con el número de chunks")
+
+    dim = index["dim"] if count else 0
+    if vectors_section["length"] != count * dim * 2:
+        raise SnapshotError(
+            f"La sección 'vectors' ocupa {vectors_section['length']} bytes, "
+            f"se esperaban {count * dim * 2} ({count} x {dim} float16)"
+        )
+
+    vectors = np.memmap(
+        path, dtype="<f2", mode="r",
+        offset=vectors_section["offset"],
+        shape=(count, dim),
+    ) if count else np.zeros((0, 0), dtype="<f2")
+
+    for doc_id, text in catalog.items():
+        text_store.write_document(doc_id, text)
+
+    for first in range(0, count, batch_size):
+        last = min(first + batch_size, count)
+        metadatas = [
+            {key: values[i] for key, values in columns.items() if values[i] is not None}
+            for i in range(first, last)
+        ]
+        embeddings = vectors[first:last].astype(np.float32).tolist()
+
+        for collection, indices in group_by_shard(metadatas):
+            # Chroma no acepta documents con None mezclados: los chunks con
+            # texto en Chroma y los que no lo tienen van en upserts separados
+            with_text = [i for i in indices if documents and documents[first + i] is not None]
+            without_text = [i for i in indices if not documents or documents[first + i] is None]
+
+            for part in (with_text, without_text):
+                if not part:
+                    continue
+                collection.upsert(
+                    ids=[ids[first + i] for i in part],
+                    embeddings=[embeddings[i] for i in part],
+                    metadatas=[metadatas[i] for i in part],
+                    documents=[documents[first + i] for i in part] if part is with_text else None,
+                )
+        logger.debug(f"📥 Snapshot: {last}/{count} chunks cargados")
+
+    del vectors
+
+    summary = {
+        "path": path,
+        "chunks": count,
+        "documents": len(catalog),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    logger.info(f"📥 Snapshot importado: {summary}")
+    return summary
+
+
+# =========================
+# CLI
+# =========================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exportar / importar el índice vectorial")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_cmd = commands.add_parser("export", help="Exportar el índice a un archivo")
+    export_cmd.add_argument("path")
+
+    import_cmd = commands.add_parser("import", help="Cargar un snapshot en este nodo")
+    import_cmd.add_argument("path")
+    import_cmd.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        summary = export_snapshot(args.path)
+    else:
+        summary = import_snapshot(args.path, batch_size=args.batch_size)
+
+    json.dump(summary, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import os
+import mmap
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from modules.logger import get_logger
+
+logger = get_logger("text_store")
+
+# =========================
+# Configuración global
+# =========================
+
+# Carpeta con el texto completo de cada documento (UTF-8)
+TEXT_STORE_DIR = os.getenv("TEXT_STORE_DIR", "text_store")
+
+# Si es "1", Chroma también guarda el texto de cada chunk (duplicado)
+CHROMA_STORE_TEXT = os.getenv("CHROMA_STORE_TEXT", "0") == "1"
+
+# Máximo de documentos mapeados en memoria a la vez
+MAX_OPEN_MAPS = int(os.getenv("TEXT_STORE_MAX_OPEN", "64"))
+
+_maps: "OrderedDict[str, tuple]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _path(doc_id: str) -> str:
+    # doc_id es el nombre del archivo subido: se usa su hash como nombre seguro
+    name = hashlib.sha1(doc_id.encode("utf-8")).hexdigest()
+    return os.path.join(TEXT_STORE_DIR, f"{name}.txt")
+
+
+def _close(doc_id: str) -> None:
+    entry = _maps.pop(doc_id, None)
+    if entry:
+        mapped, handle = entry
+        mapped.close()
+        handle.close()
+
+
+def _get_map(doc_id: str) -> Optional[mmap.mmap]:
+    """
+    mmap de solo lectura del texto del documento (LRU de mapas abiertos).
+    Debe llamarse con _lock tomado.
+    """
+    if doc_id in _maps:
+        _maps.move_to_end(doc_id)
+        return _maps[doc_id][0]
+
+    path = _path(doc_id)
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+
+    handle = open(path, "rb")
+    mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    _maps[doc_id] = (mapped, handle)
+
+    while len(_maps) > MAX_OPEN_MAPS:
+        _close(next(iter(_maps)))
+
+    return mapped
+
+
+# =========================
+# Escritura / borrado
+# =========================
+
+def write_document(doc_id: str, text: str) -> None:
+    """Guarda (o reemplaza) el texto completo de un documento"""
+    os.makedirs(TEXT_STORE_DIR, exist_ok=True)
+    path = _path(doc_id)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+
+    with open(tmp_path, "wb") as f:
+        f.write(text.encode("utf-8"))
+
+    with _lock:
+        _close(doc_id)  # liberar el mapa anterior antes de reemplazar
+        os.replace(tmp_path, path)
+
+
+def delete_document(doc_id: str) -> None:
+    with _lock:
+        _close(doc_id)
+        try:
+            os.remove(_path(doc_id))
+        except FileNotFoundError:
+            pass
+
+
+# =========================
+# Lectura
+# =========================
+
+def byte_offsets(pages: List[str], chunk_info: List[Dict]) -> None:
+    """
+    Añade byte_start/byte_end (offsets UTF-8 en el archivo) a la info de
+    cada chunk a partir de sus char_start/char_end.
+    """
+    page_char_start = 0
+    page_byte_start = 0
+    starts = []
+    for page_text in pages:
+        starts.append((page_char_start, page_byte_start))
+        page_char_start += len(page_text)
+        page_byte_start += len(page_text.encode("utf-8"))
+
+    for info in chunk_info:
+        page_text = pages[info["page"] - 1]
+        char_base, byte_base = starts[info["page"] - 1]
+        local_start = info["char_start"] - char_base
+        local_end = info["char_end"] - char_base
+        info["byte_start"] = byte_base + len(page_text[:local_start].encode("utf-8"))
+        info["byte_end"] = info["byte_start"] + len(page_text[local_start:local_end].encode("utf-8"))
+
+
+def read_range(doc_id: str, byte_start: int, byte_end: int) -> Optional[str]:
+    """
+    Texto entre dos offsets de bytes, leído del mmap sin copias
+    intermedias. Los caracteres multibyte cortados en los bordes se omiten.
+    """
+    with _lock:
+        mapped = _get_map(doc_id)
+        if mapped is None:
+            return None
+
+        byte_start = max(0, byte_start)
+        byte_end = min(len(mapped), byte_end)
+        with memoryview(mapped) as view:
+            return str(view[byte_start:byte_end], "utf-8", errors="ignore")
+
+
+def read_document(doc_id: str) -> Optional[str]:
+    """Texto completo de un documento (None si no está en el store)"""
+    try:
+        with open(_path(doc_id), "rb") as f:
+            return f.read().decode("utf-8")
+    except FileNotFoundError:
+        return None
+
+
+def chunk_text(meta: Dict, before: int = 0, after: int = 0) -> Optional[str]:
+    """
+    Texto de un chunk a partir de sus metadatos, opcionalmente ampliado
+    con `before`/`after` bytes de contexto vecino.
+    """
+    if not meta or "byte_start" not in meta:
+        return None
+    return read_range(meta["doc_id"], meta["byte_start"] - before, meta["byte_end"] + after)
+
+
+def hydrate(documents: Optional[List], metadatas: List[Dict]) -> List[str]:
+    """
+    Completa los textos de chunks que Chroma no guarda (documents = None)
+    leyéndolos del text store.
+    """
+    documents = list(documents) if documents is not None else [None] * len(metadatas)
+
+    for i, (document, meta) in enumerate(zip(documents, metadatas)):
+        if document is None:
+            documents[i] = chunk_text(meta) or ""
+
+    return documents
@@ -0,0 +1,95 @@
+import uuid
+
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("sentence_transformers")
+
+from modules import ingest_pipeline, text_store
+from modules.embeddings_manager import collection_for, delete_document, prepare_chunks
+
+
+def _page(label, sentences):
+    return " ".join(f"{label} frase {i} del documento de prueba." for i in range(sentences)) + "\n"
+
+
+@pytest.fixture
+def ingest(tmp_path, monkeypatch):
+    """Ingiere páginas de texto por el pipeline (sin PDF real)"""
+    monkeypatch.setattr(text_store, "TEXT_STORE_DIR", str(tmp_path / "text_store"))
+
+    pages_by_path = {}
+    monkeypatch.setattr(ingest_pipeline, "extract_pages_from_pdf", lambda path: pages_by_path[path])
+
+    doc_id = f"test_{uuid.uuid4().hex}.pdf"
+
+    def run(pages):
+        path = tmp_path / f"{uuid.uuid4().hex}.pdf"
+        path.write_bytes(b"")
+        pages_by_path[str(path)] = pages
+        [result] = ingest_pipeline.run_ingest_pipeline([(doc_id, str(path))], extract_workers=1)
+        return result
+
+    run.doc_id = doc_id
+    yield run
+    delete_document(doc_id)
+
+
+def _stored(doc_id):
+    return collection_for(doc_id).get(where={"doc_id": doc_id}, include=["metadatas"])
+
+
+def test_reingest_edited_document_is_incremental(ingest):
+    original = [_page(f"Página {n}", 12) for n in range(1, 6)]
+    first = ingest(original)
+
+    _, _, original_ids = prepare_chunks(ingest.doc_id, original)
+    assert first["status"] == "done"
+    assert first["chunks_created"] == len(original_ids)
+
+    # La página 2 cambia de contenido y de longitud
+    edited = list(original)
+    edited[1] = _page("Página 2 editada", 20)
+    second = ingest(edited)
+
+    _, _, edited_ids = prepare_chunks(ingest.doc_id, edited)
+    new_ids = set(edited_ids) - set(original_ids)
+
+    assert second["status"] == "done"
+    assert second["pages_changed"] == 1
+    assert second["chunks_created"] == len(new_ids)
+    assert second["chunks_reused"] == len(edited_ids) - len(new_ids)
+    assert second["chunks_deleted"] == len(set(original_ids) - set(edited_ids))
+
+    # Sin chunks obsoletos ni duplicados en el índice
+    assert sorted(_stored(ingest.doc_id)["ids"]) == sorted(edited_ids)
+
+
+def test_reingest_unchanged_document_embeds_nothing(ingest):
+    pages = [_page(f"Página {n}", 12) for n in range(1, 4)]
+    ingest(pages)
+
+    again = ingest(pages)
+
+    assert again["status"] == "done"
+    assert again["chunks_created"] == 0
+    assert again["chunks_deleted"] == 0
+    assert again["chunks_reused"] == len(_stored(ingest.doc_id)["ids"])
+
+
+def test_reingest_keeps_text_store_offsets_consistent(ingest):
+    original = [_page(f"Página {n}", 12) for n in range(1, 6)]
+    ingest(original)
+
+    # La página 1 se alarga: cambian los offsets de todas las siguientes
+    edited = list(original)
+    edited[0] = _page("Página 1 mucho más larga", 30)
+    ingest(edited)
+
+    chunks, metadatas, ids = prepare_chunks(ingest.doc_id, edited)
+    expected = dict(zip(ids, chunks))
+
+    stored = _stored(ingest.doc_id)
+    texts = text_store.hydrate(None, stored["metadatas"])
+
+    assert dict(zip(stored["ids"], texts)) == expected
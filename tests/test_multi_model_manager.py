@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from modules import multi_model_manager
+from modules.multi_model_manager import MultiModelManager
+from modules.rate_limiter import ProviderLimiter
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None, payload=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._payload = payload or {}
+        self.text = ""
+
+    def json(self):
+        return self._payload
+
+
+ANSWER = {"choices": [{"message": {"content": "respuesta"}}], "usage": {"total_tokens": 10}}
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(multi_model_manager, "LLM_TIMEOUT_MIN_SAMPLES", 1)
+    manager = MultiModelManager()
+    manager.models["groq"].update(enabled=True, key="fake-key", url="http://groq.invalid")
+    # Cuotas holgadas: tras un 429 solo se espera el retry-after
+    manager.limiters["groq"] = ProviderLimiter("groq", 6000, 10_000_000)
+    return manager
+
+
+def _fake_groq(monkeypatch, responses, round_trip):
+    """requests.post falso: cada llamada tarda round_trip y consume una respuesta"""
+    responses = list(responses)
+
+    def post(url, **kwargs):
+        time.sleep(round_trip)
+        return responses.pop(0)
+
+    monkeypatch.setattr(multi_model_manager.requests, "post", post)
+
+
+def test_429_retry_does_not_inflate_p99(manager, monkeypatch):
+    _fake_groq(monkeypatch, [
+        FakeResponse(429, headers={"retry-after": "0.5"}),
+        FakeResponse(200, payload=ANSWER),
+    ], round_trip=0.02)
+
+    result = manager._try_model("groq", "pregunta")
+
+    assert result["success"]
+    assert "latency" not in result
+    # La llamada completa incluye la espera de retry-after...
+    assert result["time"] >= 0.5
+    # ...pero la latencia del proveedor es solo el viaje HTTP final
+    window = manager.stats["groq"].snapshot()["window"]
+    assert window["p99"] < 0.25
+    assert manager.timeout_for("groq") == multi_model_manager.LLM_TIMEOUT_MIN
+
+
+def test_success_latency_feeds_adaptive_timeout(manager, monkeypatch):
+    monkeypatch.setattr(multi_model_manager, "LLM_TIMEOUT_MIN", 0.01)
+    _fake_groq(monkeypatch, [FakeResponse(200, payload=ANSWER)], round_trip=0.1)
+
+    assert manager._try_model("groq", "pregunta")["success"]
+
+    p99 = manager.stats["groq"].snapshot()["window"]["p99"]
+    assert p99 >= 0.1
+    assert manager.timeout_for("groq") == pytest.approx(p99 * multi_model_manager.LLM_TIMEOUT_P99_FACTOR, rel=0.05)
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("starlette")
+
+from starlette.applications import Starlette
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+
+from modules import profiler
+from modules.profiler import ProfileMiddleware
+
+
+def _stream_app():
+    async def lines():
+        for n in range(3):
+            # Una etapa perfilada, como las de /ask/batch
+            await profiler.run_in_threadpool(sum, range(1000))
+            yield f"{n}\n"
+
+    async def endpoint(request):
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    app = Starlette(routes=[Route("/stream", endpoint, methods=["POST"])])
+    return ProfileMiddleware(app, authorize=lambda token: token == "secreto")
+
+
+def _request(app, headers):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": "/stream", "raw_path": b"/stream",
+        "root_path": "", "query_string": b"", "server": ("test", 80), "client": ("test", 1),
+        "headers": [(name.encode(), value.encode()) for name, value in headers.items()],
+    }
+    messages = []
+
+    async def receive():
+        await asyncio.sleep(0.5)
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return messages
+
+
+def test_profiled_streaming_response_completes(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, "PROFILE_DIR", str(tmp_path))
+
+    messages = _request(_stream_app(), {"x-profile": "1", "x-admin-token": "secreto"})
+
+    start = messages[0]
+    assert start["status"] == 200
+    headers = dict(start["headers"])
+    # La respuesta empieza antes de que corra el generador: aún no hay etapas
+    assert headers[b"x-profile-note"] == profiler.NOT_PROFILED_NOTE.encode()
+
+    body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.response.body")
+    assert body == b"0\n1\n2\n"
+    assert profiler._request_profiles.get() is None
+    # Las etapas del streaming se guardan al terminar la respuesta
+    assert list(tmp_path.glob("*_stream.prof"))
+
+
+def test_unprofiled_request_has_no_profile_header():
+    messages = _request(_stream_app(), {"x-profile": "1", "x-admin-token": "otro"})
+
+    headers = dict(messages[0]["headers"])
+    assert b"x-profile-file" not in headers and b"x-profile-note" not in headers
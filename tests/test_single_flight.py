@@ -0,0 +1,51 @@
+import threading
+import time
+
+import pytest
+
+from modules.deadline import Deadline
+from modules.single_flight import SingleFlight
+
+
+def _start_leader(flight, release, result="resultado"):
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return result
+
+    leader = threading.Thread(target=flight.do, args=("clave", slow))
+    leader.start()
+    started.wait(5)
+    return leader
+
+
+def test_follower_gives_up_at_its_own_deadline():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    leader = _start_leader(flight, release)
+
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        flight.do("clave", lambda: "no debe ejecutarse", wait_deadline=Deadline(0.2))
+    waited = time.monotonic() - start
+
+    release.set()
+    leader.join(5)
+
+    assert 0.15 <= waited < 1.0
+    assert flight.get_stats()["wait_timeouts"] == 1
+
+
+def test_follower_shares_result_within_deadline():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    leader = _start_leader(flight, release)
+
+    threading.Timer(0.05, release.set).start()
+    result = flight.do("clave", lambda: "no debe ejecutarse", wait_deadline=Deadline(5))
+    leader.join(5)
+
+    assert result == "resultado"
+    assert flight.get_stats()["shared"] == 1
@@ -0,0 +1,108 @@
+import json
+import struct
+import uuid
+
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("sentence_transformers")
+
+from modules import snapshot, text_store
+from modules.embeddings_manager import collection_for, delete_document
+from modules.snapshot import MAGIC, SnapshotError, export_snapshot, import_snapshot
+
+
+@pytest.fixture
+def exported(tmp_path, monkeypatch):
+    """Snapshot de un documento con texto en Chroma solo en parte de sus chunks"""
+    monkeypatch.setattr(text_store, "TEXT_STORE_DIR", str(tmp_path / "text_store"))
+
+    doc_id = f"test_{uuid.uuid4().hex}.pdf"
+    ids = [f"{doc_id}_{i}" for i in range(4)]
+    collection_for(doc_id).upsert(
+        ids=ids[:2],
+        embeddings=[[0.1, 0.2, 0.3]] * 2,
+        metadatas=[{"doc_id": doc_id, "chunk_index": i} for i in range(2)],
+        documents=["texto antiguo 0", "texto antiguo 1"],
+    )
+    collection_for(doc_id).upsert(
+        ids=ids[2:],
+        embeddings=[[0.3, 0.2, 0.1]] * 2,
+        metadatas=[{"doc_id": doc_id, "chunk_index": i} for i in range(2, 4)],
+    )
+
+    path = tmp_path / "index.snap"
+    export_snapshot(str(path))
+    delete_document(doc_id)
+
+    yield path, doc_id, ids
+    delete_document(doc_id)
+
+
+def _rewrite_index(path, **changes):
+    """Reescribe el índice JSON del final del snapshot"""
+    data = path.read_bytes()
+    (length,) = struct.unpack("<Q", data[-len(MAGIC) - 8:-len(MAGIC)])
+    body = data[:-len(MAGIC) - 8 - length]
+    index = json.loads(data[-len(MAGIC) - 8 - length:-len(MAGIC) - 8])
+    index.update(changes)
+    raw = json.dumps(index).encode("utf-8")
+    path.write_bytes(body + raw + struct.pack("<Q", len(raw)) + MAGIC)
+    return index
+
+
+def test_import_with_partial_chroma_documents(exported):
+    path, doc_id, ids = exported
+
+    import_snapshot(str(path))
+
+    stored = collection_for(doc_id).get(ids=ids, include=["documents"])
+    documents = dict(zip(stored["ids"], stored["documents"]))
+    assert sorted(documents) == sorted(ids)
+    assert documents[ids[0]] == "texto antiguo 0"
+    assert not documents[ids[3]]
+
+
+@pytest.mark.parametrize("content", [MAGIC, MAGIC + b"\0" * 4, b"no es un snapshot"])
+def test_truncated_file_raises_snapshot_error(tmp_path, content):
+    path = tmp_path / "roto.snap"
+    path.write_bytes(content)
+
+    with pytest.raises(SnapshotError):
+        import_snapshot(str(path))
+
+
+def test_missing_section_raises_snapshot_error(exported):
+    path, _, _ = exported
+    index = _rewrite_index(path)
+    _rewrite_index(path, sections=[s for s in index["sections"] if s["name"] != "catalog"])
+
+    with pytest.raises(SnapshotError, match="catalog"):
+        import_snapshot(str(path))
+
+
+def test_count_mismatch_raises_snapshot_error(exported):
+    path, _, _ = exported
+    index = _rewrite_index(path)
+    _rewrite_index(path, count=index["count"] + 1)
+
+    with pytest.raises(SnapshotError):
+        import_snapshot(str(path))
+
+
+def test_vectors_size_mismatch_raises_snapshot_error(exported):
+    path, _, _ = exported
+    index = _rewrite_index(path)
+    _rewrite_index(path, dim=index["dim"] * 2)
+
+    with pytest.raises(SnapshotError, match="vectors"):
+        import_snapshot(str(path))
+
+
+def test_corrupt_section_raises_snapshot_error(exported, monkeypatch):
+    path, _, _ = exported
+    # Checksum correcto pero contenido que no descomprime
+    monkeypatch.setattr(snapshot, "_read_section", lambda f, section: b"basura")
+
+    with pytest.raises(SnapshotError):
+        import_snapshot(str(path))